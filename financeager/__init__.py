@@ -36,7 +36,10 @@ CACHE_DIR = platformdirs.user_cache_dir("financeager")
 LOG_DIR = os.path.join(CACHE_DIR, "log")
 
 CONFIG_FILEPATH = os.path.join(CONFIG_DIR, "config")
-CATEGORIES_CACHE_FILENAME = "categories"
+# Category names of each pocket for CLI completion, stored in files named after the
+# pockets
+CATEGORIES_CACHE_DIRNAME = "pocket-categories"
+POCKET_NAMES_CACHE_FILENAME = "pockets.json"
 
 # Set up the package logger
 LOGGER = getLogger(__package__)
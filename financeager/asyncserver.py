@@ -0,0 +1,163 @@
+"""Asyncio variant of the server, suitable for handling concurrent requests (e.g.
+of many users) in a single process."""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from . import DEFAULT_POCKET_NAME, exceptions, pocket, server
+
+# Commands that only query a single pocket
+READ_COMMANDS = {"list", "get", "categories", "pocket-stats"}
+# Commands that do not operate on pockets
+SERVER_COMMANDS = {"pockets", "stats"}
+
+
+class ReadWriteLock:
+    """Readers-writer lock for asyncio tasks. Any number of readers may hold the
+    lock at once, a writer holds it exclusively. Waiting writers take precedence
+    over new readers so that they are not starved.
+    """
+
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @asynccontextmanager
+    async def reading(self):
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: not self._writing and not self._waiting_writers
+            )
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def writing(self):
+        async with self._condition:
+            self._waiting_writers += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: not self._writing and not self._readers
+                )
+            finally:
+                self._waiting_writers -= 1
+                # Readers blocked by this writer might proceed if it was cancelled
+                self._condition.notify_all()
+            self._writing = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class AsyncServer:
+    """Server processing requests concurrently.
+
+    Requests are run by an underlying `Server` in a thread pool so that blocking
+    database calls don't stall the event loop. Concurrent requests are
+    coordinated by a readers-writer lock per pocket: modifications of a pocket are
+    serialized, whereas queries run concurrently if the pocket type supports it
+    (see `Pocket.concurrent_reads`; otherwise they are serialized as well).
+    Requests to different pockets proceed in parallel.
+
+    Use as async context manager to stop the server and release the thread pool
+    on exit. Kwargs (f.i. data_dir) are passed to the Server.
+    """
+
+    def __init__(self, *, max_workers=None, **kwargs):
+        self._server = server.Server(**kwargs)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="financeager"
+        )
+        pocket_class = pocket.POCKET_CLASSES.get(self._server._database_type)
+        self._concurrent_reads = getattr(pocket_class, "concurrent_reads", False)
+        self._pocket_locks = {}
+        # Held for reading by any request, and for writing by 'stop'
+        self._server_lock = ReadWriteLock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Stop the server, and release the thread pool."""
+        await self.run("stop")
+        self._executor.shutdown()
+
+    async def run(self, command, **kwargs):
+        """Run the given command (see Server.run()) once the involved pockets are
+        locked.
+
+        :return: dict
+        """
+        if command == "stop":
+            async with self._server_lock.writing():
+                return await self._run_in_executor(command, **kwargs)
+
+        async with self._server_lock.reading():
+            if command in SERVER_COMMANDS:
+                return await self._run_in_executor(command, **kwargs)
+
+            try:
+                read_names, write_names = await self._pocket_names_to_lock(
+                    command, kwargs
+                )
+            except exceptions.PocketException as e:
+                return {"error": e}
+
+            async with AsyncExitStack() as stack:
+                # Acquire locks in a fixed order to avoid deadlocks
+                for name in sorted(read_names | write_names):
+                    lock = self._pocket_locks.setdefault(name, ReadWriteLock())
+                    if name in write_names or not self._concurrent_reads:
+                        await stack.enter_async_context(lock.writing())
+                    else:
+                        await stack.enter_async_context(lock.reading())
+
+                return await self._run_in_executor(command, **kwargs)
+
+    async def _run_in_executor(self, command, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._server.run, command, **kwargs)
+        )
+
+    async def _pocket_names_to_lock(self, command, kwargs):
+        """Determine the names of the pockets that the given request reads from and
+        writes to. Glob patterns of a multi-pocket 'list' request are expanded, and
+        replaced by the matching names in 'kwargs'.
+
+        :return: tuple of two sets of pocket names
+        :raise: PocketException if a pattern does not match any pocket
+        """
+        if command in ["copy", "copy-many"]:
+            source = str(kwargs.get("source_pocket") or DEFAULT_POCKET_NAME)
+            destination = str(kwargs.get("destination_pocket") or DEFAULT_POCKET_NAME)
+            if source == destination:
+                return set(), {source}
+            return {source}, {destination}
+
+        if command == "list" and "pockets" in kwargs:
+            loop = asyncio.get_running_loop()
+            kwargs["pockets"] = await loop.run_in_executor(
+                self._executor, self._server._match_pocket_names, kwargs["pockets"]
+            )
+            return {str(name) for name in kwargs["pockets"]}, set()
+
+        name = str(kwargs.get("pocket") or DEFAULT_POCKET_NAME)
+        if command in READ_COMMANDS:
+            return {name}, set()
+        return set(), {name}
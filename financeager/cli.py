@@ -2,16 +2,19 @@
 
 # PYTHON_ARGCOMPLETE_OK
 import argparse
+import json
 import os
+import shutil
 import sys
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from configparser import ConfigParser
+from configparser import Error as ConfigParserError
+from contextlib import suppress
 from datetime import datetime
 from importlib.metadata import entry_points
 
-import argcomplete
-from dateutil import parser as du_parser
-from rich.console import Console
-
 import financeager
 
 from . import (
@@ -25,13 +28,13 @@ from . import (
     entries,
     exceptions,
     init_logger,
-    listing,
     make_log_stream_handler_verbose,
     setup_log_file_handler,
 )
-from .pocket.base import FREQUENCY_CHOICES
-from .pocket.migrate import migrate_pocket
-from .server import pocket_names
+from .plugin import BUILTIN_SERVICES
+from .pocket import FREQUENCY_CHOICES, POCKET_CLASSES
+from .pocket.replicate import DEFAULT_BATCH_SIZE, replicate
+from .server import GLOB_PATTERN, POCKET_FILE_PATTERNS, pocket_names
 
 logger = init_logger(__name__)
 
@@ -44,7 +47,7 @@ def main():
     """Main command line entry point of the application.
 
     The log directory is created. A FileHandler is added to the package logger.
-    Available plugins are loaded.
+    The plugin of the service selected in the configuration is loaded.
     The program configuration is loaded.
     Relevant command line arguments and options are parsed and passed to
     'run()'.
@@ -55,8 +58,7 @@ def main():
     # Adding the FileHandler here avoids cluttering the log during tests
     setup_log_file_handler()
 
-    group = "financeager.services"
-    plugins = [ep.load()() for ep in entry_points().select(group=group)]
+    plugins = _load_service_plugins(sys.argv[1:])
 
     args = _parse_command(plugins=plugins)
     try:
@@ -72,30 +74,249 @@ def main():
     sys.exit(exit_code)
 
 
-def _migrate_pockets(pocket_names, sinks):
+def _load_service_plugins(args):
+    """Load the plugins of the 'financeager.services' entry point group that provide
+    the service selected in the config file (specified in 'args', or the default
+    one). Plugins of other services are not imported, neither are the built-in
+    services (see plugin.BUILTIN_SERVICES) which the configuration loads itself.
+
+    :return: list of plugin.ServicePlugin
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-C", "--config-filepath", default=financeager.CONFIG_FILEPATH)
+    config_filepath = parser.parse_known_args(args)[0].config_filepath
+
+    config_parser = ConfigParser()
+    # Errors in the config file are reported when loading the configuration
+    with suppress(ConfigParserError):
+        config_parser.read(config_filepath)
+    service_name = config_parser.get("SERVICE", "name", fallback="local")
+    if service_name == "local" or service_name in BUILTIN_SERVICES:
+        return []
+
+    group = "financeager.services"
+    return [ep.load()() for ep in entry_points().select(group=group, name=service_name)]
+
+
+def _format_migration_error(pocket_name, error):
+    if isinstance(error, (FileNotFoundError, FileExistsError, ValueError)):
+        return str(error)
+    return f"Error migrating pocket '{pocket_name}': {error}"
+
+
+def _migrate_pocket(pocket_name, data_dir, verify=False, progress=None):
+    """Migrate a single pocket, and optionally verify the migrated content.
+
+    :return: dict with migration statistics (incl. verification result if 'verify'
+        is set)
+    :raises: ValueError if verification fails
+    """
+    from .pocket.migrate import migrate_pocket, verify_migration
+
+    result = migrate_pocket(pocket_name, data_dir, progress=progress)
+    if verify:
+        verification = verify_migration(pocket_name, data_dir)
+        if not verification["verified"]:
+            raise ValueError(
+                f"Verification of pocket '{pocket_name}' failed: "
+                + "; ".join(verification["mismatches"])
+            )
+        result["verification"] = verification
+    return result
+
+
+def _migrate_pockets(
+    pocket_names, sinks, jobs=1, continue_on_error=False, verify=False
+):
     """Migrate one or more TinyDB pockets to SQLite format.
 
+    If 'jobs' is greater than one, pockets are migrated in parallel by a pool of
+    worker processes. Unless 'continue_on_error' is set, no further migrations are
+    started after the first failure. When migrating multiple pockets, an overall
+    summary is output at the end.
+
     :param pocket_names: list of pocket names to migrate
     :param sinks: Client.Sinks object for output
+    :param jobs: number of pockets migrated in parallel
+    :param continue_on_error: whether to migrate the remaining pockets after a
+        failure
+    :param verify: whether to verify the content of each migrated pocket
     :return: SUCCESS if all migrations succeed, FAILURE otherwise
     """
-    for pocket_name in set(pocket_names):
-        try:
-            result = migrate_pocket(pocket_name, financeager.DATA_DIR)
-            message = (
-                f"Migrated pocket '{result['pocket_name']}': "
-                f"{result['total_count']} entries "
-                f"({result['standard_count']} standard, "
-                f"{result['recurrent_count']} recurrent)"
+    pocket_names = sorted(set(pocket_names))
+    results = {}
+    errors = {}
+
+    def _report(pocket_name, result=None, error=None):
+        if error is not None:
+            errors[pocket_name] = error
+            sinks.error(_format_migration_error(pocket_name, error))
+            return
+
+        results[pocket_name] = result
+        message = (
+            f"Migrated pocket '{result['pocket_name']}': "
+            f"{result['total_count']} entries "
+            f"({result['standard_count']} standard, "
+            f"{result['recurrent_count']} recurrent)"
+        )
+        if "verification" in result:
+            digests = ", ".join(
+                f"{table_name} {stats['source_digest'][:12]}"
+                for table_name, stats in result["verification"]["tables"].items()
             )
-            sinks.info(message)
-        except (FileNotFoundError, FileExistsError, ValueError) as e:
-            sinks.error(str(e))
-            return FAILURE
-        except Exception as e:
-            sinks.error(f"Error migrating pocket '{pocket_name}': {e}")
+            message += f", verified (digests: {digests})"
+        sinks.info(message)
+
+    queue = deque(pocket_names)
+
+    def _may_start():
+        return queue and (continue_on_error or not errors)
+
+    if jobs > 1 and len(pocket_names) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # Keep at most 'jobs' migrations in flight such that no further
+            # migrations are started after a failure
+            pending = {}
+            while pending or _may_start():
+                while len(pending) < jobs and _may_start():
+                    pocket_name = queue.popleft()
+                    future = executor.submit(
+                        _migrate_pocket, pocket_name, financeager.DATA_DIR, verify
+                    )
+                    pending[future] = pocket_name
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pocket_name = pending.pop(future)
+                    try:
+                        _report(pocket_name, result=future.result())
+                    except Exception as e:
+                        _report(pocket_name, error=e)
+    else:
+        while _may_start():
+            pocket_name = queue.popleft()
+
+            def _progress(count):
+                sinks.info(
+                    f"Migrating pocket '{pocket_name}': {count} entries processed"
+                )
+
+            try:
+                result = _migrate_pocket(
+                    pocket_name, financeager.DATA_DIR, verify, progress=_progress
+                )
+                _report(pocket_name, result=result)
+            except Exception as e:
+                _report(pocket_name, error=e)
+
+    skipped = list(queue)
+    if len(pocket_names) > 1:
+        total_count = sum(r["total_count"] for r in results.values())
+        sinks.info(
+            f"Migrated {len(results)} of {len(pocket_names)} pockets "
+            f"({total_count} entries)"
+        )
+        if errors:
+            sinks.error(
+                f"Failed to migrate {len(errors)} pocket(s): "
+                f"{', '.join(sorted(errors))}"
+            )
+        if skipped:
+            sinks.error(
+                f"Skipped {len(skipped)} pocket(s) after failure: "
+                f"{', '.join(sorted(skipped))}. "
+                "Use --continue-on-error to migrate them anyway."
+            )
+
+    return FAILURE if errors else SUCCESS
+
+
+def _remove_pocket_files(pocket_name, database_type):
+    path = os.path.join(
+        financeager.DATA_DIR,
+        POCKET_FILE_PATTERNS[database_type].replace("*", pocket_name),
+    )
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _replicate_pocket(
+    *,
+    source_pocket,
+    destination_pocket,
+    source_type,
+    destination_type,
+    sinks,
+    preserve_eids=False,
+    batch_size=DEFAULT_BATCH_SIZE,
+    shard_by="year",
+):
+    """Copy all entries of a pocket to a new pocket, possibly of another database
+    type. If replication fails, the files of the new pocket are removed.
+
+    :param source_pocket: name of the pocket to copy
+    :param destination_pocket: name of the pocket to create
+    :param source_type: database type of the source pocket
+    :param destination_type: database type of the destination pocket
+    :param sinks: Client.Sinks object for output
+    :param preserve_eids: whether to keep the IDs of the entries
+    :param batch_size: number of entries read and written at once
+    :param shard_by: shard period of sharded-tinydb pockets
+    :return: SUCCESS if replication succeeds, FAILURE otherwise
+    """
+    for database_type in [source_type, destination_type]:
+        if database_type not in POCKET_CLASSES:
+            sinks.error(f"Unknown database type '{database_type}'")
             return FAILURE
 
+    if source_pocket not in pocket_names(financeager.DATA_DIR, source_type):
+        sinks.error(f"Pocket '{source_pocket}' ({source_type}) not found")
+        return FAILURE
+    if destination_pocket in pocket_names(financeager.DATA_DIR, destination_type):
+        sinks.error(
+            f"Pocket '{destination_pocket}' ({destination_type}) already exists"
+        )
+        return FAILURE
+
+    def _progress(count):
+        sinks.info(f"Replicating pocket '{source_pocket}': {count} entries processed")
+
+    def _open_pocket(name, database_type):
+        kwargs = {"shard_by": shard_by} if database_type == "sharded-tinydb" else {}
+        return POCKET_CLASSES[database_type](
+            name=name, data_dir=financeager.DATA_DIR, **kwargs
+        )
+
+    source = _open_pocket(source_pocket, source_type)
+    destination = None
+    try:
+        destination = _open_pocket(destination_pocket, destination_type)
+        counts = replicate(
+            source.db_interface,
+            destination.db_interface,
+            batch_size=batch_size,
+            preserve_eids=preserve_eids,
+            progress=_progress,
+        )
+    except Exception as e:
+        if destination is not None:
+            destination.close()
+        _remove_pocket_files(destination_pocket, destination_type)
+        sinks.error(f"Error replicating pocket '{source_pocket}': {e}")
+        return FAILURE
+    finally:
+        source.close()
+
+    destination.close()
+    sinks.info(
+        f"Replicated pocket '{source_pocket}' ({source_type}) to "
+        f"'{destination_pocket}' ({destination_type}): "
+        f"{sum(counts.values())} entries ({counts[DEFAULT_TABLE]} standard, "
+        f"{counts[RECURRENT_TABLE]} recurrent)"
+    )
     return SUCCESS
 
 
@@ -132,16 +353,35 @@ def run(command, configuration, plugins=None, verbose=False, sinks=None, **param
         if isinstance(response, str):
             print(response)
         else:  # pragma: no cover
+            from rich.console import Console
+
             Console().print(response)
 
     sinks = sinks or clients.Client.Sinks(_info, logger.error)
 
     # Handle migrate-pockets command directly without client
     if command == "migrate-pockets":
-        return _migrate_pockets(params.get("pocket_names", []), sinks)
+        return _migrate_pockets(
+            params.get("pocket_names", []),
+            sinks,
+            jobs=params.get("jobs", 1),
+            continue_on_error=params.get("continue_on_error", False),
+            verify=params.get("verify", False),
+        )
 
-    # Show warning if not using sqlite database type
     database_type = configuration.get_option("SERVICE", "database_type")
+
+    # Handle replicate-pocket command directly without client
+    if command == "replicate-pocket":
+        return _replicate_pocket(
+            sinks=sinks,
+            source_type=params.pop("source_type") or database_type,
+            destination_type=params.pop("destination_type") or database_type,
+            shard_by=configuration.get_option("SERVICE", "shard_by"),
+            **params,
+        )
+
+    # Show warning if not using sqlite database type
     if database_type != "sqlite":
         logger.warning(
             f"You're using the `{database_type}` database type. "
@@ -173,6 +413,18 @@ def run(command, configuration, plugins=None, verbose=False, sinks=None, **param
         if params["recurrent_only"]:
             formatting_options["recurrent_only"] = True
 
+        pockets = params.pop("pocket") or [None]
+        if len(pockets) == 1 and not GLOB_PATTERN.search(pockets[0] or ""):
+            params["pocket"] = pockets[0]
+        else:
+            params["pockets"] = pockets
+    elif command == "pocket-stats":
+        formatting_options["json"] = params.pop("json")
+    elif command == "copy-many":
+        # Filtering for a recurrent-only field implies the recurrent table
+        if params.pop("recurrent_only", False) and params["table_name"] is None:
+            params["table_name"] = RECURRENT_TABLE
+
     exit_code = FAILURE
     client = clients.create(configuration=configuration, sinks=sinks, plugins=plugins)
     if client.safely_run(command, **params):
@@ -195,6 +447,8 @@ def _preprocess(data):
             continue  # skip validation
 
         if date is not None:
+            from dateutil import parser as du_parser
+
             try:
                 date = time.strftime(
                     POCKET_DATE_FORMAT,
@@ -278,8 +532,9 @@ def _preprocess(data):
 def _format_response(response, command, **listing_options):
     """Format the given response (dict or str) into human-readable text.
     If the response is a string, it is immediately returned.
-    If the response does not contain any of the fields 'id', 'elements',
-    'element', or 'pockets', an empty string is returned.
+    If the response does not contain any of the fields 'id', 'count', 'elements',
+    'pocket_elements', 'element', 'stats', 'pocket_stats', or 'pockets', an empty
+    string is returned.
     The 'listing_options' are passed to listing.prettify().
 
     :return: str
@@ -297,20 +552,79 @@ def _format_response(response, command, **listing_options):
         }[command]
         return f"{verb} element {eid}."
 
+    count = response.get("count")
+    if count is not None:
+        return f"Copied {count} {'entry' if count == 1 else 'entries'}."
+
     elements = response.get("elements")
     if elements is not None:
+        from . import listing
+
         return listing.prettify(elements, **listing_options)
 
+    pocket_elements = response.get("pocket_elements")
+    if pocket_elements is not None:
+        from . import listing
+
+        return listing.prettify_pockets(pocket_elements, **listing_options)
+
     element = response.get("element")
     if element is not None:
         return entries.prettify(
             element, default_category=listing_options["default_category"]
         )
 
+    stats = response.get("stats")
+    if stats is not None:
+        return _format_stats(stats)
+
+    pocket_stats = response.get("pocket_stats")
+    if pocket_stats is not None:
+        if listing_options.get("json"):
+            return json.dumps(pocket_stats)
+        return _format_stats(pocket_stats)
+
     pockets = response.get("pockets", [])
     return "\n".join([p for p in pockets])
 
 
+def _format_stats(stats):
+    """Format the given statistics (a dict mapping section names to dicts of
+    statistics) into human-readable text. Empty sections are omitted.
+    """
+    lines = []
+    for section, section_stats in stats.items():
+        if not section_stats:
+            continue
+        lines.append(f"{section.replace('_', ' ').capitalize()}:")
+        for name, value in section_stats.items():
+            if isinstance(value, dict) and section == "commands":
+                # Latency statistics of a command, given in seconds
+                value = ", ".join(
+                    f"{k} {v}" if k == "count" else f"{k} {1000 * v:.2f} ms"
+                    for k, v in value.items()
+                )
+            elif isinstance(value, dict):
+                value = ", ".join(f"{k} {v}" for k, v in value.items())
+            elif name.endswith("rate"):
+                value = f"{value:.1%}"
+            elif value is None:
+                value = "-"
+            lines.append(f"  {name.replace('_', ' ')}: {value}")
+    return "\n".join(lines)
+
+
+def _positive_int(value):
+    """Type function for argparse converting 'value' to a positive integer."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"invalid positive integer: '{value}'")
+    return number
+
+
 def _parse_command(args=None, plugins=None):
     """Parse the given list of args and return the result as dict."""
 
@@ -334,15 +648,13 @@ def _parse_command(args=None, plugins=None):
     )
     subparsers.required = True
 
-    categories = _read_categories_for_cli_completion()
-
     add_parser = subparsers.add_parser("add", help="add an entry to the database")
 
     add_parser.add_argument("name", help="entry name")
     add_parser.add_argument("value", type=float, help="entry value")
     add_parser.add_argument(
         "-c", "--category", default=None, help="entry category"
-    ).completer = argcomplete.ChoicesCompleter(categories)
+    ).completer = _complete_categories
     add_parser.add_argument("-d", "--date", default=None, help="entry date")
 
     add_parser.add_argument(
@@ -405,7 +717,7 @@ is assumed""",
     update_parser.add_argument("-n", "--name", help="new name")
     update_parser.add_argument("-v", "--value", type=float, help="new value")
     update_parser.add_argument("-c", "--category", help="new category").completer = (
-        argcomplete.ChoicesCompleter(categories)
+        _complete_categories
     )
     update_parser.add_argument(
         "-d", "--date", help="new date (for standard entries only)"
@@ -449,6 +761,45 @@ is assumed""",
         help="Table to copy the entry from/to. Default: 'standard'.",
     )
 
+    copy_many_parser = subparsers.add_parser(
+        "copy-many",
+        help="copy all entries matching the given filters from one pocket to another",
+    )
+    copy_many_parser.add_argument(
+        "-s",
+        "--source",
+        default=None,
+        dest="source_pocket",
+        help="pocket to copy the entries from (default: main pocket)",
+    ).completer = _complete_pocket_names
+    copy_many_parser.add_argument(
+        "-d",
+        "--destination",
+        required=True,
+        dest="destination_pocket",
+        help="pocket to copy the entries to",
+    ).completer = _complete_pocket_names
+    copy_many_parser.add_argument(
+        "-f",
+        "--filter",
+        default=None,
+        action="append",
+        dest="filters",
+        metavar="FILTER",
+        help="filter for name, date and/or category substring, e.g. "
+        "category=insurance. Filtering for frequency, start or end selects the "
+        "recurrent table. Recurrent entries are selected by the dates of the entries "
+        "generated from them. Can be specified multiple times (then filters add "
+        "up). All entries of the table are copied if omitted",
+    )
+    copy_many_parser.add_argument(
+        "-t",
+        "--table-name",
+        default=None,
+        choices=[DEFAULT_TABLE, RECURRENT_TABLE],
+        help="Table to copy the entries from/to. Default: 'standard'.",
+    )
+
     list_parser = subparsers.add_parser(
         "list", help="list all entries in the pocket database"
     )
@@ -521,6 +872,16 @@ is assumed""",
 
     subparsers.add_parser("pockets", help="list all pocket databases")
 
+    subparsers.add_parser("stats", help="show statistics of the service")
+
+    pocket_stats_parser = subparsers.add_parser(
+        "pocket-stats",
+        help="show statistics of a pocket (e.g. number of entries, size of storage)",
+    )
+    pocket_stats_parser.add_argument(
+        "-j", "--json", action="store_true", help="format output as JSON"
+    )
+
     migrate_parser = subparsers.add_parser(
         "migrate-pockets", help="migrate TinyDB pocket(s) to SQLite format"
     )
@@ -529,8 +890,62 @@ is assumed""",
         nargs="+",
         metavar="POCKET",
         help="name(s) of pocket(s) to migrate (without .json extension)",
-    ).completer = argcomplete.ChoicesCompleter(
-        pocket_names(financeager.DATA_DIR, database_type="tinydb")
+    ).completer = _complete_tinydb_pocket_names
+    migrate_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=_positive_int,
+        default=1,
+        help="number of pockets to migrate in parallel. Default: 1",
+    )
+    migrate_parser.add_argument(
+        "--continue-on-error",
+        action="store_true",
+        help="migrate remaining pockets if migrating a pocket fails",
+    )
+    migrate_parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="compare the content of the migrated pocket with the original",
+    )
+
+    replicate_parser = subparsers.add_parser(
+        "replicate-pocket",
+        help="copy all entries of a pocket to a new pocket, possibly of another "
+        "database type",
+    )
+    replicate_parser.add_argument(
+        "source_pocket", metavar="SOURCE", help="name of the pocket to copy"
+    ).completer = _complete_pocket_names
+    replicate_parser.add_argument(
+        "destination_pocket",
+        metavar="DESTINATION",
+        help="name of the pocket to create",
+    )
+    replicate_parser.add_argument(
+        "--from",
+        dest="source_type",
+        choices=POCKET_CLASSES,
+        help="database type of the source pocket. Default: configured database type",
+    )
+    replicate_parser.add_argument(
+        "--to",
+        dest="destination_type",
+        choices=POCKET_CLASSES,
+        help="database type of the destination pocket. "
+        "Default: configured database type",
+    )
+    replicate_parser.add_argument(
+        "--preserve-eids",
+        action="store_true",
+        help="keep the IDs of the entries",
+    )
+    replicate_parser.add_argument(
+        "--batch-size",
+        type=_positive_int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"number of entries read and written at once. "
+        f"Default: {DEFAULT_BATCH_SIZE}",
     )
 
     # Extend with plugin parsers
@@ -560,13 +975,19 @@ is assumed""",
             get_parser,
             remove_parser,
             update_parser,
-            list_parser,
+            pocket_stats_parser,
         ]:
             subparser.add_argument(
                 "-p", "--pocket", help="name of pocket to modify or query"
-            ).completer = argcomplete.ChoicesCompleter(
-                pocket_names(financeager.DATA_DIR)
-            )
+            ).completer = _complete_pocket_names
+        elif subparser is list_parser:
+            subparser.add_argument(
+                "-p",
+                "--pocket",
+                action="append",
+                help="name of pocket to query. Can be specified multiple times, or "
+                "as glob pattern (e.g. '202*'), to query several pockets at once",
+            ).completer = _complete_pocket_names
 
     for subparser in [
         add_parser,
@@ -574,6 +995,7 @@ is assumed""",
         remove_parser,
         update_parser,
         copy_parser,
+        copy_many_parser,
     ]:
         subparser.add_argument(
             "-r",
@@ -583,7 +1005,11 @@ is assumed""",
 specified, the -r option is ignored""",
         )
 
-    argcomplete.autocomplete(parser)
+    if "_ARGCOMPLETE" in os.environ:
+        # Only import argcomplete when invoked by the shell completion hook
+        import argcomplete
+
+        argcomplete.autocomplete(parser)
     parsed_args = vars(parser.parse_args(args=args))
 
     # Set table name if not specified
@@ -594,9 +1020,10 @@ specified, the -r option is ignored""",
     return parsed_args
 
 
-def _read_categories_for_cli_completion():
+def _read_categories_for_cli_completion(pocket=None):
+    """Return the cached category names of the given pocket (default: main pocket)."""
     try:
-        fp = os.path.join(financeager.CACHE_DIR, financeager.CATEGORIES_CACHE_FILENAME)
+        fp = clients.categories_cache_filepath(pocket)
         if not os.path.exists(fp):
             return []
         with open(fp) as f:
@@ -605,3 +1032,39 @@ def _read_categories_for_cli_completion():
         logger.debug(str(e))
         logger.warning("Error when trying to read category cache.")
         return []
+
+
+def _complete_categories(parsed_args, **_):
+    """Completer for category names of the pocket specified on the command line."""
+    return _read_categories_for_cli_completion(getattr(parsed_args, "pocket", None))
+
+
+def _complete_pocket_names(**_):
+    """Completer for pocket names."""
+    return _read_pocket_names_for_cli_completion()
+
+
+def _complete_tinydb_pocket_names(**_):
+    """Completer for names of TinyDB pockets."""
+    return _read_pocket_names_for_cli_completion(database_type="tinydb")
+
+
+def _read_pocket_names_for_cli_completion(database_type=None):
+    """Return names of the pockets in the data directory. The names are cached in
+    the cache directory, and only read from the data directory if it was modified.
+    """
+    try:
+        cache_filepath = None
+        if financeager.CACHE_DIR is not None and os.path.isdir(financeager.CACHE_DIR):
+            cache_filepath = os.path.join(
+                financeager.CACHE_DIR, financeager.POCKET_NAMES_CACHE_FILENAME
+            )
+        return pocket_names(
+            financeager.DATA_DIR,
+            database_type=database_type,
+            cache_filepath=cache_filepath,
+        )
+    except Exception as e:
+        logger.debug(str(e))
+        logger.warning("Error when trying to read pocket names.")
+        return []
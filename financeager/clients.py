@@ -1,12 +1,21 @@
 """Infrastructure for backend communication."""
 
+import abc
 import os.path
 import traceback
 from collections import namedtuple
+from contextlib import suppress
 
 import financeager
 
-from . import exceptions, init_logger, localserver, plugin
+from . import (
+    DEFAULT_POCKET_NAME,
+    DEFAULT_TABLE,
+    exceptions,
+    init_logger,
+    localserver,
+    plugin,
+)
 
 logger = init_logger(__name__)
 
@@ -14,7 +23,8 @@ logger = init_logger(__name__)
 def create(*, configuration, sinks, plugins):
     """Factory to create the Client subclass suitable to the given
     configuration.
-    Clients of service plugins are taken into account if specified.
+    Clients of service plugins are taken into account if specified. The plugin of
+    a built-in service (e.g. 'http') is loaded if the service is selected.
     The sinks are passed into the Client.
     """
     clients = {
@@ -27,15 +37,32 @@ def create(*, configuration, sinks, plugins):
             clients[p.name] = p.client
 
     service_name = configuration.get_option("SERVICE", "name")
+    if service_name not in clients:
+        service_plugin = plugin.load_builtin_service(service_name)
+        if service_plugin is not None:
+            clients[service_name] = service_plugin.client
     client_class = clients[service_name]
 
     return client_class(configuration=configuration, sinks=sinks)
 
 
+def categories_cache_filepath(pocket=None):
+    """Return path of the file caching the category names of the given pocket (default:
+    main pocket) for CLI completion.
+    """
+    return os.path.join(
+        financeager.CACHE_DIR,
+        financeager.CATEGORIES_CACHE_DIRNAME,
+        pocket or DEFAULT_POCKET_NAME,
+    )
+
+
 class Client:
     """Abstract interface for communicating with the service.
     Output is directed to distinct sinks which are functions taking a single
     string argument.
+    After successfully adding, removing or updating entries, the category names of
+    the pocket are updated in the cache for CLI completion.
     """
 
     Sinks = namedtuple("Sinks", ["info", "error"])
@@ -74,12 +101,252 @@ class Client:
             self.sinks.error(f"Unexpected error: {traceback.format_exc()}")
             self.latest_exception = e
 
+        if success:
+            self._update_categories_cache(command, params)
         return success
 
+    def run_many(self, requests):
+        """Run the given requests (pairs of command and params) one after another
+        (see safely_run()).
+
+        :return: list of bool
+        """
+        return [self.safely_run(command, **params) for command, params in requests]
+
+    def _update_categories_cache(self, command, params):
+        """For a successful modifying command, update the category names of the
+        pocket in the cache for CLI completion. Errors are only logged.
+        """
+        if command not in ["add", "remove", "update"]:
+            return
+
+        try:
+            self._update_categories_for_cli_completion(command, **params)
+        except Exception as e:
+            logger.debug(str(e))
+
+    def _update_categories_for_cli_completion(
+        self, command, pocket=None, table_name=None, category=None, **_
+    ):
+        # Categories of recurrent entries are not taken into account (see
+        # Pocket.get_categories())
+        if table_name not in [None, DEFAULT_TABLE]:
+            return
+
+        pocket = pocket or DEFAULT_POCKET_NAME
+        fp = categories_cache_filepath(pocket)
+        try:
+            with open(fp) as f:
+                # The category cache is a line-separated list of names
+                cached_categories = set(f.read().splitlines())
+        except FileNotFoundError:
+            cached_categories = None
+
+        if (
+            cached_categories is None
+            or command == "remove"
+            or (command == "update" and category is not None)
+        ):
+            # Removing or updating an entry might remove its category from the pocket
+            categories = set(self.proxy.run("categories", pocket=pocket)["categories"])
+        elif command == "add" and category is not None:
+            # Categories are stored in lowercase (see Pocket._convert_fields())
+            categories = cached_categories | {category.lower()}
+        else:
+            # Adding an entry without category assigns the default category, or the
+            # (cached) one of an eponymous entry. Updating other fields than the
+            # category doesn't affect the category names
+            return
+
+        if categories == cached_categories:
+            return
+
+        os.makedirs(os.path.dirname(fp), exist_ok=True)
+        with open(fp, "w") as f:
+            f.write("\n".join(sorted(categories)))
+
     def shutdown(self):
         """Routine to run at the end of the Client lifecycle."""
 
 
+class AsyncProxy(abc.ABC):
+    """Base class for proxies running requests from an event loop via a single
+    connection. Requests are sent as soon as they are submitted, without waiting for
+    the responses to preceding requests (pipelining). The service is expected to
+    respond in the order of the requests.
+
+    Subclasses implement _open_connection(), _encode_request() and _read_response().
+    The methods import asyncio on use, so that importing the CLI remains cheap.
+    """
+
+    def __init__(self, timeout=None):
+        self._timeout = timeout
+        self._connection = None
+        self._connecting = None
+        # Resolved once the response to the latest request was read
+        self._latest_request_done = None
+
+    async def run(self, command, **kwargs):
+        """Run the command on the service.
+
+        :return: dict
+        :raises: InvalidRequest if the service reports an error in the request
+                 CommunicationError on connection or unexpected service errors
+        """
+        import asyncio
+
+        connection = None
+        try:
+            request = self._encode_request(command, kwargs)
+            connection = reader, writer = await self._connect()
+
+            # Writing the request and queuing up for reading the response happen
+            # without interruption, hence the order of responses is retained
+            preceding_request_done = self._latest_request_done
+            request_done = asyncio.get_running_loop().create_future()
+            self._latest_request_done = request_done
+            try:
+                writer.write(request)
+                await writer.drain()
+                if preceding_request_done is not None:
+                    await asyncio.shield(preceding_request_done)
+                if connection is not self._connection:
+                    raise EOFError("Connection closed after preceding request failed")
+                return await asyncio.wait_for(
+                    self._read_response(reader), self._timeout
+                )
+            except exceptions.InvalidRequest:
+                raise
+            except BaseException:
+                # The response to this request (e.g. when the task was cancelled) is
+                # not read, hence the stream can't be used for subsequent responses.
+                # Requests queued behind fail instead of receiving wrong responses
+                self._close_connection(connection)
+                raise
+            finally:
+                request_done.set_result(None)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError) as e:
+            raise exceptions.CommunicationError(
+                f"Error communicating with service: {e}"
+            )
+
+    async def _connect(self):
+        import asyncio
+
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            if self._connection is not None and self._connection[0].at_eof():
+                # The service closed the connection
+                self._close_connection()
+            if self._connection is None:
+                self._connection = await asyncio.wait_for(
+                    self._open_connection(), self._timeout
+                )
+        return self._connection
+
+    def _close_connection(self, connection=None):
+        """Close the current connection, unless another one than the given one was
+        opened in the meantime.
+        """
+        if self._connection is not None and (
+            connection is None or connection is self._connection
+        ):
+            self._connection[1].close()
+            self._connection = None
+
+    async def close(self):
+        """Close the connection. Must be called before the event loop is closed."""
+        if self._connection is not None:
+            writer = self._connection[1]
+            self._close_connection()
+            with suppress(OSError):
+                await writer.wait_closed()
+        self._connecting = None
+        self._latest_request_done = None
+
+    @abc.abstractmethod
+    async def _open_connection(self):
+        """Connect to the service.
+
+        :return: tuple of asyncio.StreamReader and asyncio.StreamWriter
+        """
+
+    @abc.abstractmethod
+    def _encode_request(self, command, kwargs):
+        """:return: bytes"""
+
+    @abc.abstractmethod
+    async def _read_response(self, reader):
+        """Read a single response from the stream.
+
+        :return: dict
+        :raises: InvalidRequest if the service reports an error in the request
+                 CommunicationError on unexpected service errors
+        """
+
+
+class AsyncClient(Client):
+    """Client able to run many requests concurrently. Besides the 'proxy' used by
+    safely_run(), the subclass implementation must set up an 'async_proxy'
+    (AsyncProxy), on which the requests are pipelined.
+    """
+
+    def __init__(self, *, configuration, sinks):
+        super().__init__(configuration=configuration, sinks=sinks)
+        self.async_proxy = None
+
+    async def gather(self, requests):
+        """Run the given requests (pairs of command and params) concurrently.
+
+        :return: list of responses, or of exceptions for failed requests, in the
+            order of the requests
+        """
+        import asyncio
+
+        return await asyncio.gather(
+            *[self.async_proxy.run(command, **params) for command, params in requests],
+            return_exceptions=True,
+        )
+
+    def run_many(self, requests):
+        """Run the given requests (pairs of command and params) concurrently, and pass
+        the results to the sinks in the order of the requests. For each request,
+        return whether execution was successful.
+
+        :return: list of bool
+        """
+        import asyncio
+
+        async def _gather():
+            try:
+                return await self.gather(requests)
+            finally:
+                await self.async_proxy.close()
+
+        results = [self._report(result) for result in asyncio.run(_gather())]
+        for (command, params), success in zip(requests, results):
+            if success:
+                self._update_categories_cache(command, params)
+        return results
+
+    def _report(self, result):
+        if not isinstance(result, BaseException):
+            self.sinks.info(result)
+            self.latest_exception = None
+            return True
+
+        if isinstance(
+            result, (exceptions.InvalidRequest, exceptions.CommunicationError)
+        ):
+            self.sinks.error(result)
+        else:
+            details = "".join(traceback.format_exception(result))
+            self.sinks.error(f"Unexpected error: {details}")
+        self.latest_exception = result
+        return False
+
+
 class LocalServerClient(Client):
     """Client for communicating with the financeager localserver."""
 
@@ -89,34 +356,13 @@ class LocalServerClient(Client):
 
         database_type = configuration.get_option("SERVICE", "database_type")
         self.proxy = localserver.Proxy(
-            database_type=database_type, data_dir=financeager.DATA_DIR
+            database_type=database_type,
+            data_dir=financeager.DATA_DIR,
+            max_open_pockets=configuration.get_option("SERVICE", "max_open_pockets"),
+            memory_map=configuration.get_option("SERVICE", "memory_map"),
+            shard_by=configuration.get_option("SERVICE", "shard_by"),
         )
 
-    def safely_run(self, command, **params):
-        """Run the parent method, and for certain modifying commands, fetch category
-        names from the server and store them in the cache.
-        """
-        success = super().safely_run(command, **params)
-        if command not in ["add", "remove", "update"]:
-            return success
-
-        try:
-            self._write_categories_for_cli_completion()
-        except Exception as e:
-            logger.debug(str(e))
-        return success
-
-    def _write_categories_for_cli_completion(self):
-        # There might be different categories for each pocket. However when reading the
-        # cache at the time of building the CLI completion, the target pocket cannot be
-        # determined. It's assumed the default pocket is most relevant, hence its
-        # contained categories are stored
-        categories = self.proxy.run("categories", pocket=None)["categories"]
-        fp = os.path.join(financeager.CACHE_DIR, financeager.CATEGORIES_CACHE_FILENAME)
-        with open(fp, "w") as f:
-            # The category cache is a line-separated list of names
-            f.write("\n".join(categories))
-
     def shutdown(self):
         """Instruct stopping of Server."""
         self.proxy.run("stop")
@@ -0,0 +1,265 @@
+"""Columnar representation of the entries of 'list' responses, and a compact
+binary serialization of responses for service transports.
+
+The elements returned by Pocket.get_entries() hold a dict per entry (and per
+occurrence of a recurrent entry), repeating field names, entry names and
+categories. The columnar representation holds parallel arrays per field instead.
+Names and categories are dictionary-encoded, i.e. stored once, and referred to by
+their index in the columns.
+
+Responses are serialized by msgpack if installed, or by a packer based on the
+struct module otherwise. The latter stores homogeneous arrays (e.g. values, or
+indices of names) in a single block.
+"""
+
+import struct
+from collections.abc import Mapping
+
+from . import DEFAULT_TABLE, RECURRENT_TABLE
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMAT = "columnar"
+FIELDS = ("eid", "name", "value", "category", "date")
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+STRUCT_MEDIA_TYPE = "application/vnd.financeager.struct"
+
+
+def is_columnar(elements):
+    """Return whether the given elements are in columnar representation."""
+    return isinstance(elements, Mapping) and elements.get("format") == FORMAT
+
+
+def encode(elements):
+    """Convert elements (type acc. to Pocket._search_all_tables) to columnar
+    representation. The 'name' and 'category' columns hold indices into the
+    'names' and 'categories' lists. Each occurrence of a recurrent entry is a row
+    of the 'recurrent' table, with the ID of the recurrent entry in the 'eid'
+    column.
+
+    :return: dict
+    """
+    names = {}
+    categories = {}
+
+    def _columns(rows):
+        columns = {field: [] for field in FIELDS}
+        for eid, element in rows:
+            columns["eid"].append(int(eid))
+            columns["name"].append(names.setdefault(element["name"], len(names)))
+            columns["value"].append(element["value"])
+            columns["category"].append(
+                categories.setdefault(element.get("category"), len(categories))
+            )
+            columns["date"].append(element["date"])
+        return columns
+
+    standard = _columns(elements[DEFAULT_TABLE].items())
+    recurrent = _columns(
+        (eid, element)
+        for eid, occurrences in elements[RECURRENT_TABLE].items()
+        for element in occurrences
+    )
+    return {
+        "format": FORMAT,
+        "names": list(names),
+        "categories": list(categories),
+        DEFAULT_TABLE: standard,
+        RECURRENT_TABLE: recurrent,
+    }
+
+
+def iter_elements(columns, table_name):
+    """Iterate the rows of the given table of the columnar representation.
+
+    :yield: tuple of entry ID and element dict (holding eid, name, value,
+        category, date)
+    """
+    names = columns["names"]
+    categories = columns["categories"]
+    table = columns[table_name]
+    for eid, name, value, category, date in zip(*[table[f] for f in FIELDS]):
+        yield eid, {
+            "eid": eid,
+            "name": names[name],
+            "value": value,
+            "category": categories[category],
+            "date": date,
+        }
+
+
+def decode(columns):
+    """Convert the columnar representation back to elements (type acc. to
+    Pocket._search_all_tables).
+
+    :return: dict
+    """
+    elements = {DEFAULT_TABLE: {}, RECURRENT_TABLE: {}}
+    elements[DEFAULT_TABLE].update(iter_elements(columns, DEFAULT_TABLE))
+    for eid, element in iter_elements(columns, RECURRENT_TABLE):
+        del element["eid"]
+        elements[RECURRENT_TABLE].setdefault(eid, []).append(element)
+    return elements
+
+
+def media_types():
+    """Return the supported media types of the binary serialization, preferred
+    first.
+    """
+    if msgpack is None:
+        return [STRUCT_MEDIA_TYPE]
+    return [MSGPACK_MEDIA_TYPE, STRUCT_MEDIA_TYPE]
+
+
+def pack(obj, media_type=STRUCT_MEDIA_TYPE, default=None):
+    """Serialize the JSON-like object.
+
+    :param default: function converting objects that can't be serialized
+    :return: bytes
+    :raise: ValueError if the media type is not supported
+    """
+    if media_type == MSGPACK_MEDIA_TYPE and msgpack is not None:
+        return msgpack.packb(obj, default=default)
+    if media_type == STRUCT_MEDIA_TYPE:
+        chunks = []
+        _pack(obj, chunks, default)
+        return b"".join(chunks)
+    raise ValueError(f"Unsupported media type {media_type}")
+
+
+def unpack(data, media_type=STRUCT_MEDIA_TYPE):
+    """Deserialize the data created by pack().
+
+    :raise: ValueError if the data is malformed, or the media type not supported
+    """
+    if media_type == MSGPACK_MEDIA_TYPE and msgpack is not None:
+        return msgpack.unpackb(data, strict_map_key=False)
+    if media_type == STRUCT_MEDIA_TYPE:
+        try:
+            obj, offset = _unpack(memoryview(data), 0)
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ValueError(f"Malformed data: {e}")
+        if offset != len(data):
+            raise ValueError("Malformed data: trailing bytes")
+        return obj
+    raise ValueError(f"Unsupported media type {media_type}")
+
+
+_LENGTH = struct.Struct("<I")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_UINT16_RANGE = range(2**16)
+_INT32_RANGE = range(-(2**31), 2**31)
+
+
+def _is_int(obj):
+    return type(obj) is int
+
+
+def _pack(obj, chunks, default):
+    if obj is None:
+        chunks.append(b"N")
+    elif obj is True:
+        chunks.append(b"T")
+    elif obj is False:
+        chunks.append(b"F")
+    elif _is_int(obj):
+        chunks.append(b"i" + _INT.pack(obj))
+    elif type(obj) is float:
+        chunks.append(b"d" + _FLOAT.pack(obj))
+    elif isinstance(obj, str):
+        data = obj.encode()
+        chunks.append(b"s" + _LENGTH.pack(len(data)) + data)
+    elif isinstance(obj, (list, tuple)):
+        _pack_sequence(obj, chunks, default)
+    elif isinstance(obj, dict):
+        chunks.append(b"m" + _LENGTH.pack(len(obj)))
+        for key, value in obj.items():
+            _pack(key, chunks, default)
+            _pack(value, chunks, default)
+    elif default is not None:
+        _pack(default(obj), chunks, default)
+    else:
+        raise TypeError(f"Object of type {type(obj).__name__} can't be packed")
+
+
+def _pack_sequence(obj, chunks, default):
+    n = len(obj)
+    header = _LENGTH.pack(n)
+    if n and all(type(item) is float for item in obj):
+        chunks.append(b"D" + header + struct.pack(f"<{n}d", *obj))
+    elif n and all(_is_int(item) and item in _UINT16_RANGE for item in obj):
+        # Typical for indices of names and categories
+        chunks.append(b"H" + header + struct.pack(f"<{n}H", *obj))
+    elif n and all(_is_int(item) and item in _INT32_RANGE for item in obj):
+        chunks.append(b"I" + header + struct.pack(f"<{n}i", *obj))
+    elif n and all(type(item) is str for item in obj):
+        data = [item.encode() for item in obj]
+        chunks.append(b"S" + header + struct.pack(f"<{n}I", *map(len, data)))
+        chunks.extend(data)
+    else:
+        chunks.append(b"l" + header)
+        for item in obj:
+            _pack(item, chunks, default)
+
+
+def _unpack(buffer, offset):
+    """Unpack the object at the given offset of the buffer.
+
+    :return: tuple of object and offset after it
+    """
+    tag = bytes((buffer[offset],))
+    offset += 1
+    if tag == b"N":
+        return None, offset
+    if tag == b"T":
+        return True, offset
+    if tag == b"F":
+        return False, offset
+    if tag == b"i":
+        return _INT.unpack_from(buffer, offset)[0], offset + _INT.size
+    if tag == b"d":
+        return _FLOAT.unpack_from(buffer, offset)[0], offset + _FLOAT.size
+
+    (n,) = _LENGTH.unpack_from(buffer, offset)
+    offset += _LENGTH.size
+    if tag == b"s":
+        return _decode_str(buffer, offset, n), offset + n
+    if tag == b"D":
+        return list(struct.unpack_from(f"<{n}d", buffer, offset)), offset + 8 * n
+    if tag == b"H":
+        return list(struct.unpack_from(f"<{n}H", buffer, offset)), offset + 2 * n
+    if tag == b"I":
+        return list(struct.unpack_from(f"<{n}i", buffer, offset)), offset + 4 * n
+    if tag == b"S":
+        lengths = struct.unpack_from(f"<{n}I", buffer, offset)
+        offset += 4 * n
+        items = []
+        for length in lengths:
+            items.append(_decode_str(buffer, offset, length))
+            offset += length
+        return items, offset
+    if tag == b"l":
+        items = []
+        for _ in range(n):
+            item, offset = _unpack(buffer, offset)
+            items.append(item)
+        return items, offset
+    if tag == b"m":
+        obj = {}
+        for _ in range(n):
+            key, offset = _unpack(buffer, offset)
+            obj[key], offset = _unpack(buffer, offset)
+        return obj, offset
+    raise ValueError(f"Malformed data: unknown tag {tag!r}")
+
+
+def _decode_str(buffer, offset, length):
+    end = offset + length
+    if end > len(buffer):
+        raise IndexError("string exceeds data")
+    return str(buffer[offset:end], "utf-8")
@@ -7,7 +7,7 @@ from financeager import plugin
 from . import CONFIG_FILEPATH, init_logger
 from .entries import CategoryEntry
 from .exceptions import InvalidConfigError
-from .pocket import POCKET_CLASSES
+from .pocket import POCKET_CLASSES, SHARD_PERIODS
 
 logger = init_logger(__name__)
 
@@ -21,7 +21,8 @@ class Configuration:
         """Initialize the default configuration, overwrite with custom
         configuration from file if available, and eventually validate the loaded
         configuration.
-        If plugins are given, their configuration is taken into account.
+        If plugins are given, their configuration is taken into account. The
+        configuration of the selected built-in service is taken into account, too.
 
         :type plugins: list[plugin.PluginBase]
 
@@ -36,13 +37,18 @@ class Configuration:
         self._init_defaults()
         self._init_option_types()
 
+        self._custom_config = self._read_custom_config()
         self._load_custom_config()
+        self._add_builtin_service()
         self._validate()
 
     def _init_defaults(self):
         self._parser["SERVICE"] = {
             "name": "local",
             "database_type": "tinydb",
+            "max_open_pockets": "0",
+            "memory_map": "false",
+            "shard_by": "year",
         }
         self._parser["FRONTEND"] = {
             "default_category": CategoryEntry.DEFAULT_NAME,
@@ -52,6 +58,10 @@ class Configuration:
             p.config.init_defaults(self._parser)
 
     def _init_option_types(self):
+        self._option_types["SERVICE"] = {
+            "max_open_pockets": "int",
+            "memory_map": "boolean",
+        }
         for p in self._plugins:
             p.config.init_option_types(self._option_types)
 
@@ -59,10 +69,13 @@ class Configuration:
     def filepath(self):
         return self._filepath or CONFIG_FILEPATH
 
-    def _load_custom_config(self):
-        """Update config values according to customization in config file."""
+    def _read_custom_config(self):
+        """Read the config file, if specified.
+
+        :return: ConfigParser or None
+        """
         if self._filepath is None:
-            return
+            return None
 
         logger.debug(f"Loading custom config from {self._filepath}")
 
@@ -72,6 +85,30 @@ class Configuration:
         used_filepaths = custom_config.read(self._filepath)
         if len(used_filepaths) < 1 or used_filepaths[0] != self._filepath:
             raise InvalidConfigError("Config filepath does not exist!")
+        return custom_config
+
+    def _add_builtin_service(self):
+        """If the selected service is a built-in one (e.g. 'http') without plugin
+        given, load its plugin, and take its configuration into account.
+        """
+        service_name = self.get_option("SERVICE", "name")
+        if any(p.name == service_name for p in self._plugins):
+            return
+
+        service_plugin = plugin.load_builtin_service(service_name)
+        if service_plugin is None:
+            return
+
+        self._plugins.append(service_plugin)
+        service_plugin.config.init_defaults(self._parser)
+        service_plugin.config.init_option_types(self._option_types)
+        self._load_custom_config()
+
+    def _load_custom_config(self):
+        """Update config values according to customization in config file."""
+        custom_config = self._custom_config
+        if custom_config is None:
+            return
 
         for section in self._parser.sections():
             for item in self._parser.options(section):
@@ -139,5 +176,19 @@ class Configuration:
                         f"Wrong type for option {option} in section {section}."
                     )
 
+        if self.get_option("SERVICE", "max_open_pockets") < 0:
+            raise InvalidConfigError("Maximum number of open pockets is negative!")
+
+        if self.get_option("SERVICE", "memory_map") and database_type != "tinydb":
+            raise InvalidConfigError("memory_map requires the tinydb database type")
+
+        shard_by = self.get_option("SERVICE", "shard_by")
+        if shard_by not in SHARD_PERIODS:
+            raise InvalidConfigError(f"Unknown shard period: {shard_by}")
+        if shard_by != "year" and database_type != "sharded-tinydb":
+            raise InvalidConfigError(
+                "shard_by requires the sharded-tinydb database type"
+            )
+
         for p in self._plugins:
             p.config.validate(self)
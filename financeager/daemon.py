@@ -0,0 +1,640 @@
+"""Local daemon holding a server with open pockets in a background process, and the
+corresponding service plugin. Requests are sent via a UNIX domain socket, hence
+commands don't have to set up a server and open the pocket first.
+
+Select the daemon by setting 'name = daemon' in the SERVICE section of the
+configuration. The daemon is started by the first command, and stops after being
+idle for a while. Socket path, timeouts and automatic start are configured in the
+DAEMON section. The daemon can also be run in the foreground by
+
+    python -m financeager.daemon
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager, suppress
+
+import financeager
+
+from . import clients, exceptions, init_logger, plugin, setup_log_file_handler
+from .asyncserver import AsyncServer
+from .httpservice import json_default
+from .pocket import POCKET_CLASSES, SHARD_PERIODS
+from .server import DEFAULT_MAX_CACHED_RESPONSES
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Not available on Windows, where the daemon is not supported
+    fcntl = None
+
+logger = init_logger(__name__)
+
+DEFAULT_SOCKET_PATH = os.path.join(financeager.CACHE_DIR, "daemon.sock")
+DEFAULT_TIMEOUT = 10
+DEFAULT_IDLE_TIMEOUT = 600
+MAX_REQUEST_SIZE = 16 * 2**20
+# Interval of attempts to connect to a daemon that is being started
+STARTUP_POLL_INTERVAL = 0.01
+# Requests handled by the daemon itself instead of the server
+SETTINGS_COMMAND = "daemon-settings"
+STOP_COMMAND = "daemon-stop"
+
+
+class DaemonRunning(exceptions.FinanceagerException):
+    """Another daemon is serving the socket path."""
+
+
+def service_settings(
+    data_dir=None,
+    database_type="tinydb",
+    max_open_pockets=None,
+    memory_map=False,
+    shard_by="year",
+):
+    """Return the options that the daemon passes to the server, in normalized form.
+    An autostarted daemon is restarted if its settings differ from the client
+    configuration.
+
+    :return: dict
+    """
+    return {
+        "data_dir": None if data_dir is None else os.path.abspath(data_dir),
+        "database_type": database_type,
+        "max_open_pockets": max_open_pockets or 0,
+        "memory_map": bool(memory_map),
+        "shard_by": shard_by,
+    }
+
+
+class Daemon:
+    """Service passing requests received via a UNIX domain socket to an
+    `AsyncServer`.
+
+    A request is a line holding a JSON object of the 'command' and its 'kwargs'. It
+    is answered by a line holding a JSON object with either of the keys 'response'
+    (the response dict of the server), 'invalid' (the error of an invalid request),
+    or 'failure' (for unexpected errors). Requests of a connection are answered in
+    order, requests of different connections are processed concurrently.
+    The daemon itself responds to the commands SETTINGS_COMMAND (with the
+    service_settings() it was started with), and STOP_COMMAND.
+
+    A lock file next to the socket (holding the process ID of the daemon) ensures
+    that only one daemon serves the socket path. If 'idle_timeout' is given, the
+    daemon stops after no connection was open for that many seconds.
+
+    Kwargs (f.i. data_dir) are passed to the AsyncServer.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, idle_timeout=None, **kwargs):
+        self.socket_path = socket_path
+        self._idle_timeout = idle_timeout
+        self.settings = service_settings(
+            **{
+                key: kwargs[key]
+                for key in [
+                    "data_dir",
+                    "database_type",
+                    "max_open_pockets",
+                    "memory_map",
+                    "shard_by",
+                ]
+                if key in kwargs
+            }
+        )
+        self._server = AsyncServer(**kwargs)
+        self._unix_server = None
+        self._lock_file = None
+        self._connections = set()
+        self._idle_timer = None
+        self._stopped = asyncio.Event()
+
+    async def start(self):
+        """Start listening for connections.
+
+        :raise: DaemonRunning if another daemon serves the socket path
+        """
+        if fcntl is None:  # pragma: no cover
+            raise NotImplementedError("The daemon requires UNIX domain sockets")
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        lock_file = open(f"{self.socket_path}.lock", "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise DaemonRunning(f"Another daemon is serving {self.socket_path}")
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+
+        # Remove the socket of a daemon that was killed
+        with suppress(FileNotFoundError):
+            os.remove(self.socket_path)
+        self._unix_server = await asyncio.start_unix_server(
+            self._handle_connection, self.socket_path, limit=MAX_REQUEST_SIZE
+        )
+        os.chmod(self.socket_path, 0o600)
+        self._schedule_idle_stop()
+        logger.info(f"Serving on {self.socket_path}")
+
+    async def serve_forever(self):
+        """Serve until stopped (see stop()), or idle for too long."""
+        if self._unix_server is None:
+            await self.start()
+        await self._stopped.wait()
+
+    def stop(self):
+        """Make serve_forever() return."""
+        self._stopped.set()
+
+    async def close(self):
+        """Stop accepting connections, close open connections, remove the socket,
+        and stop the server.
+        """
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        if self._unix_server is not None:
+            self._unix_server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._unix_server.wait_closed()
+            with suppress(FileNotFoundError):
+                os.remove(self.socket_path)
+        await self._server.close()
+        if self._lock_file is not None:
+            # Releases the lock, after the socket was removed
+            self._lock_file.close()
+
+    def _schedule_idle_stop(self):
+        if self._idle_timeout and not self._connections:
+            self._idle_timer = asyncio.get_running_loop().call_later(
+                self._idle_timeout, self.stop
+            )
+
+    async def _handle_connection(self, reader, writer):
+        self._connections.add(writer)
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Line exceeds the limit of the stream reader
+                    reply = {"invalid": "Request too large"}
+                    writer.write(json.dumps(reply).encode() + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+
+                reply = await self._process(line)
+                writer.write(json.dumps(reply, default=json_default).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.discard(writer)
+            self._schedule_idle_stop()
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _process(self, line):
+        """Run the command of the given request line.
+
+        :return: reply dict
+        """
+        try:
+            request = json.loads(line)
+            command = request["command"]
+            kwargs = request.get("kwargs", {})
+            if not isinstance(command, str) or not isinstance(kwargs, dict):
+                raise TypeError("Expected command string and kwargs object")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return {"invalid": f"Malformed request: {e}"}
+
+        if command == SETTINGS_COMMAND:
+            return {"response": self.settings}
+        if command == STOP_COMMAND:
+            logger.info("Stopping on request")
+            self.stop()
+            return {"response": {}}
+
+        try:
+            response = await self._server.run(command, **kwargs)
+        except Exception:
+            logger.exception(f"Unexpected error when running '{command}'")
+            return {"failure": "Unexpected error"}
+
+        if "error" in response:
+            return {"invalid": response["error"]}
+        return {"response": response}
+
+
+@contextmanager
+def background_daemon(**kwargs):
+    """Run a Daemon in a background thread within the context.
+
+    :yield: the running Daemon
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    daemon = Daemon(**kwargs)
+    try:
+        asyncio.run_coroutine_threadsafe(daemon.start(), loop).result()
+        yield daemon
+    finally:
+        asyncio.run_coroutine_threadsafe(daemon.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def _encode_request(command, kwargs):
+    request = json.dumps({"command": command, "kwargs": kwargs}, default=json_default)
+    return request.encode() + b"\n"
+
+
+def _decode_reply(line):
+    """Extract the response from the reply line of the daemon.
+
+    :return: dict
+    :raises: InvalidRequest if the daemon reports an error in the request
+             CommunicationError on unexpected daemon errors
+             ValueError if the reply is malformed
+    """
+    if not line:
+        raise ConnectionError("Connection closed by daemon")
+    reply = json.loads(line)
+
+    if "response" in reply:
+        return reply["response"]
+    if "invalid" in reply:
+        raise exceptions.InvalidRequest(f"Invalid request: {reply['invalid']}")
+    raise exceptions.CommunicationError(f"Unexpected response: {reply.get('failure')}")
+
+
+def _request(sock, command):
+    """Send a single request via the given socket, and read the reply.
+
+    :return: dict
+    """
+    sock.sendall(_encode_request(command, {}))
+    with sock.makefile("rb") as stream:
+        return _decode_reply(stream.readline())
+
+
+def _wait_for_stop(socket_path, deadline):
+    """Wait until the daemon serving the socket path released its lock file."""
+    with open(f"{socket_path}.lock", "a") as lock_file:
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    raise TimeoutError("Daemon did not stop")
+                time.sleep(STARTUP_POLL_INTERVAL)
+
+
+def _connect(socket_path, timeout, start_command=None, settings=None):
+    """Connect to the daemon. If it is not running, and a 'start_command' is given,
+    the daemon is started by running the command in the background.
+    If 'settings' are given (see service_settings()), and the running daemon was
+    started with other settings, it is stopped and started again by the
+    'start_command'.
+
+    :return: connected socket
+    :raise: ConnectionError if the settings differ, and no 'start_command' is given
+    """
+    deadline = time.monotonic() + timeout
+    process = None
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            sock.close()
+            if start_command is None or time.monotonic() > deadline:
+                raise
+        else:
+            if settings is None:
+                return sock
+            try:
+                daemon_settings = _request(sock, SETTINGS_COMMAND)
+                if daemon_settings == settings:
+                    return sock
+                if start_command is None:
+                    raise ConnectionError(
+                        f"Daemon settings {daemon_settings} differ from {settings}"
+                    )
+                logger.info(f"Restarting daemon with changed settings {settings}")
+                sock.sendall(_encode_request(STOP_COMMAND, {}))
+            except BaseException:
+                sock.close()
+                raise
+            sock.close()
+            _wait_for_stop(socket_path, deadline)
+            process = None
+            continue
+
+        if process is None:
+            logger.debug(f"Starting daemon: {start_command}")
+            process = subprocess.Popen(
+                start_command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        elif process.poll():
+            # A zero exit code indicates that another daemon is being started
+            raise ConnectionError(
+                f"Daemon failed to start (exit code {process.returncode})"
+            )
+        time.sleep(STARTUP_POLL_INTERVAL)
+
+
+class DaemonProxy:
+    """Proxy sending requests to the Daemon via a persistent connection. If the
+    daemon is not running, and a 'start_command' is given, the daemon is started
+    by running the command in the background. If 'settings' are given, the daemon is
+    required to run with them (see _connect()).
+    """
+
+    def __init__(
+        self,
+        socket_path=DEFAULT_SOCKET_PATH,
+        timeout=DEFAULT_TIMEOUT,
+        start_command=None,
+        settings=None,
+    ):
+        self._socket_path = socket_path
+        self._timeout = timeout
+        self._start_command = start_command
+        self._settings = settings
+        self._socket = None
+        self._stream = None
+
+    def run(self, command, **kwargs):
+        """Run the command on the daemon.
+
+        :return: dict
+        :raises: InvalidRequest if the daemon reports an error in the request
+                 CommunicationError on connection or unexpected daemon errors
+        """
+        try:
+            if self._socket is None:
+                self._socket = _connect(
+                    self._socket_path,
+                    self._timeout,
+                    self._start_command,
+                    self._settings,
+                )
+                self._stream = self._socket.makefile("rb")
+            self._socket.sendall(_encode_request(command, kwargs))
+            return _decode_reply(self._stream.readline())
+        except (OSError, ValueError) as e:
+            self.close()
+            raise exceptions.CommunicationError(f"Error communicating with daemon: {e}")
+
+    def close(self):
+        if self._socket is not None:
+            self._stream.close()
+            self._socket.close()
+            self._socket = None
+            self._stream = None
+
+
+class AsyncDaemonProxy(clients.AsyncProxy):
+    """Proxy pipelining requests to the Daemon via a persistent connection (see
+    clients.AsyncProxy). The daemon is started as by the DaemonProxy.
+    """
+
+    def __init__(
+        self,
+        socket_path=DEFAULT_SOCKET_PATH,
+        timeout=DEFAULT_TIMEOUT,
+        start_command=None,
+        settings=None,
+    ):
+        super().__init__(timeout=timeout)
+        self._socket_path = socket_path
+        self._start_command = start_command
+        self._settings = settings
+
+    async def _open_connection(self):
+        sock = await asyncio.to_thread(
+            _connect,
+            self._socket_path,
+            self._timeout,
+            self._start_command,
+            self._settings,
+        )
+        return await asyncio.open_unix_connection(sock=sock, limit=MAX_REQUEST_SIZE)
+
+    def _encode_request(self, command, kwargs):
+        return _encode_request(command, kwargs)
+
+    async def _read_response(self, reader):
+        return _decode_reply(await reader.readline())
+
+
+class DaemonClient(clients.AsyncClient):
+    """Client for communicating with the Daemon."""
+
+    def __init__(self, *, configuration, sinks):
+        """Set up proxies. Unless disabled, the daemon is started with the service
+        options of the configuration if not running, and restarted if running with
+        other service options.
+        """
+        super().__init__(configuration=configuration, sinks=sinks)
+
+        socket_path = configuration.get_option("DAEMON", "socket_path")
+        start_command = None
+        settings = None
+        if configuration.get_option("DAEMON", "autostart"):
+            settings = service_settings(
+                data_dir=financeager.DATA_DIR,
+                database_type=configuration.get_option("SERVICE", "database_type"),
+                max_open_pockets=configuration.get_option(
+                    "SERVICE", "max_open_pockets"
+                ),
+                memory_map=configuration.get_option("SERVICE", "memory_map"),
+                shard_by=configuration.get_option("SERVICE", "shard_by"),
+            )
+            start_command = [
+                sys.executable,
+                "-m",
+                "financeager.daemon",
+                "--socket-path",
+                socket_path,
+                "--data-dir",
+                settings["data_dir"],
+                "--database-type",
+                settings["database_type"],
+                "--max-open-pockets",
+                str(settings["max_open_pockets"]),
+                "--shard-by",
+                settings["shard_by"],
+                "--idle-timeout",
+                str(configuration.get_option("DAEMON", "idle_timeout")),
+            ]
+            if settings["memory_map"]:
+                start_command.append("--memory-map")
+
+        timeout = configuration.get_option("DAEMON", "timeout")
+        options = {
+            "socket_path": socket_path,
+            "timeout": timeout,
+            "start_command": start_command,
+            "settings": settings,
+        }
+        self.proxy = DaemonProxy(**options)
+        self.async_proxy = AsyncDaemonProxy(**options)
+
+    def shutdown(self):
+        """Close the connection to the daemon, leaving it running."""
+        self.proxy.close()
+
+
+class DaemonConfiguration(plugin.PluginConfiguration):
+    """Configuration of the Daemon and the connection to it."""
+
+    def init_defaults(self, config_parser):
+        config_parser["DAEMON"] = {
+            "socket_path": DEFAULT_SOCKET_PATH,
+            "timeout": str(DEFAULT_TIMEOUT),
+            "idle_timeout": str(DEFAULT_IDLE_TIMEOUT),
+            "autostart": "true",
+        }
+
+    def init_option_types(self, option_types):
+        option_types["DAEMON"] = {
+            "timeout": "float",
+            "idle_timeout": "float",
+            "autostart": "boolean",
+        }
+
+    def validate(self, config):
+        if config.get_option("DAEMON", "timeout") <= 0:
+            raise exceptions.InvalidConfigError("Timeout must be positive!")
+        if config.get_option("DAEMON", "idle_timeout") < 0:
+            raise exceptions.InvalidConfigError("Idle timeout must not be negative!")
+
+
+def main():
+    """Entry point of the service plugin."""
+    return plugin.ServicePlugin(
+        name="daemon", config=DaemonConfiguration(), client=DaemonClient
+    )
+
+
+def run_daemon(args=None):
+    """Run the Daemon until it is idle, terminated or interrupted."""
+    parser = argparse.ArgumentParser(
+        prog="python -m financeager.daemon",
+        description="Run the financeager daemon.",
+    )
+    parser.add_argument(
+        "--socket-path",
+        default=DEFAULT_SOCKET_PATH,
+        help="path of the UNIX domain socket (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        help="stop after being idle for the given number of seconds (default: never)",
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=financeager.DATA_DIR,
+        help="directory of the pocket databases (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--database-type",
+        default="tinydb",
+        choices=POCKET_CLASSES,
+        help="type of the pocket databases (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-open-pockets",
+        type=int,
+        help="maximum number of pockets kept open (default: unlimited)",
+    )
+    parser.add_argument(
+        "--memory-map",
+        action="store_true",
+        help="memory-map the files of tinydb pockets, and only parse requested "
+        "entries",
+    )
+    parser.add_argument(
+        "--shard-by",
+        default="year",
+        choices=SHARD_PERIODS,
+        help="period by which sharded-tinydb pockets distribute the entries to "
+        "files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-workers", type=int, help="number of threads processing requests"
+    )
+    parser.add_argument(
+        "--max-cached-responses",
+        type=int,
+        default=DEFAULT_MAX_CACHED_RESPONSES,
+        help="maximum number of cached 'list' responses, 0 disables caching "
+        "(default: %(default)s)",
+    )
+    options = parser.parse_args(args=args)
+    if options.memory_map and options.database_type != "tinydb":
+        parser.error("--memory-map requires the tinydb database type")
+    if options.shard_by != "year" and options.database_type != "sharded-tinydb":
+        parser.error("--shard-by requires the sharded-tinydb database type")
+    os.makedirs(options.data_dir, exist_ok=True)
+    setup_log_file_handler()
+
+    daemon = Daemon(
+        socket_path=options.socket_path,
+        idle_timeout=options.idle_timeout,
+        data_dir=options.data_dir,
+        database_type=options.database_type,
+        max_open_pockets=options.max_open_pockets,
+        memory_map=options.memory_map,
+        shard_by=options.shard_by,
+        max_workers=options.max_workers,
+        max_cached_responses=options.max_cached_responses,
+    )
+
+    async def _serve():
+        try:
+            await daemon.start()
+        except DaemonRunning as e:
+            logger.info(str(e))
+            return
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, daemon.stop)
+        try:
+            await daemon.serve_forever()
+        finally:
+            await daemon.close()
+
+    with suppress(KeyboardInterrupt):
+        asyncio.run(_serve())
+
+
+if __name__ == "__main__":
+    run_daemon()
@@ -0,0 +1,585 @@
+"""Built-in HTTP/JSON service wrapping the server, and the corresponding service
+plugin. Only the standard library is used.
+
+Start the service by
+
+    python -m financeager.httpservice --port 8642
+
+and select it on the client side by setting 'name = http' in the SERVICE section
+of the configuration. Host, port and timeout are configured in the HTTP section.
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import threading
+from collections import namedtuple
+from collections.abc import Mapping
+from contextlib import contextmanager, suppress
+from http import HTTPStatus
+
+import financeager
+
+from . import clients, columnar, exceptions, init_logger, plugin
+from .asyncserver import AsyncServer
+from .pocket import POCKET_CLASSES, SHARD_PERIODS
+from .server import DEFAULT_MAX_CACHED_RESPONSES
+
+logger = init_logger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8642
+DEFAULT_TIMEOUT = 10
+# Number of requests of a connection that are read ahead while a preceding request
+# is being processed
+MAX_PIPELINED_REQUESTS = 16
+MAX_HEADER_FIELDS = 100
+MAX_BODY_SIZE = 16 * 2**20
+JSON_MEDIA_TYPE = "application/json"
+
+_Request = namedtuple("_Request", ["method", "path", "body", "keep_alive", "accept"])
+
+
+class _BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def json_default(obj):
+    """Serialize objects of server responses that the json module can't handle.
+    Elements might be other mappings than dicts (pocket.utils.DocumentView), and
+    errors are exceptions.
+    """
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, Exception):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+async def _read_request(reader):
+    """Read an HTTP/1.x request from the stream.
+
+    :return: _Request, or None if the stream ended before a request was sent
+    :raise: _BadRequest if the request is malformed or too large
+    """
+    try:
+        line = await reader.readline()
+        if not line:
+            return None
+
+        try:
+            method, path, version = line.decode("latin-1").split()
+        except ValueError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise _BadRequest(
+                HTTPStatus.HTTP_VERSION_NOT_SUPPORTED, f"Unsupported version {version}"
+            )
+
+        headers = {}
+        for _ in range(MAX_HEADER_FIELDS + 1):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, separator, value = line.decode("latin-1").partition(":")
+            if not separator:
+                raise _BadRequest(HTTPStatus.BAD_REQUEST, "Malformed header field")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise _BadRequest(
+                HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many header fields"
+            )
+    except ValueError:
+        # Line exceeds the limit of the stream reader
+        raise _BadRequest(
+            HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Header line too long"
+        )
+
+    if "transfer-encoding" in headers:
+        raise _BadRequest(HTTPStatus.NOT_IMPLEMENTED, "Transfer encoding not supported")
+    try:
+        content_length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise _BadRequest(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    if not 0 <= content_length <= MAX_BODY_SIZE:
+        raise _BadRequest(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Invalid body size")
+    body = await reader.readexactly(content_length)
+
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        keep_alive = connection != "close"
+    else:
+        keep_alive = connection == "keep-alive"
+
+    return _Request(method, path, body, keep_alive, headers.get("accept", ""))
+
+
+def _negotiate_media_type(accept):
+    """Return the first binary media type of the Accept header that is supported
+    (see columnar.pack()), or None for JSON.
+    """
+    for media_range in accept.split(","):
+        media_type = media_range.partition(";")[0].strip().lower()
+        if media_type == JSON_MEDIA_TYPE:
+            break
+        if media_type in columnar.media_types():
+            return media_type
+    return None
+
+
+def _encode_response(status, response, keep_alive, media_type=None):
+    if media_type is None:
+        media_type = JSON_MEDIA_TYPE
+        body = json.dumps(response, default=json_default).encode()
+    else:
+        body = columnar.pack(response, media_type, default=json_default)
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {media_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+class HttpService:
+    """HTTP/1.1 service passing requests to an `AsyncServer`.
+
+    The request 'POST /<command>' with a JSON object of keyword arguments as body
+    is run as `AsyncServer.run(command, **kwargs)`. The response dict is returned
+    as JSON with status 200, or 400 if it holds an error. If the Accept header of
+    the request prefers a binary media type (see columnar.media_types()), the
+    response is serialized accordingly.
+
+    Connections are kept alive unless the client requests otherwise. Pipelined
+    requests of a connection are read ahead while the preceding request is
+    processed, and answered in order. Requests of different connections are
+    processed concurrently.
+
+    Kwargs (f.i. data_dir) are passed to the AsyncServer.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, **kwargs):
+        self.host = host
+        self.port = port
+        self._server = AsyncServer(**kwargs)
+        self._tcp_server = None
+        self._connections = set()
+
+    async def start(self):
+        """Start listening for connections. If port 0 was specified, the 'port'
+        attribute is set to the port assigned by the OS.
+        """
+        self._tcp_server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._tcp_server.sockets[0].getsockname()[1]
+        logger.info(f"Serving on {self.host}:{self.port}")
+
+    async def serve_forever(self):
+        if self._tcp_server is None:
+            await self.start()
+        await self._tcp_server.serve_forever()
+
+    async def close(self):
+        """Stop accepting connections, close open connections, and stop the
+        server.
+        """
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._tcp_server.wait_closed()
+        await self._server.close()
+
+    async def _handle_connection(self, reader, writer):
+        self._connections.add(writer)
+        requests = asyncio.Queue(maxsize=MAX_PIPELINED_REQUESTS)
+        read_task = asyncio.create_task(self._read_requests(reader, requests))
+
+        try:
+            while (request := await requests.get()) is not None:
+                media_type = None
+                if isinstance(request, _BadRequest):
+                    status, response = request.status, {"error": str(request)}
+                    keep_alive = False
+                else:
+                    status, response = await self._process(request)
+                    keep_alive = request.keep_alive
+                    media_type = _negotiate_media_type(request.accept)
+
+                writer.write(_encode_response(status, response, keep_alive, media_type))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            read_task.cancel()
+            self._connections.discard(writer)
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    @staticmethod
+    async def _read_requests(reader, requests):
+        """Read requests from the stream and put them into the queue until the
+        connection is to be closed. A final None marks the end.
+        """
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except _BadRequest as e:
+                    await requests.put(e)
+                    break
+                if request is None:
+                    break
+                await requests.put(request)
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        await requests.put(None)
+
+    async def _process(self, request):
+        """Run the command of the given request.
+
+        :return: tuple of HTTPStatus and response dict
+        """
+        if request.method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "Only POST is supported"}
+
+        command = request.path.strip("/")
+        if not command or "/" in command:
+            return HTTPStatus.NOT_FOUND, {"error": f"Invalid path {request.path}"}
+
+        try:
+            kwargs = json.loads(request.body or b"{}")
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON: {e}"}
+        if not isinstance(kwargs, dict):
+            return HTTPStatus.BAD_REQUEST, {"error": "Expected JSON object"}
+
+        try:
+            response = await self._server.run(command, **kwargs)
+        except Exception:
+            logger.exception(f"Unexpected error when running '{command}'")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Unexpected error"}
+
+        if "error" in response:
+            return HTTPStatus.BAD_REQUEST, response
+        return HTTPStatus.OK, response
+
+
+@contextmanager
+def background_service(**kwargs):
+    """Run an HttpService in a background thread within the context. Pass port=0
+    to bind to a free port.
+
+    :yield: the running HttpService
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    service = HttpService(**kwargs)
+    try:
+        asyncio.run_coroutine_threadsafe(service.start(), loop).result()
+        yield service
+    finally:
+        asyncio.run_coroutine_threadsafe(service.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def _response_content(status, content):
+    """Return the content of a response of the HttpService.
+
+    :raises: InvalidRequest if the service reports an error in the request
+             CommunicationError on unexpected service errors
+    """
+    if status == HTTPStatus.BAD_REQUEST and "error" in content:
+        raise exceptions.InvalidRequest(f"Invalid request: {content['error']}")
+    if status != HTTPStatus.OK:
+        raise exceptions.CommunicationError(
+            f"Unexpected response ({status}): {content.get('error')}"
+        )
+    return content
+
+
+def _encode_kwargs(command, kwargs, compact):
+    if compact and command == "list":
+        kwargs = {"columnar": True, **kwargs}
+    return json.dumps(kwargs, default=json_default).encode()
+
+
+def _request_headers(compact):
+    headers = {"Content-Type": JSON_MEDIA_TYPE}
+    if compact:
+        headers["Accept"] = ", ".join(columnar.media_types() + [JSON_MEDIA_TYPE])
+    return headers
+
+
+def _decode_body(data, content_type):
+    """:raise: ValueError if the body is malformed"""
+    media_type = (content_type or JSON_MEDIA_TYPE).partition(";")[0].strip().lower()
+    if media_type == JSON_MEDIA_TYPE:
+        return json.loads(data)
+    return columnar.unpack(data, media_type)
+
+
+class HttpProxy:
+    """Proxy sending requests to the HttpService via a persistent connection.
+
+    If 'compact' is true, responses are requested in binary serialization, and
+    the entries of 'list' responses in columnar representation (see columnar).
+    """
+
+    def __init__(
+        self,
+        host=DEFAULT_HOST,
+        port=DEFAULT_PORT,
+        timeout=DEFAULT_TIMEOUT,
+        compact=False,
+    ):
+        self._connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        self._compact = compact
+
+    def run(self, command, **kwargs):
+        """Run the command on the service.
+
+        :return: dict
+        :raises: InvalidRequest if the service reports an error in the request
+                 CommunicationError on connection or unexpected service errors
+        """
+        body = _encode_kwargs(command, kwargs, self._compact)
+        try:
+            status, content_type, data = self._request(command, body)
+            content = _decode_body(data, content_type)
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self._connection.close()
+            raise exceptions.CommunicationError(
+                f"Error communicating with service: {e}"
+            )
+
+        return _response_content(status, content)
+
+    def _request(self, command, body):
+        # The service might have closed the idle connection. Since the request was
+        # not received then, retry it once on a new connection
+        reused = self._connection.sock is not None
+        try:
+            return self._send(command, body)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            self._connection.close()
+            if not reused:
+                raise
+        return self._send(command, body)
+
+    def _send(self, command, body):
+        self._connection.request(
+            "POST",
+            f"/{command}",
+            body=body,
+            headers=_request_headers(self._compact),
+        )
+        response = self._connection.getresponse()
+        data = response.read()
+        if response.will_close:
+            self._connection.close()
+        return response.status, response.getheader("Content-Type"), data
+
+    def close(self):
+        self._connection.close()
+
+
+class AsyncHttpProxy(clients.AsyncProxy):
+    """Proxy pipelining requests to the HttpService via a persistent connection (see
+    clients.AsyncProxy). For 'compact', see HttpProxy.
+    """
+
+    def __init__(
+        self,
+        host=DEFAULT_HOST,
+        port=DEFAULT_PORT,
+        timeout=DEFAULT_TIMEOUT,
+        compact=False,
+    ):
+        super().__init__(timeout=timeout)
+        self._host = host
+        self._port = port
+        self._compact = compact
+
+    async def _open_connection(self):
+        return await asyncio.open_connection(self._host, self._port)
+
+    def _encode_request(self, command, kwargs):
+        body = _encode_kwargs(command, kwargs, self._compact)
+        headers = _request_headers(self._compact)
+        head = (
+            f"POST /{command} HTTP/1.1\r\n"
+            f"Host: {self._host}\r\n"
+            + "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+            + f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        )
+        return head.encode() + body
+
+    async def _read_response(self, reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by service")
+        _, status, *_ = line.split()
+
+        headers = {}
+        for _ in range(MAX_HEADER_FIELDS + 1):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ValueError("Too many header fields")
+
+        data = await reader.readexactly(int(headers.get("content-length", 0)))
+        content = _decode_body(data, headers.get("content-type"))
+        return _response_content(int(status), content)
+
+
+class HttpClient(clients.AsyncClient):
+    """Client for communicating with the HttpService."""
+
+    def __init__(self, *, configuration, sinks):
+        """Set up proxies."""
+        super().__init__(configuration=configuration, sinks=sinks)
+
+        options = {
+            "host": configuration.get_option("HTTP", "host"),
+            "port": configuration.get_option("HTTP", "port"),
+            "timeout": configuration.get_option("HTTP", "timeout"),
+            "compact": configuration.get_option("HTTP", "compact_responses"),
+        }
+        self.proxy = HttpProxy(**options)
+        self.async_proxy = AsyncHttpProxy(**options)
+
+    def shutdown(self):
+        """Close the connection to the service."""
+        self.proxy.close()
+
+
+class HttpConfiguration(plugin.PluginConfiguration):
+    """Configuration of the connection to the HttpService."""
+
+    def init_defaults(self, config_parser):
+        config_parser["HTTP"] = {
+            "host": DEFAULT_HOST,
+            "port": str(DEFAULT_PORT),
+            "timeout": str(DEFAULT_TIMEOUT),
+            "compact_responses": "false",
+        }
+
+    def init_option_types(self, option_types):
+        option_types["HTTP"] = {
+            "port": "int",
+            "timeout": "float",
+            "compact_responses": "boolean",
+        }
+
+    def validate(self, config):
+        if not 0 < config.get_option("HTTP", "port") < 2**16:
+            raise exceptions.InvalidConfigError("Invalid port number!")
+        if config.get_option("HTTP", "timeout") <= 0:
+            raise exceptions.InvalidConfigError("Timeout must be positive!")
+
+
+def main():
+    """Entry point of the service plugin."""
+    return plugin.ServicePlugin(
+        name="http", config=HttpConfiguration(), client=HttpClient
+    )
+
+
+def run_service(args=None):
+    """Run the HttpService until interrupted."""
+    parser = argparse.ArgumentParser(
+        prog="python -m financeager.httpservice",
+        description="Run the financeager HTTP/JSON service.",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to bind to")
+    parser.add_argument("--port", default=DEFAULT_PORT, type=int, help="port")
+    parser.add_argument(
+        "--data-dir",
+        default=financeager.DATA_DIR,
+        help="directory of the pocket databases (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--database-type",
+        default="tinydb",
+        choices=POCKET_CLASSES,
+        help="type of the pocket databases (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-open-pockets",
+        type=int,
+        help="maximum number of pockets kept open (default: unlimited)",
+    )
+    parser.add_argument(
+        "--memory-map",
+        action="store_true",
+        help="memory-map the files of tinydb pockets, and only parse requested "
+        "entries",
+    )
+    parser.add_argument(
+        "--shard-by",
+        default="year",
+        choices=SHARD_PERIODS,
+        help="period by which sharded-tinydb pockets distribute the entries to "
+        "files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-workers", type=int, help="number of threads processing requests"
+    )
+    parser.add_argument(
+        "--max-cached-responses",
+        type=int,
+        default=DEFAULT_MAX_CACHED_RESPONSES,
+        help="maximum number of cached 'list' responses, 0 disables caching "
+        "(default: %(default)s)",
+    )
+    options = parser.parse_args(args=args)
+    if options.memory_map and options.database_type != "tinydb":
+        parser.error("--memory-map requires the tinydb database type")
+    if options.shard_by != "year" and options.database_type != "sharded-tinydb":
+        parser.error("--shard-by requires the sharded-tinydb database type")
+    os.makedirs(options.data_dir, exist_ok=True)
+
+    service = HttpService(
+        host=options.host,
+        port=options.port,
+        data_dir=options.data_dir,
+        database_type=options.database_type,
+        max_open_pockets=options.max_open_pockets,
+        memory_map=options.memory_map,
+        shard_by=options.shard_by,
+        max_workers=options.max_workers,
+        max_cached_responses=options.max_cached_responses,
+    )
+
+    async def _serve():
+        try:
+            await service.serve_forever()
+        finally:
+            await service.close()
+
+    with suppress(KeyboardInterrupt):
+        asyncio.run(_serve())
+
+
+if __name__ == "__main__":
+    run_service()
@@ -2,7 +2,10 @@
 
 from json import dumps as jdumps
 
-from . import DEFAULT_TABLE, RECURRENT_TABLE
+from rich.console import Group
+from rich.rule import Rule
+
+from . import DEFAULT_TABLE, RECURRENT_TABLE, columnar
 from .entries import BaseEntry, CategoryEntry
 from .rich import richify_listings, richify_recurrent_elements
 
@@ -21,8 +24,14 @@ class Listing:
         """Create listing from list of element dictionaries"""
         listing = cls(name=name)
         for element in elements:
-            category = element.pop("category", None) or default_category
-            listing.add_entry(BaseEntry(**element), category_name=category)
+            category = element.get("category") or default_category
+            entry = BaseEntry(
+                name=element["name"],
+                value=element["value"],
+                date=element["date"],
+                eid=element.get("eid", 0),
+            )
+            listing.add_entry(entry, category_name=category)
         return listing
 
     def add_entry(self, entry, category_name=None):
@@ -92,8 +101,9 @@ def prettify(
     default_category=None,
     **listing_options,
 ):
-    """Sort the given elements (type acc. to Pocket._search_all_tables) by
-    positive and negative value and print tabular representation.
+    """Sort the given elements (type acc. to Pocket._search_all_tables, or in
+    columnar representation) by positive and negative value and print tabular
+    representation.
 
     :param json: If True, return elements as JSON-formatted string
     :param recurrent_only: If True, assume that given elements are purely
@@ -101,6 +111,8 @@ def prettify(
     :param listing_options: Options passed to rich.richify_listings()
     """
     if json:
+        if columnar.is_columnar(elements):
+            elements = columnar.decode(elements)
         return jdumps(elements)
 
     if recurrent_only:
@@ -111,30 +123,59 @@ def prettify(
     return richify_listings(listings, **listing_options)
 
 
+def prettify_pockets(pocket_elements, json=False, **options):
+    """Create a representation of the elements of multiple pockets, each labeled
+    by the pocket name.
+
+    :param pocket_elements: dict mapping pocket names to elements (see prettify())
+    :param json: If True, return the dict as JSON-formatted string
+    :param options: options passed to prettify()
+    :return: str or rich renderable
+    """
+    if json:
+        pocket_elements = {
+            name: columnar.decode(e) if columnar.is_columnar(e) else e
+            for name, e in pocket_elements.items()
+        }
+        return jdumps(pocket_elements)
+
+    renderables = []
+    for name, elements in pocket_elements.items():
+        renderables.append(Rule(f"Pocket {name}"))
+        renderables.append(prettify(elements, **options))
+    return Group(*renderables)
+
+
 def _derive_listings(elements, *, default_category):
     earnings = []
     expenses = []
 
     def _sort(eid, element):
-        # Copying avoids modifying the original element. Flattening is in order
-        # to distinguish recurrent entries (they have the same element ID which
-        # thus can't be used as dict key)
-        flat_element = element.copy()
-        flat_element["eid"] = eid
-        if flat_element["value"] > 0:
-            earnings.append(flat_element)
+        # Flattening is in order to distinguish recurrent entries (they have the
+        # same element ID which thus can't be used as dict key). Elements already
+        # holding their ID are used as-is; others are copied to avoid modifying the
+        # original element
+        if element.get("eid") != eid:
+            element = {**element, "eid": eid}
+        if element["value"] > 0:
+            earnings.append(element)
         else:
-            expenses.append(flat_element)
-
-    # process standard elements
-    for eid, element in elements[DEFAULT_TABLE].items():
-        _sort(eid, element)
-
-    # process recurrent elements, i.e. for each eid iterate list
-    for eid, recurrent_elements in elements[RECURRENT_TABLE].items():
-        for element in recurrent_elements:
+            expenses.append(element)
+
+    if columnar.is_columnar(elements):
+        for table_name in [DEFAULT_TABLE, RECURRENT_TABLE]:
+            for eid, element in columnar.iter_elements(elements, table_name):
+                _sort(eid, element)
+    else:
+        # process standard elements
+        for eid, element in elements[DEFAULT_TABLE].items():
             _sort(eid, element)
 
+        # process recurrent elements, i.e. for each eid iterate list
+        for eid, recurrent_elements in elements[RECURRENT_TABLE].items():
+            for element in recurrent_elements:
+                _sort(eid, element)
+
     if not earnings and not expenses:
         return
 
@@ -1,6 +1,8 @@
 """Local server proxy for direct communication (client and server reside in
 common process)."""
 
+from collections.abc import Mapping
+
 from . import exceptions, init_logger, server
 
 logger = init_logger(__name__)
@@ -13,12 +15,14 @@ class Proxy(server.Server):
         """Run command on local server. Exceptions are propagated upwards. Call
         run('stop') as last operation to properly close the databases before
         exiting the process.
+        The response is a copy holding plain dicts, hence the caller may modify it
+        without affecting results cached by the server.
 
         :raises: InvalidRequest on invalid request
                  CommunicationError on unexpected server error
         """
         try:
-            response = super().run(command, **kwargs)
+            response = _to_plain(super().run(command, **kwargs))
         except Exception:
             logger.exception("Unexpected error")
             raise exceptions.CommunicationError("Unexpected error")
@@ -27,3 +31,14 @@ class Proxy(server.Server):
             raise exceptions.InvalidRequest(f"Invalid request: {response['error']}")
 
         return response
+
+
+def _to_plain(obj):
+    """Return a copy of the given JSON-like object in which all mappings are dicts
+    (e.g. instead of pocket.utils.DocumentView), and all lists are new lists.
+    """
+    if isinstance(obj, Mapping):
+        return {k: _to_plain(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_to_plain(v) for v in obj]
+    return obj
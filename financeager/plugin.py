@@ -1,6 +1,7 @@
 """Support for plugin development."""
 
 import abc
+from importlib import import_module
 
 
 class PluginConfiguration(abc.ABC):
@@ -65,3 +66,21 @@ class ServicePlugin(PluginBase):
     def __init__(self, *, name, config, client, cli_options=None):
         super().__init__(name=name, config=config, cli_options=cli_options)
         self.client = client
+
+
+# Modules providing the service plugins shipped with financeager. A module is only
+# imported when its service is selected
+BUILTIN_SERVICES = {
+    "http": "financeager.httpservice",
+    "daemon": "financeager.daemon",
+}
+
+
+def load_builtin_service(name):
+    """Return the ServicePlugin of the built-in service 'name', or None if there is
+    no such service.
+    """
+    module_name = BUILTIN_SERVICES.get(name)
+    if module_name is None:
+        return None
+    return import_module(module_name).main()
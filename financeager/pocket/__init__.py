@@ -1,4 +1,58 @@
-from .sqlite import SqlitePocket
-from .tinydb import TinyDbPocket
+"""Pocket implementations per database type.
 
-POCKET_CLASSES = {"tinydb": TinyDbPocket, "sqlite": SqlitePocket}
+The implementations pull in marshmallow, dateutil and tinydb. They are imported
+on first access so that importing this package (e.g. to validate a database type)
+is cheap.
+"""
+
+from collections.abc import Mapping
+from importlib import import_module
+
+FREQUENCY_CHOICES = [
+    "yearly",
+    "half-yearly",
+    "quarter-yearly",
+    "bimonthly",
+    "monthly",
+    "weekly",
+    "daily",
+]
+
+# Periods by which the sharded-tinydb database type distributes entries to shards
+SHARD_PERIODS = ["year", "month"]
+
+# Module and name of the Pocket class per database type
+_POCKET_CLASS_PATHS = {
+    "tinydb": ("tinydb", "TinyDbPocket"),
+    "sqlite": ("sqlite", "SqlitePocket"),
+    "sharded-tinydb": ("sharded", "ShardedTinyDbPocket"),
+}
+
+
+def _import_class(module_name, class_name):
+    return getattr(import_module(f".{module_name}", __name__), class_name)
+
+
+class _PocketClasses(Mapping):
+    """Mapping of database type to Pocket class. The class is imported when it is
+    accessed.
+    """
+
+    def __getitem__(self, database_type):
+        return _import_class(*_POCKET_CLASS_PATHS[database_type])
+
+    def __iter__(self):
+        return iter(_POCKET_CLASS_PATHS)
+
+    def __len__(self):
+        return len(_POCKET_CLASS_PATHS)
+
+
+POCKET_CLASSES = _PocketClasses()
+
+
+def __getattr__(name):
+    for module_name, class_name in _POCKET_CLASS_PATHS.values():
+        if name == class_name:
+            return _import_class(module_name, class_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
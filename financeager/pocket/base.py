@@ -1,6 +1,7 @@
 """Defines Pocket database object holding financial data."""
 
 from collections import Counter, defaultdict
+from contextlib import contextmanager
 from datetime import datetime as dt
 
 from dateutil import rrule
@@ -14,17 +15,16 @@ from .. import (
     UNSET_INDICATOR,
     exceptions,
 )
+from . import FREQUENCY_CHOICES
+from .utils import strip_eid
 
 _DEFAULT_CATEGORY = None
-FREQUENCY_CHOICES = [
-    "yearly",
-    "half-yearly",
-    "quarter-yearly",
-    "bimonthly",
-    "monthly",
-    "weekly",
-    "daily",
-]
+# Fields that entries of the tables can be filtered for. Recurrent entries are
+# filtered for the date of the entries generated from them
+_FILTER_FIELDS = {
+    DEFAULT_TABLE: {"name", "value", "category", "date"},
+    RECURRENT_TABLE: {"name", "value", "category", "frequency", "start", "end", "date"},
+}
 
 
 class EntryBaseSchema(Schema):
@@ -50,6 +50,10 @@ class RecurrentEntrySchema(EntryBaseSchema):
 
 
 class Pocket:
+    # Whether entries can be queried from multiple threads at once. Modifications
+    # must always be serialized by the caller
+    concurrent_reads = False
+
     def __init__(self, db_interface, name=None):
         """Create Pocket object. Its name defaults to the current year if not
         specified.
@@ -57,13 +61,23 @@ class Pocket:
         self._name = f"{name or DEFAULT_POCKET_NAME}"
         self.db_interface = db_interface
 
-        # Create category cache after db_interface is initialized
-        self._create_category_cache()
+        # Created on first use, see _category_cache
+        self._category_counts = None
 
     @property
     def name(self):
         return self._name
 
+    @property
+    def _category_cache(self):
+        """Category cache (see _create_category_cache()). Reading the database
+        content is deferred until the cache is used (i.e. when adding an entry
+        without category) since most commands don't need it.
+        """
+        if self._category_counts is None:
+            self._create_category_cache()
+        return self._category_counts
+
     def add_entry(self, table_name=None, **kwargs):
         """Add an entry (standard or recurrent) to the database.
 
@@ -170,6 +184,67 @@ class Pocket:
 
         return element_id
 
+    def copy_entries(self, source, filters=None, table_name=None):
+        """Copy the entries of the source pocket that match the items of the filters
+        dict, if specified, to this pocket within a single transaction. The entries
+        are copied as-is, i.e. without validation, and assigned new IDs.
+        As for get_entries(), a date filter selects recurrent entries by the dates of
+        the entries generated from them.
+
+        :param source: Pocket to copy from (may be this one)
+        :param filters: dict of fields and patterns (see get_entries())
+        :param table_name: name of the table to copy from and to. Default: 'standard'
+
+        :raise: PocketValidationFailure if table name or filter fields unknown
+        :return: number of copied entries
+        """
+        table_name = table_name or DEFAULT_TABLE
+        if table_name not in [RECURRENT_TABLE, DEFAULT_TABLE]:
+            raise exceptions.PocketValidationFailure(
+                f"Unknown table name: {table_name}"
+            )
+
+        # Don't modify the filters passed by the caller
+        filters = dict(filters or {})
+        unknown_fields = sorted(set(filters) - _FILTER_FIELDS[table_name])
+        if unknown_fields:
+            raise exceptions.PocketValidationFailure(
+                f"Unknown filter field(s) for table '{table_name}': "
+                f"{', '.join(unknown_fields)}"
+            )
+
+        date_pattern = None
+        if table_name == RECURRENT_TABLE:
+            date_pattern = filters.pop("date", None)
+
+        if date_pattern is None:
+            tally = self.db_interface.copy_from(
+                source.db_interface, table_name, filters=filters
+            )
+        else:
+            tally = self._copy_recurrent_entries(source, filters, date_pattern)
+        if table_name == DEFAULT_TABLE and self._category_counts is not None:
+            for (name, category), count in tally.items():
+                self._category_counts[name][category] += count
+
+        return sum(tally.values())
+
+    def _copy_recurrent_entries(self, source, filters, date_pattern):
+        """Copy the recurrent entries of the source pocket that match the filters,
+        and of which any generated entry matches the date pattern.
+
+        :return: Counter of the (name, category) pairs of the copied entries
+        """
+        date_filter = self._date_filter(date_pattern)
+        elements = [
+            strip_eid(element)
+            for element in source.db_interface.retrieve(RECURRENT_TABLE, filters)
+            if any(date_filter(e) for e in source._create_recurrent_elements(element))
+        ]
+        with self.transaction():
+            self.db_interface.create_many(RECURRENT_TABLE, elements)
+        return Counter((e["name"], e["category"]) for e in elements)
+
     def get_entries(self, filters=None, recurrent_only=False):
         """Get entries that match the items of the filters dict, if specified.
 
@@ -197,6 +272,48 @@ class Pocket:
         category_names.discard(_DEFAULT_CATEGORY)
         return sorted(category_names)
 
+    def storage_version(self):
+        """Return a value that changes whenever the stored data is modified (see
+        DatabaseInterface.storage_version()).
+        """
+        return self.db_interface.storage_version()
+
+    def get_stats(self):
+        """Return statistics about the pocket, organized in sections (see
+        DatabaseInterface.get_stats()). Additionally, 'recurrent' holds the number
+        of recurrent entries ('templates'), and of the entries generated from them
+        until today ('occurrences'). 'category_cache' holds the number of entry
+        names tracked by the category cache (None if not created yet).
+        """
+        stats = self.db_interface.get_stats()
+
+        templates = self.db_interface.retrieve(RECURRENT_TABLE)
+        stats["recurrent"] = {
+            "templates": len(templates),
+            "occurrences": sum(
+                1 for e in templates for _ in self._create_recurrent_elements(e)
+            ),
+        }
+        stats["category_cache"] = {
+            "names": (
+                None if self._category_counts is None else len(self._category_counts)
+            )
+        }
+        return stats
+
+    @contextmanager
+    def transaction(self):
+        """Group the modifications within the context (see
+        DatabaseInterface.transaction()). If an exception is raised, the category
+        cache is discarded, and created from the database content on next use.
+        """
+        try:
+            with self.db_interface.transaction():
+                yield
+        except BaseException:
+            self._category_counts = None
+            raise
+
     def close(self):
         """Close underlying database."""
         self.db_interface.close()
@@ -206,9 +323,9 @@ class Pocket:
         database (excluding recurrent elements), keeping track of the
         categories the element was labeled with. This allows deriving the
         category of an element if not explicitly given."""
-        self._category_cache = defaultdict(Counter)
+        self._category_counts = defaultdict(Counter)
         for element in self.db_interface.retrieve(DEFAULT_TABLE):
-            self._category_cache[element["name"]].update([element["category"]])
+            self._category_counts[element["name"]].update([element["category"]])
 
     def _preprocess_entry(self, raw_data=None, table_name=None, partial=False):
         """Perform preprocessing steps (validation, conversion, substitution) of
@@ -352,24 +469,31 @@ class Pocket:
 
         :raise: PocketEntryNotFound if element not found when updating
         """
+        # The existence of the entry is verified even if the cache is not in use
+        if eid is not None:
+            # raises a PocketEntryNotFound if eid is not found
+            old_entry = self.get_entry(eid=eid, table_name=table_name)
+
+        if self._category_counts is None:
+            # Not created yet; the modification is accounted for when the cache is
+            # created from the database content
+            return
 
         if eid is None:
             name = fields["name"]
             category = fields["category"]
             if removing:
-                self._category_cache[name][category] -= 1
+                self._category_counts[name][category] -= 1
             else:
-                self._category_cache[name].update([category])
+                self._category_counts[name].update([category])
         else:
-            # raises a PocketEntryNotFound if eid is not found
-            old_entry = self.get_entry(eid=eid, table_name=table_name)
             old_name = old_entry["name"]
             old_category = old_entry["category"]
 
             # update category cache if one of name or category was changed
             if fields.get("name") is not None or fields.get("category") is not None:
-                self._category_cache[old_name][old_category] -= 1
-                self._category_cache[fields.get("name") or old_name][
+                self._category_counts[old_name][old_category] -= 1
+                self._category_counts[fields.get("name") or old_name][
                     fields.get("category") or old_category
                 ] += 1
 
@@ -418,13 +542,12 @@ class Pocket:
         # the recurrent table, too, and are hence passed to the retrieve() call.
         # Filtering of the date field happens via a lambda function in Python after
         # instantiations of recurrent entries have been created.
-        date_filter = lambda _: True
         date_pattern = None
         if filters:
+            # Don't modify the filters passed by the caller
+            filters = dict(filters)
             date_pattern = filters.pop("date", None)
-        if date_pattern is not None:
-            date_pattern = date_pattern.lower()
-            date_filter = lambda row: date_pattern in row["date"].lower()
+        date_filter = self._date_filter(date_pattern)
 
         # all recurrent elements are generated, and the ones matching the
         # condition are appended to a list that is stored under their generating
@@ -436,6 +559,16 @@ class Pocket:
 
         return elements
 
+    @staticmethod
+    def _date_filter(date_pattern):
+        """Return a function checking whether the date of a generated element contains
+        the pattern (case-insensitive). Any element matches if the pattern is None.
+        """
+        if date_pattern is None:
+            return lambda _: True
+        date_pattern = date_pattern.lower()
+        return lambda row: date_pattern in row["date"].lower()
+
     def _create_recurrent_elements(self, element):
         """Generate elements (holding name, value, category, date) from the
         information of the recurrent element being passed.
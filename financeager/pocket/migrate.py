@@ -1,22 +1,45 @@
 """Migration utilities for converting TinyDB pockets to SQLite pockets."""
 
+import hashlib
 import json
+import math
+import os
 import os.path
-
-from tinydb import TinyDB
+import sqlite3
 
 from .. import DEFAULT_TABLE, RECURRENT_TABLE
-from .sqlite import SqlitePocket
+from .mmapjson import MemoryMappedTables
+from .replicate import DEFAULT_BATCH_SIZE, replicate
+from .sqlite import SqliteInterface
+from .tinydb import TinyDbInterface
+
+# Columns of the SQLite tables, in insertion order
+_COLUMNS = {
+    DEFAULT_TABLE: ("eid", "name", "date", "category", "value"),
+    RECURRENT_TABLE: ("eid", "name", "start", "end", "frequency", "category", "value"),
+}
+# Digests are sums of SHA-256 hashes of rows, and hence independent of row order
+_DIGEST_MODULUS = 2**256
+# Maximum number of mismatches reported by verify_migration()
+DEFAULT_MAX_MISMATCHES = 10
 
 
-def migrate_pocket(pocket_name, data_dir):
+def migrate_pocket(pocket_name, data_dir, batch_size=DEFAULT_BATCH_SIZE, progress=None):
     """Migrate a TinyDB pocket to SQLite format.
 
+    The entries of the TinyDB file are parsed one by one (see
+    TinyDbInterface.iter_rows()), and inserted in batches within a single
+    transaction, preserving their IDs. If migration fails, the SQLite file is
+    removed.
+
     :param pocket_name: name of the pocket to migrate (without extension)
     :param data_dir: directory containing the pocket files
+    :param batch_size: number of entries inserted at once
+    :param progress: optional callable that is passed the number of migrated entries
+        after each batch
     :return: dict with migration statistics
     :raises: FileNotFoundError if TinyDB file doesn't exist
-    :raises: ValueError if TinyDB file contains invalid JSON
+    :raises: ValueError if TinyDB file contains invalid JSON or invalid entries
     :raises: Exception for other errors during migration
     """
     # Validate that TinyDB file exists
@@ -24,16 +47,6 @@ def migrate_pocket(pocket_name, data_dir):
     if not os.path.exists(tinydb_path):
         raise FileNotFoundError(f"TinyDB file not found: {tinydb_path}")
 
-    # Validate JSON before attempting to open with TinyDB
-    try:
-        with open(tinydb_path, "r") as f:
-            content = f.read()
-            # Handle empty file case (valid for TinyDB)
-            if content.strip():
-                json.loads(content)
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Invalid JSON in {tinydb_path}: {e.msg}")
-
     # Check if SQLite file already exists
     sqlite_path = os.path.join(data_dir, f"{pocket_name}.sqlite")
     if os.path.exists(sqlite_path):
@@ -42,65 +55,207 @@ def migrate_pocket(pocket_name, data_dir):
             "Please remove or rename it before migrating."
         )
 
-    tinydb = TinyDB(tinydb_path)
-    sqlite_pocket = SqlitePocket(name=pocket_name, data_dir=data_dir)
-
-    # Get the database connection for direct migration
-    # We need direct access to insert with specific eid values
-    # Note: Table names (DEFAULT_TABLE, RECURRENT_TABLE) are validated
-    # module constants, making f-string usage safe here
-    conn = sqlite_pocket.db_interface._conn
-
-    # Migrate standard table using bulk insert
-    standard_entries = tinydb.table(DEFAULT_TABLE).all()
-    if standard_entries:
-        standard_data = [
-            (
-                entry.doc_id,
-                entry["name"],
-                entry["date"],
-                entry.get("category"),
-                entry["value"],
-            )
-            for entry in standard_entries
-        ]
-        conn.executemany(
-            f"INSERT INTO {DEFAULT_TABLE} "
-            "(eid, name, date, category, value) VALUES (?, ?, ?, ?, ?)",
-            standard_data,
-        )
-    standard_count = len(standard_entries)
-
-    # Migrate recurrent table using bulk insert
-    recurrent_entries = tinydb.table(RECURRENT_TABLE).all()
-    if recurrent_entries:
-        recurrent_data = [
-            (
-                entry.doc_id,
-                entry["name"],
-                entry["start"],
-                entry.get("end"),
-                entry["frequency"],
-                entry.get("category"),
-                entry["value"],
-            )
-            for entry in recurrent_entries
-        ]
-        conn.executemany(
-            f"INSERT INTO {RECURRENT_TABLE} "
-            "(eid, name, start, end, frequency, category, value) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?)",
-            recurrent_data,
+    source_interface = TinyDbInterface(tinydb_path)
+    target_interface = SqliteInterface(sqlite_path)
+    try:
+        counts = replicate(
+            source_interface,
+            target_interface,
+            batch_size=batch_size,
+            preserve_eids=True,
+            progress=progress,
         )
-    recurrent_count = len(recurrent_entries)
+    except BaseException as e:
+        target_interface.close()
+        os.remove(sqlite_path)
+        if isinstance(e, ValueError):
+            raise ValueError(f"Invalid TinyDB file {tinydb_path}: {e}")
+        raise
+    finally:
+        source_interface.close()
 
-    conn.commit()
-    tinydb.close()
-    sqlite_pocket.close()
+    target_interface.close()
 
+    standard_count = counts[DEFAULT_TABLE]
+    recurrent_count = counts[RECURRENT_TABLE]
     return {
         "pocket_name": pocket_name,
         "standard_count": standard_count,
         "recurrent_count": recurrent_count,
         "total_count": standard_count + recurrent_count,
     }
+
+
+def _normalize(table_name, eid, entry):
+    """Return the content of an entry as tuple of column values. Values are
+    converted to float since TinyDB might hold integers.
+    """
+    row = [eid]
+    for column in _COLUMNS[table_name][1:]:
+        value = entry.get(column)
+        if column == "value" and isinstance(value, int | float):
+            value = float(value)
+        row.append(value)
+    return tuple(row)
+
+
+class _UnorderedRows(Exception):
+    """Raised if the rows of a table are not ordered by ID."""
+
+
+def _iter_source_rows(tables, table_name):
+    """Parse the entries of the given table of the TinyDB file one by one.
+
+    :param tables: MemoryMappedTables of the TinyDB file
+    :yield: normalized rows, in order of the file
+    :raise: ValueError if the file contains invalid JSON
+    """
+    for doc_id, entry in tables.documents(table_name):
+        yield _normalize(table_name, int(doc_id), entry)
+
+
+def _ascending(rows):
+    """Pass the rows through as long as their IDs are ascending.
+
+    :raise: _UnorderedRows otherwise
+    """
+    previous_eid = None
+    for row in rows:
+        if previous_eid is not None and row[0] <= previous_eid:
+            raise _UnorderedRows
+        previous_eid = row[0]
+        yield row
+
+
+def _iter_target_rows(connection, table_name):
+    """Query the rows of the given SQLite table in order of their ID.
+
+    :yield: normalized rows
+    """
+    columns = _COLUMNS[table_name]
+    cursor = connection.execute(
+        f"SELECT {', '.join(columns)} FROM {table_name} ORDER BY eid"
+    )
+    for row in cursor:
+        yield _normalize(table_name, row[0], dict(zip(columns[1:], row[1:])))
+
+
+def _row_digest(row):
+    serialized = json.dumps(row, separators=(",", ":")).encode()
+    return int.from_bytes(hashlib.sha256(serialized).digest(), "big")
+
+
+def _compare_table(table_name, source_rows, target_rows, mismatches, max_mismatches):
+    """Merge-join the source and target rows of a table (both sorted by ID), and
+    record differing rows in 'mismatches' (up to 'max_mismatches' in total).
+
+    :return: dict with row counts and digests of both sides
+    """
+    rows = {"source": source_rows, "target": target_rows}
+    current = {side: next(rows[side], None) for side in rows}
+    counts = {side: 0 for side in rows}
+    digests = {side: 0 for side in rows}
+
+    def _advance(side):
+        counts[side] += 1
+        digests[side] += _row_digest(current[side])
+        current[side] = next(rows[side], None)
+
+    def _mismatch(eid, message):
+        if len(mismatches) < max_mismatches:
+            mismatches.append(f"{table_name} entry {eid}: {message}")
+
+    while current["source"] is not None or current["target"] is not None:
+        source_eid, target_eid = (
+            math.inf if current[side] is None else current[side][0] for side in rows
+        )
+
+        if source_eid < target_eid:
+            _mismatch(source_eid, "missing in SQLite pocket")
+            _advance("source")
+        elif target_eid < source_eid:
+            _mismatch(target_eid, "not present in TinyDB pocket")
+            _advance("target")
+        else:
+            if current["source"] != current["target"]:
+                _mismatch(
+                    source_eid,
+                    f"expected {current['source'][1:]}, got {current['target'][1:]}",
+                )
+            _advance("source")
+            _advance("target")
+
+    stats = {}
+    for side in rows:
+        stats[f"{side}_count"] = counts[side]
+        stats[f"{side}_digest"] = f"{digests[side] % _DIGEST_MODULUS:064x}"
+    return stats
+
+
+def verify_migration(pocket_name, data_dir, max_mismatches=DEFAULT_MAX_MISMATCHES):
+    """Verify that the SQLite pocket holds the same entries as the TinyDB pocket it
+    was migrated from.
+
+    Both pockets are streamed table by table in order of entry ID, and compared
+    row by row. The entries of the TinyDB file are parsed one by one; only if they
+    are not stored in order of ID, the entries of the table are sorted in memory.
+    Additionally, an order-independent digest of the normalized rows is computed
+    for either side. The migration is verified if no mismatches were found and the
+    digests of all tables are equal.
+
+    :param pocket_name: name of the pocket to verify (without extension)
+    :param data_dir: directory containing the pocket files
+    :param max_mismatches: maximum number of reported mismatches
+    :return: dict with verification result, per-table statistics, and the first
+        mismatches
+    :raises: FileNotFoundError if TinyDB or SQLite file doesn't exist
+    :raises: ValueError if TinyDB file contains invalid JSON
+    """
+    tinydb_path = os.path.join(data_dir, f"{pocket_name}.json")
+    sqlite_path = os.path.join(data_dir, f"{pocket_name}.sqlite")
+    for path in [tinydb_path, sqlite_path]:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Pocket file not found: {path}")
+
+    mismatches = []
+    tables = {}
+    source_tables = None
+    connection = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True)
+    try:
+        source_tables = MemoryMappedTables(tinydb_path, list(_COLUMNS))
+        for table_name in _COLUMNS:
+            table_mismatches = []
+            try:
+                tables[table_name] = _compare_table(
+                    table_name,
+                    _ascending(_iter_source_rows(source_tables, table_name)),
+                    _iter_target_rows(connection, table_name),
+                    table_mismatches,
+                    max_mismatches - len(mismatches),
+                )
+            except _UnorderedRows:
+                # TinyDB stores entries in order of insertion, which might deviate
+                # from the order of IDs. Compare the sorted rows instead
+                table_mismatches = []
+                tables[table_name] = _compare_table(
+                    table_name,
+                    iter(sorted(_iter_source_rows(source_tables, table_name))),
+                    _iter_target_rows(connection, table_name),
+                    table_mismatches,
+                    max_mismatches - len(mismatches),
+                )
+            mismatches.extend(table_mismatches)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON in {tinydb_path}: {e}")
+    finally:
+        if source_tables is not None:
+            source_tables.close()
+        connection.close()
+
+    return {
+        "pocket_name": pocket_name,
+        "verified": not mismatches
+        and all(t["source_digest"] == t["target_digest"] for t in tables.values()),
+        "tables": tables,
+        "mismatches": mismatches,
+    }
@@ -0,0 +1,215 @@
+"""Read-only access to single tables and documents of JSON files written by
+tinydb.JSONStorage, without parsing the entire file.
+
+The file is memory-mapped, and tables and documents are located by searching for
+their keys. The search is unambiguous as long as the documents don't hold nested
+objects (as the entries of pockets): quotes within JSON strings are escaped, hence
+a quoted key followed by a colon and an opening brace is either the name of a table,
+or the ID of a document within a table.
+"""
+
+import codecs
+import json
+import mmap
+import os
+import re
+
+_DECODER = json.JSONDecoder()
+# Initial size of the chunk of the file that is decoded when parsing a document
+_CHUNK_SIZE = 4096
+# Size of the chunks read from the file when streaming the documents of a table
+_READ_SIZE = 2**20
+
+# Members of a table object, and its end
+_FIRST_MEMBER_PATTERN = re.compile(r'\s*"(\d+)"\s*:\s*')
+_NEXT_MEMBER_PATTERN = re.compile(r'\s*,\s*"(\d+)"\s*:\s*')
+_OBJECT_END_PATTERN = re.compile(r"\s*\}")
+# Content of the file before the first table, between the end of a table and the
+# next table, and after the last table
+_FILE_START_PATTERN = re.compile(rb"\s*\{\s*")
+_EMPTY_FILE_PATTERN = re.compile(rb"\s*(?:\{\s*\}\s*)?")
+_TABLE_SEPARATOR_PATTERN = re.compile(r"\s*,\s*")
+_FILE_END_PATTERN = re.compile(r"\s*\}\s*")
+
+
+def _parse_member(text, pos, first):
+    """Parse the member of a table object (or the end of the object) beginning at
+    'pos' of the text.
+
+    :return: tuple of document ID (str), document, and the position after the member;
+        tuple of None, None and the position after the object if it ends here; or
+        None if the text does not hold the entire member
+    """
+    pattern = _FIRST_MEMBER_PATTERN if first else _NEXT_MEMBER_PATTERN
+    match = pattern.match(text, pos)
+    if match is None:
+        match = _OBJECT_END_PATTERN.match(text, pos)
+        return None if match is None else (None, None, match.end())
+    try:
+        document, end = _DECODER.raw_decode(text, match.end())
+    except json.JSONDecodeError:
+        return None
+    return match.group(1), document, end
+
+
+def _key_pattern(key):
+    """Return a pattern matching the given key of an object member with an object
+    value. The match ends at the opening brace of the value.
+    """
+    return re.compile(re.escape(json.dumps(str(key)).encode()) + rb"\s*:\s*(?=\{)")
+
+
+class MemoryMappedTables:
+    """Read-only access to the tables of a JSON file. The file is memory-mapped, and
+    the offsets of the given tables are located on construction. Only requested
+    tables and documents are parsed.
+    The file must not be modified while mapped; call close() beforehand.
+    """
+
+    def __init__(self, filepath, table_names):
+        """:param filepath: path to JSON file
+        :param table_names: names of all tables that the file can hold
+        """
+        self._file = open(filepath, "rb")
+        try:
+            if os.fstat(self._file.fileno()).st_size > 0:
+                self._buffer = mmap.mmap(
+                    self._file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            else:
+                self._buffer = b""
+        except BaseException:
+            self._file.close()
+            raise
+        self._offsets = self._locate_tables(table_names)
+
+    def _locate_tables(self, table_names):
+        """:return: dict mapping table names to the start offset of the serialized
+            table, and the offset at which the next table begins
+        :raise: ValueError if the file holds anything but the given tables
+        """
+        key_offsets = {}
+        for table_name in table_names:
+            match = _key_pattern(table_name).search(self._buffer)
+            if match is not None:
+                key_offsets[table_name] = (match.start(), match.end())
+
+        if not key_offsets:
+            if _EMPTY_FILE_PATTERN.fullmatch(self._buffer) is None:
+                raise ValueError("Malformed JSON file")
+            return {}
+
+        match = _FILE_START_PATTERN.match(self._buffer)
+        if match is None or match.end() != min(k for k, _ in key_offsets.values()):
+            raise ValueError("Malformed JSON file")
+
+        offsets = {}
+        for table_name, (_, start) in key_offsets.items():
+            end = min(
+                (k for k, _ in key_offsets.values() if k > start),
+                default=len(self._buffer),
+            )
+            offsets[table_name] = (start, end)
+        return offsets
+
+    def _check_table_end(self, table_name, text, end):
+        """Check that the text following the given table is a separator from the
+        next table, or the end of the file.
+
+        :raise: ValueError if not
+        """
+        pattern = (
+            _FILE_END_PATTERN if end == len(self._buffer) else _TABLE_SEPARATOR_PATTERN
+        )
+        if pattern.fullmatch(text) is None:
+            raise ValueError(f"Malformed table '{table_name}'")
+
+    def _decode(self, start, end):
+        """Parse the JSON value beginning at 'start'. Chunks of growing size are
+        decoded until the chunk holds the entire value.
+        """
+        size = _CHUNK_SIZE
+        while True:
+            stop = min(start + size, end)
+            chunk = self._buffer[start:stop]
+            try:
+                # A multibyte character might be cut at the end of the chunk
+                return _DECODER.raw_decode(chunk.decode(errors="ignore"))[0]
+            except json.JSONDecodeError:
+                if stop == end:
+                    raise
+                size *= 2
+
+    def table(self, table_name):
+        """Parse the given table.
+
+        :return: dict mapping document IDs (str) to documents
+        """
+        offsets = self._offsets.get(table_name)
+        if offsets is None:
+            return {}
+        start, end = offsets
+        text = self._buffer[start:end].decode()
+        documents, pos = _DECODER.raw_decode(text)
+        self._check_table_end(table_name, text[pos:], end)
+        return documents
+
+    def documents(self, table_name):
+        """Parse the documents of the given table one by one. The table is read from
+        the file (not from the mapping) in chunks, hence the memory usage is bounded
+        by the chunk size and the size of a single document.
+
+        :yield: tuple of document ID (str) and document
+        :raise: ValueError if the table is malformed
+        """
+        offsets = self._offsets.get(table_name)
+        if offsets is None:
+            return
+        start, end = offsets
+        # Skip the opening brace
+        self._file.seek(start + 1)
+        remaining = end - start - 1
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        text = ""
+        pos = 0
+        first = True
+
+        while True:
+            member = _parse_member(text, pos, first)
+            if member is None:
+                # Incomplete member (or malformed table, detected at the end)
+                data = self._file.read(min(_READ_SIZE, remaining))
+                if not data:
+                    raise ValueError(f"Malformed table '{table_name}'")
+                remaining -= len(data)
+                text = text[pos:] + decoder.decode(data, final=not remaining)
+                pos = 0
+                continue
+
+            doc_id, document, pos = member
+            if doc_id is None:
+                rest = text[pos:] + decoder.decode(
+                    self._file.read(remaining), final=True
+                )
+                self._check_table_end(table_name, rest, end)
+                return
+            first = False
+            yield doc_id, document
+
+    def document(self, table_name, doc_id):
+        """Parse the given document of the table.
+
+        :return: dict, or None if not existing
+        """
+        offsets = self._offsets.get(table_name)
+        if offsets is None:
+            return None
+        match = _key_pattern(doc_id).search(self._buffer, *offsets)
+        if match is None:
+            return None
+        return self._decode(match.end(), offsets[1])
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._file.close()
@@ -0,0 +1,53 @@
+"""Copying the content of a pocket database to another, independent of the database
+back-ends.
+"""
+
+import itertools
+
+from .. import DEFAULT_TABLE, RECURRENT_TABLE
+
+# Number of entries read and written at once. Progress is reported after each full
+# batch
+DEFAULT_BATCH_SIZE = 1000
+
+
+def replicate(
+    source_interface,
+    target_interface,
+    batch_size=DEFAULT_BATCH_SIZE,
+    preserve_eids=False,
+    progress=None,
+):
+    """Copy all entries of the source database to the target database.
+
+    The entries are streamed table by table from the source, and written to the
+    target in batches. All writes happen within a single transaction of the target
+    (atomic if supported by the target back-end). TinyDB targets hold the entries in
+    memory, and write the JSON file once when the transaction is committed.
+
+    :param source_interface: DatabaseInterface to read from
+    :param target_interface: DatabaseInterface to write to
+    :param batch_size: number of entries written at once
+    :param preserve_eids: whether to keep the IDs of the entries. Fails if any ID
+        already exists in the target
+    :param progress: optional callable that is passed the number of replicated
+        entries after each full batch
+    :return: dict mapping table names to the number of replicated entries
+    :raise: PocketException if the target does not support preserving IDs
+    """
+    counts = {}
+
+    with target_interface.transaction():
+        for table_name in [DEFAULT_TABLE, RECURRENT_TABLE]:
+            counts[table_name] = 0
+            rows = source_interface.iter_rows(table_name)
+
+            while batch := list(itertools.islice(rows, batch_size)):
+                target_interface.create_many(
+                    table_name, batch, preserve_eids=preserve_eids
+                )
+                counts[table_name] += len(batch)
+                if progress is not None and len(batch) == batch_size:
+                    progress(sum(counts.values()))
+
+    return counts
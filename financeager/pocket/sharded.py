@@ -0,0 +1,324 @@
+import glob
+import os
+import os.path
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from tinydb import storages
+
+from .. import DEFAULT_TABLE, RECURRENT_TABLE, exceptions
+from .base import Pocket
+from .tinydb import DATE_PREFIX_PATTERN, TinyDbInterface
+from .utils import DatabaseInterface
+
+# Length of the shard key ('YYYY' or 'YYYY-MM') derived from an entry date
+SHARD_KEY_LENGTHS = {"year": 4, "month": 7}
+# Element IDs of standard entries are composed of the shard number (e.g. 2024 or
+# 202403) and the ID within the shard
+SHARD_ID_FACTOR = 100_000
+
+
+class ShardedTinyDbInterface(DatabaseInterface):
+    """Database interface storing standard entries in one TinyDB instance per year or
+    month of the entry date ('shard'), and recurrent entries in a separate TinyDB
+    instance.
+    Shards are opened on first access. Queries filtering for a date prefix are only
+    run against the shards overlapping with the prefix.
+    """
+
+    def __init__(self, directory=None, shard_by="year", **kwargs):
+        """:param directory: directory holding the JSON files of the shards. If None,
+            the data is stored in memory
+        :param shard_by: 'year' or 'month'
+        :param kwargs: keyword arguments for TinyDB constructor
+        :raise: PocketException if 'shard_by' is invalid or inconsistent with
+            existing shards
+        """
+        try:
+            self._shard_key_length = SHARD_KEY_LENGTHS[shard_by]
+        except KeyError:
+            raise exceptions.PocketException(f"Invalid shard period '{shard_by}'")
+
+        self._directory = directory
+        self._kwargs = kwargs
+        self._shards = {}
+        self._shard_keys = set()
+        # Transaction contexts of the shards accessed within the current transaction
+        self._transaction_stack = None
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            for filepath in glob.glob(
+                os.path.join(directory, f"{DEFAULT_TABLE}-*.json")
+            ):
+                filename = os.path.splitext(os.path.basename(filepath))[0]
+                key = filename.split("-", 1)[1]
+                if len(key) != self._shard_key_length:
+                    raise exceptions.PocketException(
+                        f"Shard '{filepath}' does not match shard period '{shard_by}'"
+                    )
+                self._shard_keys.add(key)
+
+        self._recurrent_shard = self._open(RECURRENT_TABLE)
+
+    def _open(self, filename, eid_offset=0):
+        kwargs = self._kwargs.copy()
+        if self._directory is None:
+            args = []
+            kwargs["storage"] = storages.MemoryStorage
+        else:
+            args = [os.path.join(self._directory, f"{filename}.json")]
+            kwargs["storage"] = storages.JSONStorage
+        return TinyDbInterface(*args, eid_offset=eid_offset, **kwargs)
+
+    def _shard(self, key):
+        """Return the interface of the shard identified by 'key' (e.g. '2024' or
+        '2024-03'). The shard is created if not existing.
+        """
+        try:
+            return self._shards[key]
+        except KeyError:
+            eid_offset = int(key.replace("-", "")) * SHARD_ID_FACTOR
+            shard = self._open(f"{DEFAULT_TABLE}-{key}", eid_offset=eid_offset)
+            self._shards[key] = shard
+            self._shard_keys.add(key)
+            if self._transaction_stack is not None:
+                self._transaction_stack.enter_context(shard.transaction())
+            return shard
+
+    @staticmethod
+    def _shard_key_of_element(element_id):
+        shard_number = str(int(element_id) // SHARD_ID_FACTOR)
+        key = shard_number[:4]
+        if len(shard_number) > 4:
+            key = f"{key}-{shard_number[4:]}"
+        return key
+
+    def _shard_of_element(self, element_id):
+        """Return the shard holding the standard entry with the given ID, or None if
+        the shard does not exist.
+        """
+        key = self._shard_key_of_element(element_id)
+        if key not in self._shard_keys:
+            return None
+        return self._shard(key)
+
+    def _check_element_ids(self, key, element_ids):
+        """Verify that the IDs of the standard entries just created in the shard
+        identified by 'key' are within the ID range of the shard. Otherwise the
+        entries are removed again.
+
+        :raise: PocketException if the shard is full
+        """
+        if not element_ids or self._shard_key_of_element(max(element_ids)) == key:
+            return
+
+        shard = self._shard(key)
+        for element_id in element_ids:
+            shard.delete_by_id(DEFAULT_TABLE, element_id)
+        raise exceptions.PocketException(
+            f"Shard '{key}' is full: it holds at most {SHARD_ID_FACTOR - 1} entries"
+        )
+
+    def _shard_key(self, date):
+        return date[: self._shard_key_length]
+
+    def _overlapping_shards(self, filters):
+        """Return shards that might hold entries matching the date filter pattern (if
+        it is a date prefix), in chronological order.
+        """
+        pattern = (filters or {}).get("date")
+        keys = sorted(self._shard_keys)
+        if pattern is not None and DATE_PREFIX_PATTERN.fullmatch(pattern.lower()):
+            keys = [k for k in keys if k.startswith(pattern) or pattern.startswith(k)]
+        return [self._shard(k) for k in keys]
+
+    def retrieve(self, table_name, filters=None):
+        if table_name != DEFAULT_TABLE:
+            return self._recurrent_shard.retrieve(table_name, filters)
+
+        elements = []
+        for shard in self._overlapping_shards(filters):
+            elements.extend(shard.retrieve(table_name, filters))
+        return elements
+
+    def retrieve_by_id(self, table_name, element_id):
+        if table_name != DEFAULT_TABLE:
+            return self._recurrent_shard.retrieve_by_id(table_name, element_id)
+
+        shard = self._shard_of_element(element_id)
+        if shard is None:
+            return None
+        return shard.retrieve_by_id(table_name, element_id)
+
+    def create(self, table_name, data):
+        if table_name != DEFAULT_TABLE:
+            return self._recurrent_shard.create(table_name, data)
+
+        key = self._shard_key(data["date"])
+        element_id = self._shard(key).create(table_name, data)
+        self._check_element_ids(key, [element_id])
+        return element_id
+
+    def iter_rows(self, table_name):
+        if table_name != DEFAULT_TABLE:
+            yield from self._recurrent_shard.iter_rows(table_name)
+            return
+
+        for shard in self._overlapping_shards(None):
+            yield from shard.iter_rows(table_name)
+
+    def create_many(self, table_name, rows, preserve_eids=False):
+        """Insert the rows shard by shard. If 'preserve_eids' is set, the IDs must
+        match the shards the rows belong to.
+
+        :raise: PocketException if an ID does not match the shard of the row, or if a
+            shard is full
+        """
+        if table_name != DEFAULT_TABLE:
+            return self._recurrent_shard.create_many(
+                table_name, rows, preserve_eids=preserve_eids
+            )
+
+        positions = defaultdict(list)
+        rows_by_key = defaultdict(list)
+        for position, row in enumerate(rows):
+            key = self._shard_key(row["date"])
+            if preserve_eids and self._shard_key_of_element(row["eid"]) != key:
+                raise exceptions.PocketException(
+                    f"Element ID {row['eid']} does not match shard '{key}'"
+                )
+            positions[key].append(position)
+            rows_by_key[key].append(row)
+
+        element_ids = [None] * sum(len(p) for p in positions.values())
+        for key, shard_rows in rows_by_key.items():
+            shard_ids = self._shard(key).create_many(
+                table_name, shard_rows, preserve_eids=preserve_eids
+            )
+            self._check_element_ids(key, shard_ids)
+            for position, element_id in zip(positions[key], shard_ids):
+                element_ids[position] = element_id
+        return element_ids
+
+    def update_by_id(self, table_name, element_id, data):
+        """Update entry. Standard entries are moved to another shard if their new
+        date belongs to it, which changes their ID. The move is atomic (if the entry
+        can't be removed from the former shard, it isn't created in the new one).
+
+        :return: ID of the updated element
+        """
+        if table_name != DEFAULT_TABLE:
+            return self._recurrent_shard.update_by_id(table_name, element_id, data)
+
+        shard = self._shard_of_element(element_id)
+        key = self._shard_key_of_element(element_id)
+        date = data.get("date")
+        if date is None or self._shard_key(date) == key:
+            return shard.update_by_id(table_name, element_id, data)
+
+        with self.transaction():
+            element = shard.retrieve_by_id(table_name, element_id)
+            new_element_id = self.create(table_name, {**element, **data})
+            shard.delete_by_id(table_name, element_id)
+        return new_element_id
+
+    def delete_by_id(self, table_name, element_id):
+        if table_name != DEFAULT_TABLE:
+            return self._recurrent_shard.delete_by_id(table_name, element_id)
+
+        return self._shard_of_element(element_id).delete_by_id(table_name, element_id)
+
+    @staticmethod
+    def create_query_condition(**filters):
+        return TinyDbInterface.create_query_condition(**filters)
+
+    @contextmanager
+    def transaction(self):
+        """Restore the content of all shards as of entering the context if an
+        exception is raised. Shards join the transaction when they are opened, hence
+        only shards accessed within the context are read in advance. Shards created
+        within the context are removed.
+        """
+        if self._transaction_stack is not None:
+            yield
+            return
+
+        shard_keys = set(self._shard_keys)
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(self._recurrent_shard.transaction())
+                for shard in self._shards.values():
+                    stack.enter_context(shard.transaction())
+                self._transaction_stack = stack
+                yield
+        except BaseException:
+            for key in self._shard_keys - shard_keys:
+                self._remove_shard(key)
+            raise
+        finally:
+            self._transaction_stack = None
+
+    def storage_version(self):
+        """Combine the storage versions of the opened shards, and of the database of
+        recurrent entries. Shards created by other processes are not detected.
+        """
+        return tuple(
+            [self._recurrent_shard.storage_version()]
+            + [self._shards[key].storage_version() for key in sorted(self._shards)]
+        )
+
+    def get_stats(self):
+        """Sum up the statistics of all shards (opening them if necessary), and of
+        the database of recurrent entries.
+        """
+        rows = {DEFAULT_TABLE: 0, RECURRENT_TABLE: 0}
+        storage = {
+            "shards": len(self._shard_keys),
+            "file_size": None if self._directory is None else 0,
+            "indexed_values": 0,
+        }
+        for key in sorted(self._shard_keys) + [None]:
+            interface = self._recurrent_shard if key is None else self._shard(key)
+            stats = interface.get_stats()
+            for table_name, count in stats["rows"].items():
+                rows[table_name] += count
+            if self._directory is not None:
+                storage["file_size"] += stats["storage"]["file_size"]
+            storage["indexed_values"] += stats["storage"]["indexed_values"]
+
+        return {"rows": rows, "storage": storage}
+
+    def _remove_shard(self, key):
+        self._shard_keys.discard(key)
+        shard = self._shards.pop(key, None)
+        if shard is not None:
+            shard.close()
+        if self._directory is not None:
+            filepath = os.path.join(self._directory, f"{DEFAULT_TABLE}-{key}.json")
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+    def close(self):
+        """Close the TinyDB databases of all opened shards."""
+        for shard in self._shards.values():
+            shard.close()
+        self._recurrent_shard.close()
+
+
+class ShardedTinyDbPocket(Pocket):
+    def __init__(self, name=None, data_dir=None, shard_by="year", **kwargs):
+        """Create a pocket with TinyDB database backends, identified by 'name'.
+        Standard entries are distributed by the year or month of their date (as
+        specified by 'shard_by') to separate databases.
+        If 'data_dir' is given, the databases are stored as JSON files in the
+        directory '<name>.shards' within 'data_dir'. Otherwise the data is stored in
+        memory.
+        Keyword args are passed to the TinyDB constructor.
+        """
+        directory = None
+        if data_dir is not None:
+            directory = os.path.join(data_dir, f"{name}.shards")
+
+        db_interface = ShardedTinyDbInterface(directory, shard_by=shard_by, **kwargs)
+        super().__init__(db_interface, name=name)
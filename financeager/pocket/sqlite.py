@@ -1,13 +1,31 @@
+import functools
 import os.path
 import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
 
 from .. import DEFAULT_TABLE, RECURRENT_TABLE
 from .base import Pocket, RecurrentEntrySchema, StandardEntrySchema
 from .utils import DatabaseInterface
 
 
+def _locked(method):
+    """Decorate a method of SqliteInterface to use the connection exclusively."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class SqliteInterface(DatabaseInterface):
-    """Database interface implementation using SQLite."""
+    """Database interface implementation using SQLite. The use of the connection is
+    serialized, hence the interface may be shared between threads if the connection
+    is created with 'check_same_thread=False'.
+    """
 
     # Valid table names for security
     _VALID_TABLES = {DEFAULT_TABLE, RECURRENT_TABLE}
@@ -24,7 +42,10 @@ class SqliteInterface(DatabaseInterface):
         :param kwargs: keyword arguments for sqlite3.connect
         """
         self._conn = sqlite3.connect(*args, **kwargs)
+        # Held while using the connection, and for the duration of transactions
+        self._lock = threading.RLock()
         self._conn.row_factory = sqlite3.Row
+        self._in_transaction = False
         self._create_tables()
 
     def _validate_table_name(self, table_name):
@@ -76,6 +97,7 @@ class SqliteInterface(DatabaseInterface):
 
         self._conn.commit()
 
+    @_locked
     def retrieve(self, table_name, filters=None):
         self._validate_table_name(table_name)
         cursor = self._conn.cursor()
@@ -92,6 +114,7 @@ class SqliteInterface(DatabaseInterface):
         rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
+    @_locked
     def retrieve_by_id(self, table_name, element_id):
         self._validate_table_name(table_name)
         cursor = self._conn.cursor()
@@ -106,6 +129,7 @@ class SqliteInterface(DatabaseInterface):
         result.pop("eid", None)
         return result
 
+    @_locked
     def create(self, table_name, data):
         self._validate_table_name(table_name)
         self._validate_columns(table_name, data.keys())
@@ -119,10 +143,11 @@ class SqliteInterface(DatabaseInterface):
         cursor.execute(
             f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})", values
         )
-        self._conn.commit()
+        self._commit()
 
         return cursor.lastrowid
 
+    @_locked
     def update_by_id(self, table_name, element_id, data):
         self._validate_table_name(table_name)
 
@@ -138,18 +163,193 @@ class SqliteInterface(DatabaseInterface):
         values = tuple(data.values()) + (element_id,)
 
         cursor.execute(f"UPDATE {table_name} SET {set_clause} WHERE eid = ?", values)
-        self._conn.commit()
+        self._commit()
 
         return element_id
 
+    @_locked
     def delete_by_id(self, table_name, element_id):
         self._validate_table_name(table_name)
         cursor = self._conn.cursor()
         cursor.execute(f"DELETE FROM {table_name} WHERE eid = ?", (element_id,))
-        self._conn.commit()
+        self._commit()
 
         return element_id
 
+    def iter_rows(self, table_name, batch_size=1000):
+        """Fetch the rows in chunks of 'batch_size'."""
+        self._validate_table_name(table_name)
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute(f"SELECT * FROM {table_name} ORDER BY eid")
+
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+
+    @_locked
+    def create_many(self, table_name, rows, preserve_eids=False):
+        """Insert the rows within a single transaction. If 'preserve_eids' is set,
+        the rows are inserted by a single statement.
+        """
+        self._validate_table_name(table_name)
+        columns = sorted(self._VALID_COLUMNS[table_name])
+        if preserve_eids:
+            columns.insert(0, "eid")
+
+        valid_keys = self._VALID_COLUMNS[table_name] | {"eid"}
+        values = []
+        for row in rows:
+            if not valid_keys.issuperset(row):
+                self._validate_columns(table_name, (k for k in row if k != "eid"))
+            values.append(tuple(map(row.get, columns)))
+
+        query = (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['?' for _ in columns])})"
+        )
+        cursor = self._conn.cursor()
+        if preserve_eids:
+            cursor.executemany(query, values)
+            element_ids = [v[0] for v in values]
+        else:
+            element_ids = []
+            for v in values:
+                cursor.execute(query, v)
+                element_ids.append(cursor.lastrowid)
+        self._commit()
+
+        return element_ids
+
+    def copy_from(self, source, table_name, filters=None):
+        """Copy the rows by a single INSERT ... SELECT statement if the source is an
+        SQLite database, too. A source database stored in another file is attached
+        to the connection for the duration of the copy, hence this is only possible
+        outside of a transaction; otherwise the rows are copied one by one.
+        """
+        same_database = source is self or (
+            isinstance(source, SqliteInterface)
+            and self._filepath() is not None
+            and source._filepath() is not None
+            and os.path.samefile(self._filepath(), source._filepath())
+        )
+        if not same_database and (
+            not isinstance(source, SqliteInterface)
+            or source._filepath() is None
+            or self._in_transaction
+            or self._conn.in_transaction
+        ):
+            return super().copy_from(source, table_name, filters=filters)
+
+        self._validate_table_name(table_name)
+        columns = ", ".join(sorted(self._VALID_COLUMNS[table_name]))
+        where_sql, params = "1", ()
+        if filters:
+            self._validate_columns(table_name, filters.keys())
+            where_sql, params = self.create_query_condition(**filters)
+
+        attached = nullcontext("main") if same_database else self._attached(source)
+        with attached as schema, self.transaction():
+            cursor = self._conn.cursor()
+            cursor.execute(
+                f"SELECT name, category, COUNT(*) FROM {schema}.{table_name} "
+                f"WHERE {where_sql} GROUP BY name, category",
+                params,
+            )
+            tally = Counter({(name, category): n for name, category, n in cursor})
+            cursor.execute(
+                f"INSERT INTO main.{table_name} ({columns}) "
+                f"SELECT {columns} FROM {schema}.{table_name} WHERE {where_sql}",
+                params,
+            )
+
+        return tally
+
+    @_locked
+    def storage_version(self):
+        """Return the data version of the connection, which changes when another
+        connection commits modifications (modifications by this connection are
+        known to the caller).
+        """
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @_locked
+    def get_stats(self):
+        """Count the rows by SQL queries. The storage statistics comprise the page
+        statistics of the database, and the size of each table and index (if SQLite
+        provides the 'dbstat' virtual table).
+        """
+        cursor = self._conn.cursor()
+        rows = {}
+        for table_name in [DEFAULT_TABLE, RECURRENT_TABLE]:
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            rows[table_name] = cursor.fetchone()[0]
+
+        filepath = self._filepath()
+        storage = {"file_size": os.path.getsize(filepath) if filepath else None}
+        for pragma in ["page_size", "page_count", "freelist_count"]:
+            storage[pragma] = cursor.execute(f"PRAGMA {pragma}").fetchone()[0]
+        try:
+            cursor.execute(
+                "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY name"
+            )
+            storage["object_sizes"] = {name: size for name, size in cursor}
+        except sqlite3.OperationalError:
+            # SQLite compiled without SQLITE_ENABLE_DBSTAT_VTAB
+            pass
+
+        return {"rows": rows, "storage": storage}
+
+    @_locked
+    def _filepath(self):
+        """Return the path of the database file, or None for in-memory databases."""
+        for _, name, filepath in self._conn.execute("PRAGMA database_list"):
+            if name == "main":
+                return filepath or None
+
+    @contextmanager
+    def _attached(self, source):
+        """Attach the database file of the given SqliteInterface to the connection
+        under the schema name 'source'.
+        """
+        filepath = source._filepath()
+        with self._lock:
+            self._conn.execute("ATTACH DATABASE ? AS source", (filepath,))
+            try:
+                yield "source"
+            finally:
+                self._conn.execute("DETACH DATABASE source")
+
+    @contextmanager
+    def transaction(self):
+        """Commit the modifications within the context at once, or roll them back
+        if an exception is raised. Nested transactions are merged into the
+        outermost one.
+        """
+        with self._lock:
+            if self._in_transaction:
+                yield
+                return
+
+            self._in_transaction = True
+            try:
+                yield
+            except BaseException:
+                self._conn.rollback()
+                raise
+            else:
+                self._conn.commit()
+            finally:
+                self._in_transaction = False
+
+    def _commit(self):
+        if not self._in_transaction:
+            self._conn.commit()
+
     @staticmethod
     def create_query_condition(**filters):
         """Construct query condition with SQL optimization support.
@@ -175,12 +375,16 @@ class SqliteInterface(DatabaseInterface):
         where_clause = " AND ".join(where_parts)
         return where_clause, tuple(params)
 
+    @_locked
     def close(self):
         """Close the SQLite database connection."""
         self._conn.close()
 
 
 class SqlitePocket(Pocket):
+    # SqliteInterface serializes the use of the connection
+    concurrent_reads = True
+
     def __init__(self, name=None, data_dir=None, **kwargs):
         """Create a pocket with an SQLite database backend, identified by 'name'.
 
@@ -1,78 +1,540 @@
+import bisect
+import copy
+import functools
 import os.path
+import re
+from collections import defaultdict
+from contextlib import contextmanager
 
-from tinydb import Query, TinyDB, storages
+from tinydb import TinyDB, storages
+from tinydb.middlewares import Middleware
+from tinydb.table import Document, Table
 
-from .. import DEFAULT_TABLE
+from .. import DEFAULT_TABLE, RECURRENT_TABLE
 from .base import Pocket
-from .utils import DatabaseInterface
+from .mmapjson import MemoryMappedTables
+from .utils import DatabaseInterface, DocumentView, strip_eid
+
+# Placeholder key for documents lacking an indexed field
+_MISSING = object()
+# Date patterns starting with the four-digit year can only match the beginning of a
+# date of the format YYYY-MM-DD, and hence describe a contiguous range of dates
+DATE_PREFIX_PATTERN = re.compile(r"\d{4}[\d-]*")
+# Patterns without any of these characters are matched by plain substring checks
+_REGEX_METACHARACTERS = frozenset(".^$*+?{}[]\\|()")
+# Maximum number of compiled filter sets kept in memory
+_CONDITION_CACHE_SIZE = 128
+
+
+@functools.lru_cache(maxsize=_CONDITION_CACHE_SIZE)
+def _pattern_matcher(pattern):
+    """Return a function that tests whether a field value matches the given
+    (lowercase) pattern. Like tinydb's Query.search(), any non-string value is
+    considered non-matching.
+    """
+    if _REGEX_METACHARACTERS.isdisjoint(pattern):
+        return lambda value: isinstance(value, str) and pattern in value
+
+    search = re.compile(pattern).search
+    return lambda value: isinstance(value, str) and search(value) is not None
+
+
+def _is_none(value):
+    return value is None
+
+
+@functools.lru_cache(maxsize=_CONDITION_CACHE_SIZE)
+def _compile_condition(filter_items):
+    """Compile the given normalized filter items (a sorted tuple of field-pattern
+    pairs) into a predicate evaluating a single document.
+    """
+    tests = []
+    for field, pattern in filter_items:
+        if pattern is None and field in ["category", "end"]:
+            # The 'category' and 'end' fields are of type string or None. The
+            # condition is constructed depending on the filter pattern
+            test = _is_none
+        elif field == "value":
+            test = functools.partial(float.__eq__, float(pattern))
+        else:
+            test = _pattern_matcher(pattern.lower())
+        tests.append((field, test))
+
+    def condition(document):
+        for field, test in tests:
+            try:
+                value = document[field]
+            except KeyError:
+                return False
+            if test(value) is not True:
+                return False
+        return True
+
+    return condition
+
+
+class _TableIndex:
+    """Secondary indexes of a single TinyDB table. For each indexed field, the
+    distinct values present in the table are mapped to the IDs of the documents
+    holding them. The distinct dates are additionally kept in sorted order such that
+    date prefixes can be resolved by bisection.
+    """
+
+    FIELDS = ("name", "category", "date")
+
+    def __init__(self, documents):
+        self._doc_ids = {field: defaultdict(set) for field in self.FIELDS}
+        for document in documents:
+            self._add_doc_id(document.doc_id, document)
+        self._dates = sorted(v for v in self._doc_ids["date"] if isinstance(v, str))
+
+    def add(self, doc_id, document):
+        """Add the given document to the indexes."""
+        date = document.get("date", _MISSING)
+        if isinstance(date, str) and date not in self._doc_ids["date"]:
+            bisect.insort(self._dates, date)
+        self._add_doc_id(doc_id, document)
+
+    def remove(self, doc_id, document):
+        """Remove the given document from the indexes."""
+        for field in self.FIELDS:
+            value = document.get(field, _MISSING)
+            doc_ids = self._doc_ids[field].get(value)
+            if doc_ids is None:
+                continue
+            doc_ids.discard(doc_id)
+            if doc_ids:
+                continue
+            del self._doc_ids[field][value]
+            if field == "date" and isinstance(value, str):
+                del self._dates[bisect.bisect_left(self._dates, value)]
+
+    def __len__(self):
+        """Return the number of distinct values held by the indexes."""
+        return sum(len(doc_ids) for doc_ids in self._doc_ids.values())
+
+    def _add_doc_id(self, doc_id, document):
+        for field in self.FIELDS:
+            self._doc_ids[field][document.get(field, _MISSING)].add(doc_id)
+
+    def lookup(self, filters):
+        """Resolve as many of the given filters as possible using the indexes.
+
+        :return: tuple of the set of matching document IDs (None if no filter could
+            be resolved), and a dict of the remaining filters that have to be
+            evaluated per document
+        """
+        doc_ids = None
+        remaining_filters = {}
+
+        for field, pattern in filters.items():
+            if field not in self.FIELDS or (pattern is None and field != "category"):
+                remaining_filters[field] = pattern
+                continue
+
+            matching_ids = set()
+            for value in self._matching_values(field, pattern):
+                matching_ids.update(self._doc_ids[field][value])
+
+            doc_ids = matching_ids if doc_ids is None else doc_ids & matching_ids
+
+        return doc_ids, remaining_filters
+
+    def _matching_values(self, field, pattern):
+        """Return the distinct values of the given field that match the pattern."""
+        if pattern is None:
+            return [None] if None in self._doc_ids[field] else []
+
+        pattern = pattern.lower()
+        if field == "date" and DATE_PREFIX_PATTERN.fullmatch(pattern):
+            start = bisect.bisect_left(self._dates, pattern)
+            end = bisect.bisect_left(self._dates, pattern + "\U0010ffff", lo=start)
+            return self._dates[start:end]
+
+        matches = _pattern_matcher(pattern)
+        return [v for v in self._doc_ids[field] if matches(v)]
+
+
+class _Table(Table):
+    """TinyDB table that determines the ID of the next document from its content
+    again after inserting documents with given IDs, or on reset().
+    """
+
+    def insert_multiple(self, documents):
+        documents = list(documents)
+        doc_ids = super().insert_multiple(documents)
+        # Unlike insert(), the parent method keeps the cached ID of the next
+        # document when inserting documents with given IDs
+        if any(isinstance(d, Document) for d in documents):
+            self._next_id = None
+        return doc_ids
+
+    def reset(self):
+        """Discard all data cached from the table content."""
+        self.clear_cache()
+        self._next_id = None
+
+
+class _TinyDB(TinyDB):
+    table_class = _Table
+
+
+class _TransactionMiddleware(Middleware):
+    """Storage middleware holding the data written within a transaction in memory.
+    The data is written to the storage on commit, or discarded on rollback.
+    """
+
+    def __init__(self, storage_cls):
+        super().__init__(storage_cls)
+        self._active = False
+        # Data as of the latest read or write within the transaction
+        self._data = None
+
+    def begin(self):
+        self._active = True
+
+    def read(self):
+        if not self._active:
+            return self.storage.read()
+
+        if self._data is None:
+            data = self.storage.read()
+            if isinstance(self.storage, storages.MemoryStorage):
+                # The memory storage returns its content itself, which is modified
+                # in place by TinyDB
+                data = copy.deepcopy(data)
+            self._data = data
+        return self._data
+
+    def write(self, data):
+        if self._active:
+            self._data = data
+        else:
+            self.storage.write(data)
+
+    def commit(self):
+        data = self._data
+        self.rollback()
+        if data is not None:
+            self.storage.write(data)
+
+    def rollback(self):
+        self._active = False
+        self._data = None
 
 
 class TinyDbInterface(DatabaseInterface):
-    """Database interface implementation using TinyDB."""
+    """Database interface implementation using TinyDB.
+
+    Filtered queries are accelerated by secondary indexes on the fields 'name',
+    'category' and 'date'. The indexes of a table are built on its first filtered
+    query, and kept up to date on subsequent modifications. If the JSON file was
+    modified otherwise (e.g. by another process), i.e. its mtime or size changed,
+    the indexes are built again, and the IDs of new documents are determined from
+    the current file content.
+    """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, eid_offset=0, **kwargs):
         """Initialize TinyDB instance.
 
         :param args: positional arguments for TinyDB constructor
+        :param eid_offset: offset between the element IDs exposed by the interface
+            and the IDs of the TinyDB documents
         :param kwargs: keyword arguments for TinyDB constructor
         """
-        self._db = TinyDB(*args, **kwargs)
+        kwargs["storage"] = _TransactionMiddleware(
+            kwargs.get("storage", storages.JSONStorage)
+        )
+        self._db = _TinyDB(*args, **kwargs)
+        # Path of the JSON file, if any
+        self._filepath = args[0] if args else None
+        self._eid_offset = eid_offset
+        self._indexes = {}
+        # mtime and size of the JSON file as of the latest access, see _validate_cache()
+        self._cached_file_signature = self._file_signature()
+        self._in_transaction = False
+
+    def _file_signature(self):
+        """Return the mtime and size of the JSON file, or None if the data is stored
+        in memory.
+        """
+        if self._filepath is None:
+            return None
+        try:
+            stat_result = os.stat(self._filepath)
+        except OSError:
+            return None
+        return stat_result.st_mtime_ns, stat_result.st_size
+
+    def _validate_cache(self):
+        """Discard the data cached from the database content, i.e. the indexes and
+        the IDs of the next documents held by the TinyDB tables, if the JSON file was
+        modified since it was last accessed by the interface.
+        """
+        file_signature = self._file_signature()
+        if file_signature != self._cached_file_signature:
+            self._reset(set())
+            self._cached_file_signature = file_signature
+
+    def _record_modification(self):
+        """Record the state of the JSON file after modifying it, and updating the
+        cached data accordingly.
+        """
+        self._cached_file_signature = self._file_signature()
+
+    def _get_index(self, table_name):
+        self._validate_cache()
+        try:
+            return self._indexes[table_name]
+        except KeyError:
+            # The state of the file was taken before reading it; a concurrent
+            # modification leads to rebuilding the indexes on the next access
+            index = _TableIndex(self._db.table(table_name).all())
+            self._indexes[table_name] = index
+            return index
 
     def retrieve(self, table_name, filters=None):
+        table = self._db.table(table_name)
         if not filters:
-            elements = self._db.table(table_name).all()
+            elements = table.all()
         else:
-            condition = self.create_query_condition(**filters)
-            elements = self._db.table(table_name).search(condition)
-        # Flatten tinydb Documents into dict
-        return [{**e, **{"eid": e.doc_id}} for e in elements]
+            doc_ids, remaining_filters = self._get_index(table_name).lookup(filters)
+            if doc_ids is None:
+                elements = table.all()
+            elif doc_ids:
+                # Keep the order of the documents in the table
+                elements = table.get(doc_ids=sorted(doc_ids))
+            else:
+                elements = []
+
+            if remaining_filters:
+                condition = self.create_query_condition(**remaining_filters)
+                elements = [e for e in elements if condition(e)]
+
+        return [DocumentView(e, e.doc_id + self._eid_offset) for e in elements]
 
     def retrieve_by_id(self, table_name, element_id):
-        result = self._db.table(table_name).get(doc_id=int(element_id))
+        doc_id = int(element_id) - self._eid_offset
+        result = self._db.table(table_name).get(doc_id=doc_id)
         if result is None:
             return
-        return dict(result)  # convert tinydb.Document
+        return DocumentView(result)
+
+    def iter_rows(self, table_name):
+        """Parse the documents of the JSON file one by one (see
+        MemoryMappedTables.documents()), and yield them as dicts including the 'eid'
+        field. Unlike retrieve(), the file is not loaded at once, and no tinydb
+        Documents are created.
+        """
+        if self._filepath is None or self._in_transaction:
+            documents = (self._db.storage.read() or {}).get(table_name, {}).items()
+            for doc_id, document in documents:
+                yield {**document, "eid": int(doc_id) + self._eid_offset}
+            return
+
+        tables = MemoryMappedTables(self._filepath, [DEFAULT_TABLE, RECURRENT_TABLE])
+        try:
+            for doc_id, document in tables.documents(table_name):
+                yield {**document, "eid": int(doc_id) + self._eid_offset}
+        finally:
+            tables.close()
 
     def create(self, table_name, data):
-        return self._db.table(table_name).insert(data)
+        self._validate_cache()
+        doc_id = self._db.table(table_name).insert(data)
+        if table_name in self._indexes:
+            self._indexes[table_name].add(doc_id, data)
+        self._record_modification()
+        return doc_id + self._eid_offset
+
+    def create_many(self, table_name, rows, preserve_eids=False):
+        """Insert the rows by a single write to the storage."""
+        self._validate_cache()
+        table = self._db.table(table_name)
+        if preserve_eids:
+            documents = [
+                Document(strip_eid(row), doc_id=int(row["eid"]) - self._eid_offset)
+                for row in rows
+            ]
+        else:
+            documents = [strip_eid(row) for row in rows]
+
+        doc_ids = table.insert_multiple(documents)
+
+        if table_name in self._indexes:
+            for doc_id, document in zip(doc_ids, documents):
+                self._indexes[table_name].add(doc_id, document)
+        self._record_modification()
+        return [doc_id + self._eid_offset for doc_id in doc_ids]
 
     def update_by_id(self, table_name, element_id, data):
-        return self._db.table(table_name).update(data, doc_ids=[int(element_id)])[0]
+        table = self._db.table(table_name)
+        doc_id = int(element_id) - self._eid_offset
+        self._validate_cache()
+        index = self._indexes.get(table_name)
+        old_document = table.get(doc_id=doc_id) if index is not None else None
+
+        doc_id = table.update(data, doc_ids=[doc_id])[0]
+
+        if old_document is not None:
+            index.remove(doc_id, old_document)
+            index.add(doc_id, {**old_document, **data})
+        self._record_modification()
+        return doc_id + self._eid_offset
 
     def delete_by_id(self, table_name, element_id):
-        self._db.table(table_name).remove(doc_ids=[int(element_id)])
-        return int(element_id)
+        table = self._db.table(table_name)
+        doc_id = int(element_id) - self._eid_offset
+        self._validate_cache()
+        index = self._indexes.get(table_name)
+        old_document = table.get(doc_id=doc_id) if index is not None else None
+
+        table.remove(doc_ids=[doc_id])
+
+        if old_document is not None:
+            index.remove(doc_id, old_document)
+        self._record_modification()
+        return doc_id + self._eid_offset
+
+    @contextmanager
+    def transaction(self):
+        """Keep the modifications within the context in memory, and write them to the
+        storage at once when leaving the context. If an exception is raised, the
+        modifications are discarded. Nested transactions are merged into the
+        outermost one.
+        """
+        if self._in_transaction:
+            yield
+            return
+
+        storage = self._db.storage
+        storage.begin()
+        self._in_transaction = True
+        try:
+            yield
+            storage.commit()
+        except BaseException:
+            table_names = self._db.tables()
+            storage.rollback()
+            self._reset(table_names)
+            raise
+        else:
+            self._record_modification()
+        finally:
+            self._in_transaction = False
+
+    def _reset(self, table_names):
+        """Reset all data derived from the database content after discarding
+        modifications of the given tables.
+        """
+        self._indexes.clear()
+        for table_name in table_names | self._db.tables():
+            self._db.table(table_name).reset()
+
+    def storage_version(self):
+        """Return the mtime and size of the JSON file (None for memory storage)."""
+        return self._file_signature()
+
+    def get_stats(self):
+        """The storage statistics comprise the size of the JSON file, and the number
+        of distinct values held by the indexes built so far.
+        """
+        return {
+            "rows": self._count_rows(),
+            "storage": {
+                "file_size": (
+                    os.path.getsize(self._filepath)
+                    if self._filepath is not None
+                    else None
+                ),
+                "indexed_values": sum(len(i) for i in self._indexes.values()),
+            },
+        }
+
+    def _count_rows(self):
+        return {
+            table_name: len(self._db.table(table_name))
+            for table_name in [DEFAULT_TABLE, RECURRENT_TABLE]
+        }
 
     @staticmethod
     def create_query_condition(**filters):
-        """:return: tinydb.queries.QueryInstance (default: noop)"""
-        condition = Query().noop()
-        entry = Query()
-        for field, pattern in filters.items():
-            if pattern is None and field in ["category", "end"]:
-                # The 'category' and 'end' fields are of type string or None. The
-                # condition is constructed depending on the filter pattern
-                new_condition = entry[field] == None  # noqa
-            elif field == "value":
-                new_condition = entry[field] == float(pattern)
-            else:
-                new_condition = entry[field].search(pattern.lower())
+        """Compile the filters into a predicate on a single document. Compiled
+        predicates are cached per normalized set of filters.
 
-            condition &= new_condition
-
-        return condition
+        :return: function returning whether the given document matches
+        """
+        return _compile_condition(tuple(sorted(filters.items())))
 
     def close(self):
         """Close the TinyDB database."""
         self._db.close()
 
 
+class MemoryMappedTinyDbInterface(TinyDbInterface):
+    """TinyDB interface for JSON files that serves read requests from the
+    memory-mapped file instead of parsing the entire file: only the requested
+    document (retrieve_by_id()) or table (retrieve()) is parsed. The file is mapped
+    for the duration of a single request. Modifications, and read requests within
+    transactions, are passed to TinyDB.
+    """
+
+    def __init__(self, filepath, **kwargs):
+        """:param filepath: path to JSON file
+        :param kwargs: keyword arguments for TinyDB constructor
+        """
+        super().__init__(filepath, **kwargs)
+
+    @contextmanager
+    def _mapped_tables(self):
+        tables = MemoryMappedTables(self._filepath, [DEFAULT_TABLE, RECURRENT_TABLE])
+        try:
+            yield tables
+        finally:
+            tables.close()
+
+    def retrieve(self, table_name, filters=None):
+        if self._in_transaction:
+            return super().retrieve(table_name, filters=filters)
+
+        with self._mapped_tables() as tables:
+            documents = tables.table(table_name)
+        condition = self.create_query_condition(**filters) if filters else None
+        return [
+            DocumentView(document, int(doc_id) + self._eid_offset)
+            for doc_id, document in documents.items()
+            if condition is None or condition(document)
+        ]
+
+    def retrieve_by_id(self, table_name, element_id):
+        if self._in_transaction:
+            return super().retrieve_by_id(table_name, element_id)
+
+        with self._mapped_tables() as tables:
+            document = tables.document(table_name, int(element_id) - self._eid_offset)
+        if document is None:
+            return
+        return DocumentView(document)
+
+    def _count_rows(self):
+        if self._in_transaction:
+            return super()._count_rows()
+
+        with self._mapped_tables() as tables:
+            return {
+                table_name: len(tables.table(table_name))
+                for table_name in [DEFAULT_TABLE, RECURRENT_TABLE]
+            }
+
+
 class TinyDbPocket(Pocket):
-    def __init__(self, name=None, data_dir=None, **kwargs):
+    def __init__(self, name=None, data_dir=None, memory_map=False, **kwargs):
         """Create a pocket with a TinyDB database backend, identified by 'name'.
         If 'data_dir' is given, the database storage type is JSON (the storage
         filepath is derived from the Pocket's name). Otherwise the data is
         stored in memory.
+        If 'memory_map' is set, and the storage type is JSON, entries are read from
+        the memory-mapped file and parsed on demand (useful for large pockets).
         Keyword args are passed to the TinyDB constructor. See the respective
         docs for detailed information.
         """
@@ -86,7 +548,10 @@ class TinyDbPocket(Pocket):
             args = [os.path.join(data_dir, f"{name}.json")]
             kwargs["storage"] = storages.JSONStorage
 
-        db_interface = TinyDbInterface(*args, **kwargs)
+        if memory_map and data_dir is not None:
+            db_interface = MemoryMappedTinyDbInterface(*args, **kwargs)
+        else:
+            db_interface = TinyDbInterface(*args, **kwargs)
         super().__init__(db_interface, name=name)
 
 
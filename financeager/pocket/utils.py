@@ -1,7 +1,71 @@
 """Utility classes for abstracting database operations."""
 
 from abc import ABC, abstractmethod
-from typing import Any, Iterable
+from collections import Counter
+from collections.abc import MutableMapping
+from contextlib import nullcontext
+from typing import Any, ContextManager, Iterable, Iterator
+
+from .. import DEFAULT_TABLE, RECURRENT_TABLE, exceptions
+
+
+class DocumentView(MutableMapping):
+    """Mapping exposing the fields of a database document, and optionally its ID as
+    'eid' field, without copying the document.
+    The view is copy-on-write: the document is copied once the view is modified,
+    leaving the underlying document untouched.
+    """
+
+    __slots__ = ("_document", "_eid", "_owned")
+
+    def __init__(self, document, eid=None):
+        """:param document: mapping of document fields
+        :param eid: document ID to expose under the 'eid' key (omitted if None)
+        """
+        self._document = document
+        self._eid = eid
+        self._owned = False
+
+    def __getitem__(self, key):
+        if key == "eid" and self._eid is not None:
+            return self._eid
+        return self._document[key]
+
+    def __iter__(self):
+        yield from self._document
+        if self._eid is not None:
+            yield "eid"
+
+    def __len__(self):
+        return len(self._document) + (self._eid is not None)
+
+    def __contains__(self, key):
+        return (key == "eid" and self._eid is not None) or key in self._document
+
+    def __setitem__(self, key, value):
+        self._own()
+        self._document[key] = value
+
+    def __delitem__(self, key):
+        self._own()
+        del self._document[key]
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def _own(self):
+        """Replace the underlying document by a private copy holding all fields."""
+        if not self._owned:
+            self._document = dict(self)
+            self._eid = None
+            self._owned = True
+
+    def copy(self):
+        """Return a view sharing the document with this one until either of them is
+        modified.
+        """
+        self._owned = False
+        return DocumentView(self._document, self._eid)
 
 
 class DatabaseInterface(ABC):
@@ -68,6 +132,88 @@ class DatabaseInterface(ABC):
         DatabaseInterface.retrieve).
         """
 
+    def iter_rows(self, table_name) -> Iterator[dict[str, Any]]:
+        """Iterate over all rows of a table, including their ID as 'eid' field.
+        Implementations may read the rows in chunks to avoid loading the entire table
+        at once.
+
+        :param table_name: name of the table to read
+        :return: iterator of dicts
+        """
+        return iter(self.retrieve(table_name))
+
+    def create_many(self, table_name, rows, preserve_eids=False) -> list[int]:
+        """Create multiple rows in a table.
+
+        :param table_name: name of the table
+        :param rows: iterable of dicts of data to insert. An 'eid' field is ignored
+            unless 'preserve_eids' is set
+        :param preserve_eids: whether to create the rows with the IDs given by their
+            'eid' field
+        :return: list of IDs of the created elements
+        :raise: PocketException if 'preserve_eids' is not supported
+        """
+        if preserve_eids:
+            raise exceptions.PocketException(
+                f"{type(self).__name__} does not support preserving element IDs"
+            )
+        return [self.create(table_name, strip_eid(row)) for row in rows]
+
+    def copy_from(self, source, table_name, filters=None) -> Counter:
+        """Copy the rows of a table of the source database that satisfy the given
+        filters to the same table of this database, within a single transaction.
+        The rows are assigned new IDs.
+
+        :param source: DatabaseInterface to copy from (may be this one)
+        :param table_name: name of the table
+        :param filters: filters for selecting the rows (see retrieve())
+        :return: Counter of the (name, category) pairs of the copied rows
+        """
+        tally = Counter()
+
+        def _rows():
+            for row in source.retrieve(table_name, dict(filters or {})):
+                tally[(row["name"], row.get("category"))] += 1
+                yield strip_eid(row)
+
+        with self.transaction():
+            self.create_many(table_name, _rows())
+        return tally
+
+    def get_stats(self) -> dict[str, dict[str, Any]]:
+        """Return statistics about the database, organized in sections: 'rows' maps
+        the names of the standard and the recurrent table to their number of rows,
+        'storage' holds implementation-specific information about the stored data
+        (e.g. file sizes in bytes).
+        The default implementation counts the rows by iterating over the tables.
+        """
+        return {
+            "rows": {
+                table_name: sum(1 for _ in self.iter_rows(table_name))
+                for table_name in [DEFAULT_TABLE, RECURRENT_TABLE]
+            },
+            "storage": {},
+        }
+
+    def storage_version(self) -> Any:
+        """Return a value that changes whenever the stored data is modified, including
+        modifications by other processes. The default implementation returns None,
+        i.e. such modifications are not detected.
+        """
+        return None
+
+    def transaction(self) -> ContextManager:
+        """Return a context manager grouping the modifications within the context.
+        If supported by the implementation, the modifications are applied atomically
+        when leaving the context, and discarded if an exception is raised.
+        """
+        return nullcontext()
+
     @abstractmethod
     def close(self) -> None:
         """Close underlying database."""
+
+
+def strip_eid(row):
+    """Return a copy of the given row without the 'eid' field."""
+    return {k: v for k, v in row.items() if k != "eid"}
@@ -1,68 +1,342 @@
 """Top-level service organizing databases."""
 
-import glob
+import copy
+import fnmatch
+import functools
+import json
+import math
+import os
 import os.path
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from stat import S_ISDIR
 
 from . import DEFAULT_POCKET_NAME, exceptions, init_logger, pocket
+from .columnar import encode as columnar_encode
 
 logger = init_logger(__name__)
 
+# Maximum number of recent durations per command kept for computing percentiles
+MAX_TIMING_SAMPLES = 1000
+# Pocket methods, and keys of their results in the response, by command name
+POCKET_COMMANDS = {
+    "add": ("add_entry", "id"),
+    "remove": ("remove_entry", "id"),
+    "list": ("get_entries", "elements"),
+    "get": ("get_entry", "element"),
+    "update": ("update_entry", "id"),
+    "categories": ("get_categories", "categories"),
+}
+# Commands of POCKET_COMMANDS that modify the pocket
+MODIFYING_COMMANDS = {"add", "remove", "update"}
+# Default maximum number of responses kept in the cache of a Server
+DEFAULT_MAX_CACHED_RESPONSES = 128
+# Maximum number of pockets queried concurrently by a single 'list' request
+MAX_LIST_WORKERS = 8
+# Pocket names containing any of these characters are treated as glob patterns
+GLOB_PATTERN = re.compile(r"[*?[]")
+
 
 class Server:
     """Server class holding the ``TinyDbPocket`` databases.
 
     All database handling is taken care of in the underlying `TinyDbPocket`.
     Kwargs (f.i. storage) are passed to the TinyDbPocket member.
+
+    If 'memory_map' is set, the JSON files of tinydb pockets are memory-mapped, and
+    only the requested entries are parsed (see MemoryMappedTinyDbInterface).
+
+    'shard_by' specifies whether sharded-tinydb pockets distribute the entries by
+    'year' or 'month' (see ShardedTinyDbInterface).
+
+    If 'max_open_pockets' is given, at most that many pockets are kept open. When
+    another pocket is requested, the least-recently used pocket is closed. Pockets
+    without persistent storage (i.e. if no 'data_dir' is given) are never closed
+    since their content would be lost.
+
+    The results of 'list' requests are cached (up to 'max_cached_responses', zero
+    disables caching), and invalidated when the pocket is modified (also by another
+    process, see Pocket.storage_version()). Responses share the cached results.
     """
 
-    def __init__(self, *, database_type="tinydb", **kwargs):
-        self._pockets = {}
+    def __init__(
+        self,
+        *,
+        database_type="tinydb",
+        max_open_pockets=None,
+        max_cached_responses=DEFAULT_MAX_CACHED_RESPONSES,
+        memory_map=False,
+        shard_by="year",
+        **kwargs,
+    ):
+        if memory_map:
+            if database_type != "tinydb":
+                raise ValueError("memory_map requires the tinydb database type")
+            kwargs["memory_map"] = True
+        if database_type == "sharded-tinydb":
+            kwargs["shard_by"] = shard_by
+        elif shard_by != "year":
+            raise ValueError("shard_by requires the sharded-tinydb database type")
+        self._pockets = OrderedDict()
         self._pocket_kwargs = kwargs
         self._database_type = database_type
+        self._max_open_pockets = max_open_pockets or None
+        self._pocket_stats = Counter()
+        # Number of ongoing operations per pocket; such pockets are not closed
+        self._pinned_pockets = Counter()
+        self._pockets_lock = threading.RLock()
+        self._command_timings = {}
+        self._timings_lock = threading.Lock()
+        # Counters of modifications per pocket name, part of response cache keys
+        self._generations = Counter()
+        self._cached_responses = OrderedDict()
+        self._max_cached_responses = max_cached_responses
+        self._response_stats = Counter()
+        self._responses_lock = threading.Lock()
 
     def run(self, command, **kwargs):
         """The requested pocket is created if not yet present. The method of
         `Pocket` corresponding to the given `command` is called. All `kwargs`
         are passed on. A json-like response is returned.
 
+        The command is dispatched to the handler registered for it (see
+        register_command()). The duration of handling is recorded per command.
+
+        The elements of the response might be other mappings than dicts (e.g.
+        pocket.utils.DocumentView), and results of 'list' requests are shared with
+        the response cache. Callers must not modify the response, and convert the
+        mappings when serializing it (see httpservice.json_default()).
+
         Wrap this in a 'broad' try-except block to catch any server-side errors.
         :return: dict
-            key is one of 'id', 'element', 'elements', 'error', 'pockets'
+            key is one of 'id', 'element', 'elements', 'error', 'pockets', 'stats',
+            'responses', 'pocket_elements'
         """
-        logger.debug(f"Running '{command}' with {kwargs}")
+        # Formatting is deferred until the record is emitted (kwargs might be large)
+        logger.debug("Running '%s' with %s", command, kwargs)
 
-        try:
-            if command == "pockets":
-                return {"pockets": self._pocket_names()}
-            elif command == "copy":
-                return {"id": self._copy_entry(**kwargs)}
-            elif command == "stop":
-                # graceful shutdown, invoke closing of files
-                for pd in self._pockets.values():
-                    pd.close()
-                return {}
-            else:
-                pocket_name = kwargs.pop("pocket", None)
-                pd = self._get_pocket(pocket_name)
-
-                if command == "add":
-                    response = {"id": pd.add_entry(**kwargs)}
-                elif command == "remove":
-                    response = {"id": pd.remove_entry(**kwargs)}
-                elif command == "list":
-                    response = {"elements": pd.get_entries(**kwargs)}
-                elif command == "get":
-                    response = {"element": pd.get_entry(**kwargs)}
-                elif command == "update":
-                    response = {"id": pd.update_entry(**kwargs)}
-                elif command == "categories":
-                    response = {"categories": pd.get_categories()}
-                else:
-                    response = {"error": f"Server: unknown command '{command}'"}
-                return response
+        handler = self._command_handlers.get(command)
+        if handler is None:
+            return {"error": f"Server: unknown command '{command}'"}
 
+        start = time.perf_counter()
+        try:
+            return handler(self, **kwargs)
         except exceptions.PocketException as e:
             return {"error": e}
+        finally:
+            self._record_timing(command, time.perf_counter() - start)
+
+    @classmethod
+    def register_command(cls, name, handler):
+        """Register a handler for the command 'name', replacing any existing one.
+        Plugins may use this to extend the server by custom commands.
+
+        The handler is called with the Server instance and the keyword arguments of
+        the request, and returns the response dict. It may raise a
+        PocketException which is returned as error response.
+        """
+        if "_command_handlers" not in cls.__dict__:
+            # Don't modify the handlers of the parent class
+            cls._command_handlers = dict(cls._command_handlers)
+        cls._command_handlers[name] = handler
+
+    def _handle_pocket_command(self, command, pocket=None, **kwargs):
+        try:
+            with self._pinned_pocket(pocket) as pd:
+                return self._run_pocket_command(pd, command, **kwargs)
+        finally:
+            if command in MODIFYING_COMMANDS:
+                self._invalidate_responses(pocket)
+
+    def _handle_list(self, pocket=None, **kwargs):
+        if "pockets" in kwargs:
+            return {"pocket_elements": self._list_pockets(**kwargs)}
+        with self._pinned_pocket(pocket) as pd:
+            return {"elements": self._get_entries(pd, **kwargs)}
+
+    def _handle_pocket_stats(self, pocket=None):
+        with self._pinned_pocket(pocket) as pd:
+            stats = pd.get_stats()
+        with self._pockets_lock:
+            stats["server"] = {"open_pockets": len(self._pockets)}
+        return {"pocket_stats": stats}
+
+    def _get_entries(self, pd, columnar=False, **kwargs):
+        """Return the entries of the given pocket (see Pocket.get_entries()). The
+        result is taken from the response cache if available.
+
+        If 'columnar' is true, the entries (unless recurrent_only) are returned in
+        columnar representation (see columnar.encode()).
+
+        The cache key comprises the pocket's generation and storage version, and the
+        current date since recurrent entries are expanded until today. The cached
+        result is shared; callers must not modify it.
+        """
+        if not self._max_cached_responses:
+            return self._query_entries(pd, columnar, **kwargs)
+
+        key = (
+            pd.name,
+            "list",
+            json.dumps(kwargs, sort_keys=True, default=str),
+            bool(columnar),
+            self._generations[pd.name],
+            pd.storage_version(),
+            date.today(),
+        )
+        with self._responses_lock:
+            entries = self._cached_responses.get(key)
+            if entries is not None:
+                self._cached_responses.move_to_end(key)
+                self._response_stats["hits"] += 1
+                return entries
+            self._response_stats["misses"] += 1
+
+        entries = self._query_entries(pd, columnar, **kwargs)
+
+        with self._responses_lock:
+            self._cached_responses[key] = entries
+            while len(self._cached_responses) > self._max_cached_responses:
+                self._cached_responses.popitem(last=False)
+        return entries
+
+    @staticmethod
+    def _query_entries(pd, columnar, **kwargs):
+        entries = pd.get_entries(**kwargs)
+        if columnar and not kwargs.get("recurrent_only"):
+            entries = columnar_encode(entries)
+        return entries
+
+    def _invalidate_responses(self, pocket_name):
+        """Increment the generation of the given pocket after it was modified, and
+        discard its cached responses.
+        """
+        name = str(pocket_name or DEFAULT_POCKET_NAME)
+        with self._responses_lock:
+            self._generations[name] += 1
+            for key in [k for k in self._cached_responses if k[0] == name]:
+                del self._cached_responses[key]
+
+    def _get_response_stats(self):
+        """Return statistics about the response cache.
+
+        :return: dict
+        """
+        with self._responses_lock:
+            hits = self._response_stats["hits"]
+            requests = hits + self._response_stats["misses"]
+            return {
+                "cached": len(self._cached_responses),
+                "max_cached": self._max_cached_responses,
+                "hits": hits,
+                "misses": self._response_stats["misses"],
+                "hit_rate": hits / requests if requests else 0.0,
+            }
+
+    def _handle_stop(self, **_):
+        # graceful shutdown, invoke closing of files
+        with self._pockets_lock:
+            for pd in self._pockets.values():
+                pd.close()
+            self._pockets.clear()
+        with self._responses_lock:
+            self._cached_responses.clear()
+        return {}
+
+    @staticmethod
+    def _run_pocket_command(pd, command, **kwargs):
+        """Call the method of the given pocket corresponding to 'command'.
+
+        :return: dict
+        :raise: PocketException
+        """
+        try:
+            method_name, response_key = POCKET_COMMANDS[command]
+        except KeyError:
+            return {"error": f"Server: unknown command '{command}'"}
+        return {response_key: getattr(pd, method_name)(**kwargs)}
+
+    def _record_timing(self, command, duration):
+        with self._timings_lock:
+            timing = self._command_timings.get(command)
+            if timing is None:
+                timing = self._command_timings[command] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "samples": deque(maxlen=MAX_TIMING_SAMPLES),
+                }
+            timing["count"] += 1
+            timing["total"] += duration
+            timing["max"] = max(timing["max"], duration)
+            timing["samples"].append(duration)
+
+    def _get_command_stats(self):
+        """Return latency statistics (in seconds) per command. Percentiles are
+        computed from the latest MAX_TIMING_SAMPLES durations of a command.
+
+        :return: dict
+        """
+        stats = {}
+        with self._timings_lock:
+            for command, timing in sorted(self._command_timings.items()):
+                samples = sorted(timing["samples"])
+                stats[command] = {
+                    "count": timing["count"],
+                    "total": timing["total"],
+                    "p50": _percentile(samples, 0.5),
+                    "p95": _percentile(samples, 0.95),
+                    "max": timing["max"],
+                }
+        return stats
+
+    def _run_batch(self, items, pocket=None, atomic=True):
+        """Run the commands of the given items in order against a single pocket
+        within one transaction.
+
+        :param items: list of dicts holding the 'command' (any command operating on
+            a single pocket, e.g. 'add' or 'list'), and optionally its 'kwargs'
+        :param pocket: name of the pocket
+        :param atomic: if set, stop at the first failing command, and discard all
+            modifications of the batch (all-or-nothing). Otherwise run all commands
+            (best-effort), and report errors in the respective responses
+        :return: list of responses, one per item
+        :raise: PocketException if any item is malformed, or if 'atomic' is set and
+            any command fails
+        """
+        _validate_batch_items(items)
+        responses = []
+
+        try:
+            with self._pinned_pocket(pocket) as pd, pd.transaction():
+                for index, item in enumerate(items):
+                    command = item["command"]
+                    try:
+                        response = self._run_pocket_command(
+                            pd, command, **item.get("kwargs", {})
+                        )
+                    except (exceptions.PocketException, TypeError) as e:
+                        # TypeError is raised for invalid keyword arguments
+                        response = {"error": e}
+
+                    if atomic and "error" in response:
+                        raise exceptions.PocketException(
+                            f"Batch item {index} ('{command}') failed, no changes were "
+                            f"applied: {response['error']}"
+                        )
+                    responses.append(response)
+        finally:
+            if any(item["command"] in MODIFYING_COMMANDS for item in items):
+                self._invalidate_responses(pocket)
+
+        return responses
 
     def _get_pocket(self, name=None):
         """Get the Pocket identified by 'name' from the Pockets dictionary. If
@@ -73,20 +347,124 @@ class Server:
         :return: Pocket object
         """
         name = name or DEFAULT_POCKET_NAME
-        try:
-            pd = self._pockets[name]
-        except KeyError:
-            logger.debug(f"Loading pocket '{name}'")
-            pocket_class = pocket.POCKET_CLASSES.get(self._database_type)
-            if pocket_class is None:
-                raise exceptions.PocketException(
-                    f"No pocket class available for '{self._database_type}'"
-                )
-            pd = pocket_class(name, **self._pocket_kwargs)
-            self._pockets[pd.name] = pd
+        with self._pockets_lock:
+            try:
+                pd = self._pockets[name]
+                self._pockets.move_to_end(name)
+                self._pocket_stats["hits"] += 1
+            except KeyError:
+                logger.debug(f"Loading pocket '{name}'")
+                pocket_class = pocket.POCKET_CLASSES.get(self._database_type)
+                if pocket_class is None:
+                    raise exceptions.PocketException(
+                        f"No pocket class available for '{self._database_type}'"
+                    )
+                self._pocket_stats["misses"] += 1
+                self._evict_pockets()
+                kwargs = self._pocket_kwargs
+                if self._database_type == "sqlite":
+                    # Pockets are shared between the threads handling requests
+                    kwargs = {**kwargs, "check_same_thread": False}
+                pd = pocket_class(name, **kwargs)
+                self._pockets[pd.name] = pd
 
         return pd
 
+    @contextmanager
+    def _pinned_pocket(self, name=None):
+        """Context manager providing the Pocket identified by 'name' (see
+        _get_pocket()). The pocket is not closed by eviction within the context.
+        """
+        name = name or DEFAULT_POCKET_NAME
+        with self._pockets_lock:
+            pd = self._get_pocket(name)
+            self._pinned_pockets[name] += 1
+        try:
+            yield pd
+        finally:
+            with self._pockets_lock:
+                self._pinned_pockets[name] -= 1
+                if not self._pinned_pockets[name]:
+                    del self._pinned_pockets[name]
+                # Close pockets that were kept open beyond the limit while pinned
+                self._evict_pockets(room=0)
+
+    def _evict_pockets(self, room=1):
+        """Close least-recently used pockets to make room for opening 'room' other
+        ones. Pinned pockets are skipped.
+        """
+        if (
+            self._max_open_pockets is None
+            or self._pocket_kwargs.get("data_dir") is None
+        ):
+            return
+
+        for name in list(self._pockets):
+            if len(self._pockets) + room <= self._max_open_pockets:
+                break
+            if name in self._pinned_pockets:
+                continue
+
+            logger.debug(f"Closing least-recently used pocket '{name}'")
+            self._pockets.pop(name).close()
+            self._pocket_stats["evictions"] += 1
+
+    def _get_pocket_stats(self):
+        """Return statistics about the pockets organized by the server.
+
+        :return: dict
+        """
+        hits = self._pocket_stats["hits"]
+        requests = hits + self._pocket_stats["misses"]
+        return {
+            "open": len(self._pockets),
+            "max_open": self._max_open_pockets,
+            "hits": hits,
+            "misses": self._pocket_stats["misses"],
+            "evictions": self._pocket_stats["evictions"],
+            "hit_rate": hits / requests if requests else 0.0,
+        }
+
+    def _match_pocket_names(self, patterns):
+        """Return the names of the given pockets in order, with glob patterns (e.g.
+        '202*') replaced by the names of the matching existing pockets. Duplicates
+        are removed.
+
+        :raise: PocketException if a pattern does not match any pocket
+        """
+        names = {}
+        existing_names = None
+        for pattern in patterns:
+            if not GLOB_PATTERN.search(pattern):
+                names[pattern] = None
+                continue
+
+            if existing_names is None:
+                existing_names = self._pocket_names()
+            matches = fnmatch.filter(existing_names, pattern)
+            if not matches:
+                raise exceptions.PocketException(f"No pocket matching '{pattern}'")
+            names.update(dict.fromkeys(matches))
+        return list(names)
+
+    def _list_pockets(self, pockets, **kwargs):
+        """Query the entries of multiple pockets concurrently.
+
+        :param pockets: list of pocket names or glob patterns
+        :param kwargs: keyword arguments for Pocket.get_entries()
+        :return: dict mapping pocket names to their entries
+        """
+        names = self._match_pocket_names(pockets)
+
+        def _list(name):
+            with self._pinned_pocket(name) as pd:
+                # The keyword arguments must not be shared between threads
+                return self._get_entries(pd, **copy.deepcopy(kwargs))
+
+        max_workers = max(1, min(len(names), MAX_LIST_WORKERS))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(names, executor.map(_list, names)))
+
     def _pocket_names(self):
         """Return names of pockets currently organized by the server.
         If persistent data storage was specified, all JSON files present in the
@@ -96,7 +474,8 @@ class Server:
         """
         # Avoid duplicate entries if Pocket already present in self._pockets by
         # using sets
-        names = {p._name for p in self._pockets.values()}
+        with self._pockets_lock:
+            names = {p._name for p in self._pockets.values()}
 
         data_dir = self._pocket_kwargs.get("data_dir")
         names.update(pocket_names(data_dir, database_type=self._database_type))
@@ -110,39 +489,211 @@ class Server:
         :return: ID of copied entry
         :raises: PocketException if the source entry does not exist
         """
-        source_pocket = self._get_pocket(source_pocket)
-        entry_to_copy = source_pocket.get_entry(**kwargs)
+        with self._pinned_pocket(source_pocket) as pd:
+            entry_to_copy = pd.get_entry(**kwargs)
 
-        destination_pocket = self._get_pocket(destination_pocket)
-        return destination_pocket.add_entry(
-            table_name=kwargs.get("table_name"), **entry_to_copy
-        )
+        try:
+            with self._pinned_pocket(destination_pocket) as pd:
+                return pd.add_entry(
+                    table_name=kwargs.get("table_name"), **entry_to_copy
+                )
+        finally:
+            self._invalidate_responses(destination_pocket)
+
+    def _copy_entries(
+        self, source_pocket=None, destination_pocket=None, filters=None, table_name=None
+    ):
+        """Copy the entries (of the table 'table_name') of the source pocket that
+        match the given filters to the destination pocket (see
+        Pocket.copy_entries()).
+
+        :return: number of copied entries
+        """
+        try:
+            with (
+                self._pinned_pocket(source_pocket) as source,
+                self._pinned_pocket(destination_pocket) as destination,
+            ):
+                return destination.copy_entries(
+                    source, filters=filters, table_name=table_name
+                )
+        finally:
+            self._invalidate_responses(destination_pocket)
+
+    # Handlers by command name, see register_command()
+    _command_handlers = {
+        "pockets": lambda self, **_: {"pockets": self._pocket_names()},
+        "copy": lambda self, **kwargs: {"id": self._copy_entry(**kwargs)},
+        "copy-many": lambda self, **kwargs: {"count": self._copy_entries(**kwargs)},
+        "stats": lambda self, **_: {
+            "stats": {
+                "pockets": self._get_pocket_stats(),
+                "responses": self._get_response_stats(),
+                "commands": self._get_command_stats(),
+            }
+        },
+        "pocket-stats": _handle_pocket_stats,
+        "stop": _handle_stop,
+        "batch": lambda self, **kwargs: {"responses": self._run_batch(**kwargs)},
+        "list": _handle_list,
+        "add": functools.partial(_handle_pocket_command, command="add"),
+        "remove": functools.partial(_handle_pocket_command, command="remove"),
+        "get": functools.partial(_handle_pocket_command, command="get"),
+        "update": functools.partial(_handle_pocket_command, command="update"),
+        "categories": functools.partial(_handle_pocket_command, command="categories"),
+    }
+
+
+def _validate_batch_items(items):
+    """Check that the given batch items are a list of dicts, each holding the
+    'command' as string, and optionally its 'kwargs' as dict.
+
+    :raise: PocketException if any item is malformed
+    """
+    if not isinstance(items, list):
+        raise exceptions.PocketException("Batch items must be a list")
 
+    for index, item in enumerate(items):
+        if not isinstance(item, Mapping) or not isinstance(item.get("command"), str):
+            raise exceptions.PocketException(
+                f"Batch item {index} must be a dict holding a 'command' string"
+            )
+        if not isinstance(item.get("kwargs", {}), Mapping):
+            raise exceptions.PocketException(
+                f"Batch item {index} ('{item['command']}'): 'kwargs' must be a dict"
+            )
 
-def pocket_names(data_dir, database_type=None):
+
+def _percentile(sorted_values, fraction):
+    """Return the nearest-rank percentile of the given sorted values, or None if
+    there are none.
+    """
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+# Patterns of pocket database files (or directories) per database type
+POCKET_FILE_PATTERNS = {
+    "tinydb": "*.json",
+    "sqlite": "*.sqlite",
+    "sharded-tinydb": "*.shards",
+}
+
+
+# Modifications of a directory within this interval before scanning it might not
+# be reflected by its mtime (coarse timestamp resolution of some file systems)
+MTIME_RESOLUTION_NS = 2 * 10**9
+
+# Pocket names per database type found in data directories, see pocket_names()
+_pocket_names_cache = {}
+
+
+def _scan_pocket_names(data_dir):
+    """Scan the given data directory once, and return the names of the pockets per
+    database type. As with glob, hidden files are ignored.
+
+    :return: dict mapping database types to lists of pocket names
+    """
+    names = {database_type: [] for database_type in POCKET_FILE_PATTERNS}
+    with os.scandir(data_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            for database_type, pattern in POCKET_FILE_PATTERNS.items():
+                if fnmatch.fnmatch(entry.name, pattern):
+                    names[database_type].append(os.path.splitext(entry.name)[0])
+    return names
+
+
+def _read_pocket_names_cache(cache_filepath, data_dir):
+    """Return the cached pocket names of the data directory stored in the given
+    file, or None if not available.
+    """
+    try:
+        with open(cache_filepath) as f:
+            cache = json.load(f)
+        if cache["data_dir"] == data_dir:
+            return cache
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.debug(f"Could not read pocket names cache: {e}")
+    return None
+
+
+def _write_pocket_names_cache(cache_filepath, cache):
+    try:
+        with open(cache_filepath, "w") as f:
+            json.dump(cache, f)
+    except OSError as e:
+        logger.debug(f"Could not write pocket names cache: {e}")
+
+
+def _cached_pocket_names(data_dir, cache_filepath=None):
+    """Return the names of the pockets in the given data directory per database
+    type.
+
+    The names are cached in memory (and, if 'cache_filepath' is given, in that
+    file) together with the mtime of the directory, so that revalidating the cache
+    takes a single stat call. The directory is only scanned again if its mtime
+    changed, or if it was modified so shortly before the last scan that later
+    modifications might not have changed the mtime.
+
+    :return: dict mapping database types to lists of pocket names
+    """
+    try:
+        stat_result = os.stat(data_dir)
+    except OSError:
+        return {}
+    if not S_ISDIR(stat_result.st_mode):
+        return {}
+    mtime_ns = stat_result.st_mtime_ns
+
+    cache = _pocket_names_cache.get(data_dir)
+    if cache is None and cache_filepath is not None:
+        cache = _read_pocket_names_cache(cache_filepath, data_dir)
+    if (
+        cache is not None
+        and cache["mtime_ns"] == mtime_ns
+        and mtime_ns + MTIME_RESOLUTION_NS < cache["scanned_ns"]
+    ):
+        _pocket_names_cache[data_dir] = cache
+        return cache["names"]
+
+    logger.debug(f"Scanning '{data_dir}' for pockets")
+    cache = {
+        "data_dir": data_dir,
+        "mtime_ns": mtime_ns,
+        "scanned_ns": time.time_ns(),
+        "names": _scan_pocket_names(data_dir),
+    }
+    _pocket_names_cache[data_dir] = cache
+    if cache_filepath is not None:
+        _write_pocket_names_cache(cache_filepath, cache)
+    return cache["names"]
+
+
+def pocket_names(data_dir, database_type=None, cache_filepath=None):
     """Return names of all pockets matching the specified database type (i.e. names of
-    JSON/sqlite files in the given data directory for tinydb/sqlite type), or an empty
-    set if the specified data directory is None.
+    JSON/sqlite files, or of shard directories, in the given data directory for
+    tinydb/sqlite/sharded-tinydb type), or an empty set if the specified data
+    directory is None.
     If no database type specified, return all possible database files in the given data
     directory. This is used for CLI completion, and while it is unprecise (any command
     accepting a --pocket argument can only run on either database type), we keep it
     because it's better than no completion options at all.
+    The directory content is cached, see _cached_pocket_names(). The cache is
+    additionally persisted in 'cache_filepath' if given.
     """
     if data_dir is None:
         return set()
 
-    tinydb_result = {
-        os.path.splitext(os.path.basename(f))[0]
-        for f in glob.glob(os.path.join(data_dir, "*.json"))
-    }
-    sqlite_result = {
-        os.path.splitext(os.path.basename(f))[0]
-        for f in glob.glob(os.path.join(data_dir, "*.sqlite"))
-    }
     if database_type is None:
-        return tinydb_result.union(sqlite_result)
-    elif database_type == "tinydb":
-        return tinydb_result
-    elif database_type == "sqlite":
-        return sqlite_result
-    raise exceptions.PocketException(f"Unknown database type '{database_type}'")
+        database_types = POCKET_FILE_PATTERNS
+    elif database_type in POCKET_FILE_PATTERNS:
+        database_types = [database_type]
+    else:
+        raise exceptions.PocketException(f"Unknown database type '{database_type}'")
+
+    names = _cached_pocket_names(data_dir, cache_filepath=cache_filepath)
+    return {name for t in database_types for name in names.get(t, [])}
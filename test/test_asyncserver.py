@@ -0,0 +1,161 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+
+from financeager import DEFAULT_TABLE, asyncserver, server
+
+
+class ActivityRecorder:
+    """Wrapper around Server._run_pocket_command recording the maximum number of
+    concurrently running commands per pocket and in total."""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.active = Counter()
+        self.max_active = Counter()
+        self._lock = threading.Lock()
+        self._run_pocket_command = server.Server._run_pocket_command
+
+    def __call__(self, pd, command, **kwargs):
+        with self._lock:
+            self.active[pd.name] += 1
+            self.active["total"] += 1
+            for key in [pd.name, "total"]:
+                self.max_active[key] = max(self.max_active[key], self.active[key])
+        try:
+            time.sleep(self.delay)
+            return self._run_pocket_command(pd, command, **kwargs)
+        finally:
+            with self._lock:
+                self.active[pd.name] -= 1
+                self.active["total"] -= 1
+
+
+class AsyncServerTestCase(unittest.IsolatedAsyncioTestCase):
+    database_type = "sqlite"
+
+    async def asyncSetUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.server = asyncserver.AsyncServer(
+            database_type=self.database_type, data_dir=self.data_dir, max_workers=8
+        )
+
+    async def asyncTearDown(self):
+        await self.server.close()
+        shutil.rmtree(self.data_dir)
+
+    async def test_requests(self):
+        response = await self.server.run("add", name="rent", value=-500, pocket="a")
+        self.assertEqual(response, {"id": 1})
+
+        response = await self.server.run(
+            "copy", eid=1, source_pocket="a", destination_pocket="b"
+        )
+        self.assertEqual(response, {"id": 1})
+
+        response = await self.server.run(
+            "copy-many", source_pocket="a", destination_pocket="b"
+        )
+        self.assertEqual(response, {"count": 1})
+
+        response = await self.server.run("list", pockets=["*"])
+        self.assertEqual(list(response["pocket_elements"]), ["a", "b"])
+        self.assertEqual(len(response["pocket_elements"]["b"][DEFAULT_TABLE]), 2)
+
+        response = await self.server.run("get", eid=1, pocket="b")
+        self.assertEqual(response["element"]["name"], "rent")
+
+        response = await self.server.run("pockets")
+        self.assertEqual(response["pockets"], ["a", "b"])
+
+        response = await self.server.run("get", eid=3, pocket="b")
+        self.assertIn("error", response)
+
+        response = await self.server.run("list", pockets=["x*"])
+        self.assertEqual(str(response["error"]), "No pocket matching 'x*'")
+
+    async def test_writes_to_same_pocket_are_serialized(self):
+        recorder = ActivityRecorder()
+        with mock.patch.object(server.Server, "_run_pocket_command", recorder):
+            responses = await asyncio.gather(
+                *[
+                    self.server.run("add", name=f"{i}", value=i, pocket=pocket)
+                    for i in range(4)
+                    for pocket in ["a", "b"]
+                ]
+            )
+
+        self.assertEqual(sorted(r["id"] for r in responses), [1, 1, 2, 2, 3, 3, 4, 4])
+        self.assertEqual(recorder.max_active["a"], 1)
+        self.assertEqual(recorder.max_active["b"], 1)
+        # Different pockets are modified in parallel
+        self.assertEqual(recorder.max_active["total"], 2)
+
+        response = await self.server.run("list", pocket="a")
+        self.assertEqual(len(response["elements"][DEFAULT_TABLE]), 4)
+
+    async def test_reads(self):
+        await self.server.run("add", name="rent", value=-500, pocket="a")
+
+        recorder = ActivityRecorder()
+        with mock.patch.object(server.Server, "_run_pocket_command", recorder):
+            await asyncio.gather(
+                *[self.server.run("list", pocket="a") for _ in range(4)],
+                self.server.run("add", name="food", value=-5, pocket="a"),
+                *[self.server.run("categories", pocket="a") for _ in range(4)],
+            )
+
+        if self.database_type == "sqlite":
+            self.assertGreater(recorder.max_active["a"], 1)
+        else:
+            self.assertEqual(recorder.max_active["a"], 1)
+
+
+class TinyDbAsyncServerTestCase(AsyncServerTestCase):
+    database_type = "tinydb"
+
+
+class ReadWriteLockTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_waiting_writer_precedes_new_readers(self):
+        lock = asyncserver.ReadWriteLock()
+        events = []
+
+        async def read(name):
+            async with lock.reading():
+                events.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                events.append(f"{name} end")
+
+        async def write():
+            async with lock.writing():
+                events.append("writer start")
+                await asyncio.sleep(0.01)
+                events.append("writer end")
+
+        first_reader = asyncio.create_task(read("reader 1"))
+        await asyncio.sleep(0)
+        writer = asyncio.create_task(write())
+        await asyncio.sleep(0)
+        second_reader = asyncio.create_task(read("reader 2"))
+        await asyncio.gather(first_reader, writer, second_reader)
+
+        self.assertEqual(
+            events,
+            [
+                "reader 1 start",
+                "reader 1 end",
+                "writer start",
+                "writer end",
+                "reader 2 start",
+                "reader 2 end",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
+import argparse
 import os
 import shlex
 import sqlite3
+import subprocess
+import sys
 import tempfile
 import unittest
 from collections import defaultdict
@@ -8,6 +11,7 @@ from datetime import datetime as dt
 from json import loads as jloads
 from unittest import mock
 
+from rich.console import Group
 from rich.table import Table as RichTable
 
 import financeager
@@ -22,6 +26,8 @@ from financeager import (
     plugin,
     setup_log_file_handler,
 )
+from financeager.pocket import ShardedTinyDbPocket, SqlitePocket, TinyDbPocket
+from financeager.pocket.migrate import migrate_pocket, verify_migration
 
 TEST_CONFIG_FILEPATH = "/tmp/financeager-test-config"
 TEST_DATA_DIR = tempfile.mkdtemp(prefix="financeager-")
@@ -71,7 +77,14 @@ class CliTestCase(unittest.TestCase):
         command = args[0]
 
         # Exclude option from subcommand parsers that would be confused
-        if command not in ["copy", "pockets", "migrate-pockets"]:
+        if command not in [
+            "copy",
+            "copy-many",
+            "pockets",
+            "stats",
+            "migrate-pockets",
+            "replicate-pocket",
+        ]:
             args.extend(["--pocket", str(self.pocket)])
 
         args.extend(["--config-filepath", TEST_CONFIG_FILEPATH])
@@ -153,6 +166,18 @@ class CliLocalServerNoneConfigTestCase(CliTestCase):
         mocked_info.assert_called_once_with({"pockets": []})
         mocked_print.assert_called_once_with("")
 
+    @mock.patch("builtins.print")
+    def test_stats(self, mocked_print):
+        cli.run(
+            "stats", configuration=config.Configuration(filepath=TEST_CONFIG_FILEPATH)
+        )
+
+        mocked_print.assert_called_once_with(
+            "Pockets:\n  open: 0\n  max open: -\n  hits: 0\n  misses: 0\n"
+            "  evictions: 0\n  hit rate: 0.0%\nResponses:\n  cached: 0\n"
+            "  max cached: 128\n  hits: 0\n  misses: 0\n  hit rate: 0.0%"
+        )
+
     @mock.patch("builtins.print")
     @mock.patch("financeager.localserver.Proxy.run")
     def test_str_response(self, mocked_run, mocked_print):
@@ -396,6 +421,67 @@ default_category = no-category"""
             },
         )
 
+    def test_list_multiple_pockets_json(self):
+        entry_id = self.cli_run("add money 10")
+        other_pocket = self.pocket + 1000
+        self.cli_run(
+            "copy {} -s {} -d {}", format_args=(entry_id, self.pocket, other_pocket)
+        )
+
+        response = jloads(self.cli_run("list --json -p {}", format_args=other_pocket))
+        self.assertEqual(list(response), [str(other_pocket), str(self.pocket)])
+        for pocket in [other_pocket, self.pocket]:
+            elements = response[str(pocket)][DEFAULT_TABLE].values()
+            self.assertEqual([e["name"] for e in elements], ["money"])
+
+    def test_copy_many(self):
+        self.cli_run("add rent -500 -c housing")
+        self.cli_run("add fuel -50 -c car")
+        self.cli_run("add insurance -20 -c car")
+        self.cli_run("add salary 2000 -f monthly -s 2020-01-01")
+        other_pocket = self.pocket + 1000
+
+        response = self.cli_run(
+            "copy-many -s {} -d {} -f category=car",
+            format_args=(self.pocket, other_pocket),
+        )
+        self.assertEqual(response, {"count": 2})
+        response = self.cli_run(
+            "copy-many -s {} -d {} -f frequency=month",
+            format_args=(self.pocket, other_pocket),
+        )
+        self.assertEqual(response, {"count": 1})
+
+        response = jloads(self.cli_run("list --json -p {}", format_args=other_pocket))
+        elements = response[str(other_pocket)]
+        self.assertEqual(
+            sorted(e["name"] for e in elements[DEFAULT_TABLE].values()),
+            ["fuel", "insurance"],
+        )
+        self.assertEqual(list(elements[RECURRENT_TABLE]), ["1"])
+
+        # The date filter applies to the entries generated from recurrent entries
+        response = self.cli_run(
+            "copy-many -s {} -d {} -r -f date=2020-03",
+            format_args=(self.pocket, other_pocket),
+        )
+        self.assertEqual(response, {"count": 1})
+        response = self.cli_run(
+            "copy-many -s {} -d {} -t recurrent -f date=2019",
+            format_args=(self.pocket, other_pocket),
+        )
+        self.assertEqual(response, {"count": 0})
+
+        response = self.cli_run(
+            "copy-many -s {} -d {} -t standard -f frequency=month",
+            format_args=(self.pocket, other_pocket),
+            log_method="error",
+        )
+        self.assertEqual(
+            response,
+            "Invalid request: Unknown filter field(s) for table 'standard': frequency",
+        )
+
     @mock.patch("financeager.server.Server.run")
     def test_communication_error(self, mocked_run):
         # Raise exception on first call, behave fine on stop call
@@ -470,6 +556,34 @@ class CategoryCacheTestCase(CliTestCase):
         categories = sorted(cli._read_categories_for_cli_completion())
         self.assertListEqual(categories, list("bcef"))
 
+    def test_cli_categories_cache_per_pocket(self):
+        self.pocket = "other"
+        self.cli_run("add something -10 -c Zeta")
+        self.assertListEqual(cli._read_categories_for_cli_completion("other"), ["zeta"])
+        self.assertNotIn("zeta", cli._read_categories_for_cli_completion())
+
+        parsed_args = argparse.Namespace(pocket="other")
+        self.assertListEqual(
+            cli._complete_categories(parsed_args=parsed_args), ["zeta"]
+        )
+        parsed_args = argparse.Namespace()
+        self.assertNotIn("zeta", cli._complete_categories(parsed_args=parsed_args))
+
+        # The cache file is only written if the category names change
+        fp = clients.categories_cache_filepath("other")
+        os.utime(fp, (0, 0))
+        self.cli_run("add something -10")
+        self.cli_run("add another -10 -c zeta")
+        self.cli_run("update 1 -n thing")
+        self.cli_run("add rent -500 -t recurrent -f monthly -c home")
+        self.assertEqual(os.stat(fp).st_mtime, 0)
+
+        self.cli_run("add else -1 -c eta")
+        self.assertNotEqual(os.stat(fp).st_mtime, 0)
+        self.assertListEqual(
+            cli._read_categories_for_cli_completion("other"), ["eta", "zeta"]
+        )
+
 
 class PreprocessTestCase(unittest.TestCase):
     @unittest.skip("DD.MM. not recognized as date format by dateutil")
@@ -550,6 +664,68 @@ class FormatResponseTestCase(unittest.TestCase):
     def test_copy(self):
         self.assertEqual("Copied element 1.", cli._format_response({"id": 1}, "copy"))
 
+    def test_copy_many(self):
+        for count, message in [(1, "Copied 1 entry."), (0, "Copied 0 entries.")]:
+            self.assertEqual(
+                message, cli._format_response({"count": count}, "copy-many")
+            )
+
+    def test_stats(self):
+        self.assertEqual(
+            cli._format_stats(
+                {
+                    "pockets": {"open": 1, "max_open": None},
+                    "commands": {
+                        "add": {
+                            "count": 2,
+                            "total": 0.003,
+                            "p50": 0.001,
+                            "p95": 0.002,
+                            "max": 0.002,
+                        }
+                    },
+                }
+            ),
+            "Pockets:\n  open: 1\n  max open: -\nCommands:\n  add: count 2, "
+            "total 3.00 ms, p50 1.00 ms, p95 2.00 ms, max 2.00 ms",
+        )
+
+    def test_pocket_stats(self):
+        stats = {
+            "rows": {"standard": 2, "recurrent": 0},
+            "storage": {"file_size": 8192, "object_sizes": {"standard": 4096}},
+            "category_cache": {"names": None},
+        }
+        self.assertEqual(
+            cli._format_response({"pocket_stats": stats}, "pocket-stats"),
+            "Rows:\n  standard: 2\n  recurrent: 0\nStorage:\n  file size: 8192\n"
+            "  object sizes: standard 4096\nCategory cache:\n  names: -",
+        )
+        self.assertEqual(
+            jloads(
+                cli._format_response({"pocket_stats": stats}, "pocket-stats", json=True)
+            ),
+            stats,
+        )
+
+    def test_list_pockets(self):
+        elements = {
+            DEFAULT_TABLE: {
+                1: {
+                    "name": "rent",
+                    "value": -500,
+                    "date": "2024-01-01",
+                    "category": "home",
+                }
+            },
+            RECURRENT_TABLE: {},
+        }
+        response = cli._format_response(
+            {"pocket_elements": {"2024": elements, "2025": elements}}, "list"
+        )
+        self.assertIsInstance(response, Group)
+        self.assertEqual(len(response.renderables), 4)
+
     def test_list(self):
         self.assertEqual(
             "No entries found.",
@@ -646,6 +822,196 @@ class PluginCliOptionsTestCase(unittest.TestCase):
         self.assertEqual(exit_code, cli.SUCCESS)
 
 
+@mock.patch("financeager.DATA_DIR", TEST_DATA_DIR)
+class ReplicatePocketTestCase(CliTestCase):
+    CONFIG_FILE_CONTENT = ""  # service 'local' is the default anyway
+
+    def setUp(self):
+        super().setUp()
+        self.source = f"replicate{self.pocket}"
+        pocket = TinyDbPocket(name=self.source, data_dir=TEST_DATA_DIR)
+        for name in ["a", "b", "c"]:
+            pocket.add_entry(name=name, value=1, date="2024-01-01")
+        pocket.remove_entry(eid=1)
+        pocket.add_entry(
+            table_name=RECURRENT_TABLE, name="d", value=2, frequency="weekly"
+        )
+        pocket.close()
+
+    def test_replicate(self):
+        destination = f"{self.source}-copy"
+        response = self.cli_run(
+            "replicate-pocket {} {} --to sqlite --batch-size 1 --preserve-eids",
+            format_args=(self.source, destination),
+        )
+        self.assertEqual(
+            response,
+            f"Replicated pocket '{self.source}' (tinydb) to '{destination}' "
+            "(sqlite): 3 entries (2 standard, 1 recurrent)",
+        )
+        self.assertIn(
+            mock.call(f"Replicating pocket '{self.source}': 2 entries processed"),
+            self.info.call_args_list,
+        )
+
+        pocket = SqlitePocket(name=destination, data_dir=TEST_DATA_DIR)
+        self.assertEqual(pocket.get_entry(eid=2)["name"], "b")
+        pocket.close()
+
+    def test_replicate_to_existing_pocket(self):
+        response = self.cli_run(
+            "replicate-pocket {} {}",
+            format_args=(self.source, self.source),
+            log_method="error",
+        )
+        self.assertEqual(response, f"Pocket '{self.source}' (tinydb) already exists")
+
+    def test_replicate_nonexisting_pocket(self):
+        response = self.cli_run(
+            "replicate-pocket foo bar --from sqlite", log_method="error"
+        )
+        self.assertEqual(response, "Pocket 'foo' (sqlite) not found")
+
+    def test_replicate_failure(self):
+        destination = f"{self.source}-sharded"
+        response = self.cli_run(
+            "replicate-pocket {} {} --to sharded-tinydb --preserve-eids",
+            format_args=(self.source, destination),
+            log_method="error",
+        )
+        self.assertEqual(
+            response,
+            f"Error replicating pocket '{self.source}': "
+            "Element ID 2 does not match shard '2024'",
+        )
+        self.assertFalse(
+            os.path.exists(os.path.join(TEST_DATA_DIR, f"{destination}.shards"))
+        )
+
+
+@mock.patch("financeager.DATA_DIR", TEST_DATA_DIR)
+class ReplicateToMonthlyShardsTestCase(CliTestCase):
+    CONFIG_FILE_CONTENT = (
+        "[SERVICE]\ndatabase_type = sharded-tinydb\nshard_by = month\n"
+    )
+
+    def test_replicate(self):
+        source = f"replicate{self.pocket}"
+        pocket = TinyDbPocket(name=source, data_dir=TEST_DATA_DIR)
+        pocket.add_entry(name="a", value=1, date="2024-01-01")
+        pocket.add_entry(name="b", value=1, date="2024-02-01")
+        pocket.close()
+
+        destination = f"{source}-sharded"
+        self.cli_run(
+            "replicate-pocket {} {} --from tinydb", format_args=(source, destination)
+        )
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(TEST_DATA_DIR, f"{destination}.shards"))),
+            ["recurrent.json", "standard-2024-01.json", "standard-2024-02.json"],
+        )
+        pocket = ShardedTinyDbPocket(
+            name=destination, data_dir=TEST_DATA_DIR, shard_by="month"
+        )
+        self.assertEqual(pocket.get_entry(eid=20240200001)["name"], "b")
+        pocket.close()
+
+
+class DeferredImportsTestCase(unittest.TestCase):
+    # Modules that only specific commands or services require. Importing them at
+    # module load of the cli took about twice as long
+    DEFERRED_MODULES = [
+        "argcomplete",
+        "asyncio",
+        "dateutil",
+        "marshmallow",
+        "rich",
+        "tinydb",
+        "financeager.daemon",
+        "financeager.httpservice",
+        "financeager.listing",
+        "financeager.pocket.base",
+        "financeager.pocket.migrate",
+    ]
+
+    @staticmethod
+    def _imported_modules(code, env=None):
+        """Run the given code in a fresh interpreter.
+
+        :return: names of the modules imported at exit
+        """
+        process = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import atexit, json, sys\n"
+                "atexit.register(lambda: print(json.dumps(list(sys.modules))))\n"
+                f"{code}",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        )
+        return jloads(process.stdout.splitlines()[-1])
+
+    def test_import_cli(self):
+        modules = self._imported_modules("import financeager.cli")
+        for name in self.DEFERRED_MODULES:
+            self.assertNotIn(name, modules)
+
+    def test_run_local_service(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            env = dict(os.environ)
+            for name in ["XDG_CONFIG_HOME", "XDG_DATA_HOME", "XDG_CACHE_HOME"]:
+                env[name] = tmp_dir
+            modules = self._imported_modules(
+                "sys.argv = ['fina', 'pockets']\n"
+                "import financeager.cli\n"
+                "financeager.cli.main()",
+                env=env,
+            )
+        for name in ["asyncio", "financeager.daemon", "financeager.httpservice"]:
+            self.assertNotIn(name, modules)
+
+    @mock.patch("financeager.cli.entry_points")
+    def test_load_service_plugins(self, mocked_entry_points):
+        with tempfile.NamedTemporaryFile("w") as config_file:
+            for service_name in ["local", "http", "daemon"]:
+                config_file.seek(0)
+                config_file.truncate()
+                config_file.write(f"[SERVICE]\nname = {service_name}\n")
+                config_file.flush()
+                self.assertEqual(
+                    cli._load_service_plugins(["list", "-C", config_file.name]), []
+                )
+            mocked_entry_points.assert_not_called()
+
+            config_file.seek(0)
+            config_file.truncate()
+            config_file.write("[SERVICE]\nname = bird\n")
+            config_file.flush()
+            entry_point = mock.MagicMock()
+            mocked_entry_points.return_value.select.return_value = [entry_point]
+            plugins = cli._load_service_plugins(
+                ["list", "--config-filepath", config_file.name]
+            )
+
+        mocked_entry_points.return_value.select.assert_called_once_with(
+            group="financeager.services", name="bird"
+        )
+        self.assertEqual(plugins, [entry_point.load.return_value.return_value])
+
+    @mock.patch("argcomplete.autocomplete")
+    def test_autocomplete_deferred(self, mocked_autocomplete):
+        cli._parse_command(["pockets"])
+        mocked_autocomplete.assert_not_called()
+
+        with mock.patch.dict(os.environ, {"_ARGCOMPLETE": "1"}):
+            cli._parse_command(["pockets"])
+        mocked_autocomplete.assert_called_once()
+
+
 class AppDirectoryTestCase(unittest.TestCase):
     def test_dirs(self):
         self.assertTrue(financeager.CONFIG_DIR.endswith(".config/financeager"))
@@ -770,13 +1136,167 @@ class MigratePocketsTestCase(CliTestCase):
 
         response = self.cli_run("migrate-pockets pocket1 pocket2")
 
-        self.assertIn("Migrated pocket 'pocket", response)
-        self.assertEqual(self.info.call_count, 2)
+        self.assertEqual(response, "Migrated 2 of 2 pockets (2 entries)")
+        self.assertEqual(self.info.call_count, 3)
 
         # Verify both SQLite databases were created
         self._verify_sqlite_pocket("pocket1", 1, 0)
         self._verify_sqlite_pocket("pocket2", 0, 1)
 
+    def test_migrate_pockets_in_parallel(self):
+        for name in ["parallel1", "parallel2", "parallel3"]:
+            self._create_tinydb_pocket(
+                name,
+                [{"name": name, "date": "2024-01-01", "category": None, "value": 1}],
+            )
+
+        response = self.cli_run("migrate-pockets parallel1 parallel2 parallel3 -j 2")
+
+        self.assertEqual(response, "Migrated 3 of 3 pockets (3 entries)")
+        for name in ["parallel1", "parallel2", "parallel3"]:
+            self._verify_sqlite_pocket(name, 1, 0)
+
+    def test_migrate_pockets_stop_on_error(self):
+        self._create_tinydb_pocket("stop2", [], [])
+
+        self.cli_run("migrate-pockets stop1 stop2", log_method="error")
+
+        messages = [c[0][0] for c in self.error.call_args_list]
+        self.assertIn("not found", messages[0])
+        self.assertEqual(messages[1], "Failed to migrate 1 pocket(s): stop1")
+        self.assertIn("Skipped 1 pocket(s) after failure: stop2", messages[2])
+        self.assertFalse(os.path.exists(os.path.join(TEST_DATA_DIR, "stop2.sqlite")))
+
+    def test_migrate_pockets_continue_on_error(self):
+        self._create_tinydb_pocket("continue2", [], [])
+
+        for jobs in [1, 2]:
+            self.cli_run(
+                "migrate-pockets continue1 continue2 continue3 --continue-on-error "
+                "--jobs {}",
+                format_args=jobs,
+                log_method="error",
+            )
+
+            messages = [c[0][0] for c in self.error.call_args_list]
+            self.assertEqual(len(messages), 3)
+            self.assertEqual(
+                messages[-1], "Failed to migrate 2 pocket(s): continue1, continue3"
+            )
+            self.assertIn(
+                mock.call("Migrated 1 of 3 pockets (0 entries)"),
+                self.info.call_args_list,
+            )
+            os.remove(os.path.join(TEST_DATA_DIR, "continue2.sqlite"))
+
+    def test_invalid_jobs(self):
+        with self.assertRaises(SystemExit):
+            cli._parse_command(["migrate-pockets", "foo", "--jobs", "0"])
+
+    def test_migrate_and_verify(self):
+        standard_ids, _ = self._create_tinydb_pocket(
+            "verify",
+            [
+                {"name": "a", "date": "2024-01-01", "category": None, "value": 1},
+                {"name": "b", "date": "2024-01-02", "category": "c", "value": -2.5},
+                {"name": "c", "date": "2024-01-03", "category": None, "value": 3},
+            ],
+            [
+                {
+                    "name": "rent",
+                    "start": "2024-01-01",
+                    "end": None,
+                    "frequency": "monthly",
+                    "category": None,
+                    "value": -500,
+                }
+            ],
+        )
+
+        response = self.cli_run("migrate-pockets verify --verify")
+        self.assertIn("4 entries", response)
+        self.assertIn("verified", response)
+
+        result = verify_migration("verify", TEST_DATA_DIR)
+        self.assertTrue(result["verified"])
+        self.assertEqual(result["mismatches"], [])
+        for stats in result["tables"].values():
+            self.assertEqual(stats["source_count"], stats["target_count"])
+            self.assertEqual(stats["source_digest"], stats["target_digest"])
+
+        conn = sqlite3.connect(os.path.join(TEST_DATA_DIR, "verify.sqlite"))
+        conn.execute(f"UPDATE {DEFAULT_TABLE} SET value = 2 WHERE eid = 1")
+        conn.execute(f"DELETE FROM {DEFAULT_TABLE} WHERE eid = 2")
+        conn.execute(
+            f"INSERT INTO {DEFAULT_TABLE} (eid, name, date, value) "
+            "VALUES (9, 'x', '2024-02-01', 0)"
+        )
+        conn.commit()
+        conn.close()
+
+        result = verify_migration("verify", TEST_DATA_DIR)
+        self.assertFalse(result["verified"])
+        self.assertEqual(
+            result["mismatches"],
+            [
+                "standard entry 1: expected ('a', '2024-01-01', None, 1.0), "
+                "got ('a', '2024-01-01', None, 2.0)",
+                "standard entry 2: missing in SQLite pocket",
+                "standard entry 9: not present in TinyDB pocket",
+            ],
+        )
+        standard_stats = result["tables"][DEFAULT_TABLE]
+        self.assertEqual(standard_stats["source_count"], 3)
+        self.assertEqual(standard_stats["target_count"], 3)
+        self.assertNotEqual(
+            standard_stats["source_digest"], standard_stats["target_digest"]
+        )
+
+        result = verify_migration("verify", TEST_DATA_DIR, max_mismatches=1)
+        self.assertEqual(len(result["mismatches"]), 1)
+
+        # Differing digests fail the verification even if no mismatches are reported
+        result = verify_migration("verify", TEST_DATA_DIR, max_mismatches=0)
+        self.assertEqual(result["mismatches"], [])
+        self.assertFalse(result["verified"])
+
+    def test_verify_unordered_entries(self):
+        from tinydb import TinyDB
+        from tinydb.table import Document
+
+        # Entries inserted with given IDs are not stored in order of their ID
+        db = TinyDB(os.path.join(TEST_DATA_DIR, "unordered.json"))
+        for eid in [3, 1, 2]:
+            entry = {"name": "a", "date": "2024-01-01", "category": None, "value": 1}
+            db.table(DEFAULT_TABLE).insert(Document(entry, doc_id=eid))
+        db.close()
+        migrate_pocket("unordered", TEST_DATA_DIR)
+
+        result = verify_migration("unordered", TEST_DATA_DIR)
+        self.assertTrue(result["verified"])
+        self.assertEqual(result["tables"][DEFAULT_TABLE]["source_count"], 3)
+
+        conn = sqlite3.connect(os.path.join(TEST_DATA_DIR, "unordered.sqlite"))
+        conn.execute(f"DELETE FROM {DEFAULT_TABLE} WHERE eid = 3")
+        conn.commit()
+        conn.close()
+        result = verify_migration("unordered", TEST_DATA_DIR)
+        self.assertEqual(
+            result["mismatches"], ["standard entry 3: missing in SQLite pocket"]
+        )
+
+    @mock.patch("financeager.pocket.migrate.verify_migration")
+    def test_migrate_verification_failure(self, mocked_verify):
+        self._create_tinydb_pocket("verify_failure", [], [])
+        mocked_verify.return_value = {"verified": False, "mismatches": ["foo", "bar"]}
+
+        response = self.cli_run(
+            "migrate-pockets verify_failure --verify", log_method="error"
+        )
+        self.assertEqual(
+            response, "Verification of pocket 'verify_failure' failed: foo; bar"
+        )
+
     def test_migrate_nonexistent_pocket(self):
         """Test migrating a pocket that doesn't exist."""
         response = self.cli_run("migrate-pockets nonexistent", log_method="error")
@@ -792,12 +1312,30 @@ class MigratePocketsTestCase(CliTestCase):
         response = self.cli_run("migrate-pockets invalid", log_method="error")
         self.assertIn("invalid", response.lower())
 
-    @mock.patch("tinydb.TinyDB.table")
-    def test_general_exception(self, mocked_table):
+    @mock.patch("financeager.pocket.migrate.replicate")
+    def test_general_exception(self, mocked_replicate):
         self._create_tinydb_pocket("empty2", [], [])
-        mocked_table.side_effect = RuntimeError("database error")
+        mocked_replicate.side_effect = RuntimeError("database error")
         response = self.cli_run("migrate-pockets empty2", log_method="error")
         self.assertIn("database error", response)
+        # Incomplete SQLite file is removed
+        self.assertFalse(os.path.exists(os.path.join(TEST_DATA_DIR, "empty2.sqlite")))
+
+    def test_migrate_in_batches(self):
+        entries = [
+            {"name": f"item{i}", "date": "2024-01-01", "category": None, "value": i}
+            for i in range(5)
+        ]
+        self._create_tinydb_pocket("batches", entries, [])
+        progress = mock.MagicMock()
+
+        result = migrate_pocket(
+            "batches", TEST_DATA_DIR, batch_size=2, progress=progress
+        )
+
+        self.assertEqual(result["total_count"], 5)
+        self.assertEqual(progress.call_args_list, [mock.call(2), mock.call(4)])
+        self._verify_sqlite_pocket("batches", 5, 0)
 
     def test_migrate_preserves_eid(self):
         """Test that document IDs from TinyDB are preserved as eid in SQLite."""
@@ -1,6 +1,8 @@
+import tempfile
 import unittest
+from unittest import mock
 
-from financeager import cli, clients, config, plugin
+from financeager import cli, clients, config, exceptions, plugin
 
 from . import test_config
 
@@ -38,6 +40,33 @@ class CreateClientsTestCase(unittest.TestCase):
             cli._parse_command(["list"], plugins=[some_plugin])["command"], "list"
         )
 
+    def test_create_builtin_service(self):
+        with tempfile.NamedTemporaryFile("w") as config_file:
+            config_file.write("[SERVICE]\nname = http\n")
+            config_file.flush()
+            app_config = config.Configuration(filepath=config_file.name)
+
+        client = clients.create(configuration=app_config, sinks=None, plugins=None)
+        self.assertEqual(type(client).__name__, "HttpClient")
+        client.shutdown()
+
+
+class RunManyTestCase(unittest.TestCase):
+    @mock.patch("financeager.CACHE_DIR", None)
+    def test_run_many(self):
+        sinks = clients.Client.Sinks(mock.MagicMock(), mock.MagicMock())
+        client = TestClient(configuration=None, sinks=sinks)
+        client.proxy = mock.MagicMock()
+        error = exceptions.InvalidRequest("Entry not found")
+        client.proxy.run.side_effect = [{"id": 1}, error]
+
+        results = client.run_many([("add", {"name": "a", "value": 1}), ("get", {})])
+
+        self.assertEqual(results, [True, False])
+        sinks.info.assert_called_once_with({"id": 1})
+        sinks.error.assert_called_once_with(error)
+        self.assertIs(client.latest_exception, error)
+
 
 if __name__ == "__main__":
     unittest.main()
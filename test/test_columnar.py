@@ -0,0 +1,132 @@
+import json
+import unittest
+from unittest import mock
+
+from financeager import DEFAULT_TABLE, RECURRENT_TABLE, columnar
+from financeager.entries import CategoryEntry
+from financeager.listing import _derive_listings, prettify
+from financeager.pocket import SqlitePocket
+
+
+class ColumnarTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pocket = SqlitePocket()
+        self.addCleanup(self.pocket.close)
+        for i in range(10):
+            self.pocket.add_entry(name="food", value=-i - 1.5, category="groceries")
+        self.pocket.add_entry(name="salary", value=2000, date="2000-01-01")
+        self.pocket.add_entry(
+            name="rent",
+            value=-500,
+            table_name=RECURRENT_TABLE,
+            frequency="monthly",
+            start="2007-10-01",
+            end="2008-11-30",
+        )
+        self.elements = self.pocket.get_entries()
+
+    def test_encode(self):
+        columns = columnar.encode(self.elements)
+
+        self.assertTrue(columnar.is_columnar(columns))
+        self.assertFalse(columnar.is_columnar(self.elements))
+        self.assertEqual(columns["names"][:2], ["food", "salary"])
+        self.assertEqual(columns["categories"], ["groceries", None])
+        self.assertEqual(columns[DEFAULT_TABLE]["eid"], list(range(1, 12)))
+        self.assertEqual(columns[DEFAULT_TABLE]["value"][:2], [-1.5, -2.5])
+        self.assertEqual(columns[DEFAULT_TABLE]["name"], [0] * 10 + [1])
+        self.assertEqual(columns[DEFAULT_TABLE]["category"], [0] * 10 + [1])
+        self.assertEqual(columns[RECURRENT_TABLE]["eid"], [1] * 14)
+        # Occurrences in the same month of different years have the same name
+        self.assertEqual(len(columns["names"]), 2 + 12)
+
+    def test_decode(self):
+        columns = columnar.encode(self.elements)
+        elements = columnar.decode(json.loads(json.dumps(columns)))
+
+        self.assertEqual(
+            elements[DEFAULT_TABLE],
+            {eid: dict(e) for eid, e in self.elements[DEFAULT_TABLE].items()},
+        )
+        self.assertEqual(elements[RECURRENT_TABLE], self.elements[RECURRENT_TABLE])
+
+    def test_derive_listings(self):
+        columns = columnar.encode(self.elements)
+        listings = _derive_listings(
+            columns, default_category=CategoryEntry.DEFAULT_NAME
+        )
+        expected_listings = _derive_listings(
+            self.elements, default_category=CategoryEntry.DEFAULT_NAME
+        )
+        for listing, expected_listing in zip(listings, expected_listings):
+            self.assertEqual(listing.total_value(), expected_listing.total_value())
+            self.assertEqual(
+                list(listing.category_entry_names),
+                list(expected_listing.category_entry_names),
+            )
+
+        self.assertEqual(
+            json.loads(prettify(columns, json=True)),
+            json.loads(prettify(self.elements, json=True)),
+        )
+
+    def test_pack(self):
+        with self.pocket.transaction():
+            for i in range(1000):
+                self.pocket.add_entry(
+                    name=f"item {i % 20}",
+                    value=-(i % 97) / 10,
+                    category=f"category {i % 5}",
+                    date=f"2024-{i % 12 + 1:02}-{i % 28 + 1:02}",
+                )
+        elements = self.pocket.get_entries()
+        columns = columnar.encode(elements)
+
+        for media_type in columnar.media_types():
+            with self.subTest(media_type=media_type):
+                data = columnar.pack(columns, media_type)
+                self.assertEqual(columnar.unpack(data, media_type), columns)
+                # Considerably smaller than the JSON of the elements
+                self.assertLess(3 * len(data), len(json.dumps(elements, default=dict)))
+
+    def test_pack_struct(self):
+        obj = {
+            "error": None,
+            "flags": [True, False],
+            1: [1.5, -2.0],
+            "ints": [1, -(2**31), 2**40],
+            "indices": [0, 2**16 - 1],
+            "int32s": [-1, 2**16],
+            "strs": ["a", "äöü", ""],
+            "mixed": [1, "a", None, {"nested": []}],
+            "tuple": (1, 2),
+        }
+        data = columnar.pack(obj, columnar.STRUCT_MEDIA_TYPE)
+        expected = {**obj, "tuple": [1, 2]}
+        self.assertEqual(columnar.unpack(data, columnar.STRUCT_MEDIA_TYPE), expected)
+
+        with self.assertRaises(TypeError):
+            columnar.pack({"obj": object()})
+        self.assertEqual(
+            columnar.unpack(columnar.pack(ValueError("x"), default=str)), "x"
+        )
+
+    def test_unpack_malformed(self):
+        data = columnar.pack({"strs": ["abc", "def"]})
+        for malformed in [b"", b"x", data[:-1], data + b"N", b"s\xff\xff\xff\xff"]:
+            with self.subTest(malformed=malformed):
+                with self.assertRaises(ValueError):
+                    columnar.unpack(malformed)
+
+        with self.assertRaises(ValueError):
+            columnar.unpack(data, "application/unknown")
+
+    @mock.patch.object(columnar, "msgpack", None)
+    def test_msgpack_unavailable(self):
+        self.assertEqual(columnar.media_types(), [columnar.STRUCT_MEDIA_TYPE])
+        with self.assertRaises(ValueError):
+            columnar.pack({}, columnar.MSGPACK_MEDIA_TYPE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -16,7 +16,13 @@ class ConfigTestCase(unittest.TestCase):
         self.assertEqual(config.get_option("SERVICE", "name"), "local")
         self.assertDictEqual(
             config.get_section("SERVICE"),
-            {"name": "local", "database_type": "tinydb"},
+            {
+                "name": "local",
+                "database_type": "tinydb",
+                "max_open_pockets": 0,
+                "memory_map": False,
+                "shard_by": "year",
+            },
         )
 
     def test_invalid_config(self):
@@ -25,12 +31,32 @@ class ConfigTestCase(unittest.TestCase):
         for content in (
             "[SERVICE]\nname = sillyservice\n",
             "[SERVICE]\ndatabase_type = footype\n",
+            "[SERVICE]\nmax_open_pockets = many\n",
+            "[SERVICE]\nmax_open_pockets = -1\n",
+            "[SERVICE]\nmemory_map = maybe\n",
+            "[SERVICE]\ndatabase_type = sqlite\nmemory_map = true\n",
+            "[SERVICE]\ndatabase_type = sharded-tinydb\nshard_by = week\n",
+            "[SERVICE]\nshard_by = month\n",
             "[FRONTEND]\ndefault_category = ",
         ):
             with open(filepath, "w") as file:
                 file.write(content)
             self.assertRaises(InvalidConfigError, Configuration, filepath=filepath)
 
+    def test_builtin_service(self):
+        filepath = f"/tmp/{int(time.time())}"
+        with open(filepath, "w") as file:
+            file.write("[SERVICE]\nname = http\n[HTTP]\nport = 1234\n")
+        config = Configuration(filepath=filepath)
+        self.assertEqual(config.get_option("HTTP", "port"), 1234)
+
+        with open(filepath, "a") as file:
+            file.write("timeout = 0\n")
+        self.assertRaises(InvalidConfigError, Configuration, filepath=filepath)
+
+        # The configuration of unselected built-in services is not loaded
+        self.assertNotIn("HTTP", Configuration()._parser.sections())
+
     def test_nonexisting_config_filepath(self):
         filepath = f"/tmp/{time.time()}"
         with self.assertRaises(InvalidConfigError) as cm:
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import suppress
+from unittest import mock
+
+from financeager import DEFAULT_TABLE, clients, daemon, exceptions
+from financeager.config import Configuration, InvalidConfigError
+
+
+class DaemonTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.data_dir, "daemon.sock")
+        self.context = daemon.background_daemon(
+            socket_path=self.socket_path,
+            data_dir=self.data_dir,
+            database_type="sqlite",
+        )
+        self.daemon = self.context.__enter__()
+        self.proxy = daemon.DaemonProxy(socket_path=self.socket_path)
+
+    def tearDown(self):
+        self.proxy.close()
+        self.context.__exit__(None, None, None)
+        shutil.rmtree(self.data_dir)
+
+    def _raw_request(self, data):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket_path)
+            sock.sendall(data)
+            return json.loads(sock.makefile("rb").readline())
+
+    def test_run(self):
+        self.assertEqual(self.proxy.run("add", name="rent", value=-500), {"id": 1})
+        sock = self.proxy._socket
+
+        element = self.proxy.run("get", eid=1)["element"]
+        self.assertEqual(element["name"], "rent")
+        elements = self.proxy.run("list", filters={"name": "rent"})["elements"]
+        self.assertEqual(list(elements[DEFAULT_TABLE]), ["1"])
+        self.assertEqual(self.proxy.run("pockets"), {"pockets": ["main"]})
+
+        # The connection is kept open
+        self.assertIs(self.proxy._socket, sock)
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+
+    def test_invalid_request(self):
+        with self.assertRaises(exceptions.InvalidRequest) as context:
+            self.proxy.run("get", eid=1)
+        self.assertIn("Entry not found", str(context.exception))
+
+        # The connection can still be used
+        self.assertEqual(self.proxy.run("add", name="rent", value=-500), {"id": 1})
+
+    @mock.patch("financeager.asyncserver.AsyncServer.run", side_effect=RuntimeError)
+    def test_unexpected_error(self, _):
+        with self.assertRaises(exceptions.CommunicationError) as context:
+            self.proxy.run("pockets")
+        self.assertIn("Unexpected error", str(context.exception))
+
+    def test_malformed_requests(self):
+        for data in [b"{\n", b"[]\n", b'{"kwargs": {}}\n', b'{"command": 1}\n']:
+            with self.subTest(data=data):
+                self.assertIn("Malformed request", self._raw_request(data)["invalid"])
+
+    def test_request_too_large(self):
+        self.socket_path = os.path.join(self.data_dir, "small.sock")
+        with (
+            mock.patch.object(daemon, "MAX_REQUEST_SIZE", 32),
+            daemon.background_daemon(
+                socket_path=self.socket_path, data_dir=self.data_dir
+            ),
+        ):
+            reply = self._raw_request(b'{"command": "list", "kwargs": {}}' * 2)
+        self.assertEqual(reply, {"invalid": "Request too large"})
+
+    def test_async_proxy(self):
+        async def _run():
+            proxy = daemon.AsyncDaemonProxy(socket_path=self.socket_path)
+            try:
+                return await asyncio.gather(
+                    *[proxy.run("add", name=f"{i}", value=-i) for i in range(20)],
+                    proxy.run("get", eid=100),
+                    return_exceptions=True,
+                )
+            finally:
+                await proxy.close()
+
+        responses = asyncio.run(_run())
+        self.assertEqual(sorted(r["id"] for r in responses[:-1]), list(range(1, 21)))
+        self.assertIsInstance(responses[-1], exceptions.InvalidRequest)
+
+    def test_daemon_running(self):
+        other = daemon.Daemon(socket_path=self.socket_path, data_dir=self.data_dir)
+        with self.assertRaises(daemon.DaemonRunning):
+            asyncio.run(other.start())
+        asyncio.run(other.close())
+
+        # The socket of the running daemon is untouched
+        self.assertEqual(self.proxy.run("pockets"), {"pockets": []})
+
+    def test_settings(self):
+        settings = daemon.service_settings(
+            data_dir=self.data_dir, database_type="sqlite"
+        )
+        self.assertEqual(self.proxy.run(daemon.SETTINGS_COMMAND), settings)
+        daemon._connect(self.socket_path, 1, settings=settings).close()
+
+        proxy = daemon.DaemonProxy(
+            socket_path=self.socket_path, settings={**settings, "memory_map": True}
+        )
+        with self.assertRaisesRegex(exceptions.CommunicationError, "settings"):
+            proxy.run("pockets")
+        # The daemon is left running
+        self.assertEqual(self.proxy.run("pockets"), {"pockets": []})
+
+    def test_daemon_unavailable(self):
+        self.proxy.close()
+        self.context.__exit__(None, None, None)
+        self.context = mock.MagicMock()
+        self.assertFalse(os.path.exists(self.socket_path))
+
+        with self.assertRaises(exceptions.CommunicationError):
+            self.proxy.run("pockets")
+
+
+class DaemonIdleTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_idle_timeout(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        d = daemon.Daemon(
+            socket_path=os.path.join(data_dir, "daemon.sock"),
+            idle_timeout=0.05,
+            data_dir=data_dir,
+        )
+        await d.start()
+
+        # Not stopped while a connection is open
+        reader, writer = await asyncio.open_unix_connection(d.socket_path)
+        await asyncio.sleep(0.1)
+        self.assertFalse(d._stopped.is_set())
+        writer.close()
+        await writer.wait_closed()
+
+        await asyncio.wait_for(d.serve_forever(), timeout=1)
+        await d.close()
+        self.assertFalse(os.path.exists(d.socket_path))
+
+
+class DaemonClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.socket_path = os.path.join(self.data_dir, "daemon.sock")
+        self.service_plugin = daemon.main()
+        cache_dir_patcher = mock.patch("financeager.CACHE_DIR", self.data_dir)
+        cache_dir_patcher.start()
+        self.addCleanup(cache_dir_patcher.stop)
+
+    def _create_client(self, autostart, service_options="database_type = sqlite\n"):
+        with tempfile.NamedTemporaryFile("w") as config_file:
+            config_file.write(
+                f"[SERVICE]\nname = daemon\n{service_options}"
+                f"[DAEMON]\nsocket_path = {self.socket_path}\nautostart = {autostart}"
+            )
+            config_file.flush()
+            configuration = Configuration(
+                filepath=config_file.name, plugins=[self.service_plugin]
+            )
+
+        sinks = clients.Client.Sinks(mock.MagicMock(), mock.MagicMock())
+        client = clients.create(
+            configuration=configuration, sinks=sinks, plugins=[self.service_plugin]
+        )
+        self.assertIsInstance(client, daemon.DaemonClient)
+        return client, sinks
+
+    def test_client(self):
+        with daemon.background_daemon(
+            socket_path=self.socket_path, data_dir=self.data_dir
+        ):
+            client, sinks = self._create_client(autostart="false")
+            self.assertIsNone(client.proxy._start_command)
+
+            self.assertTrue(
+                client.safely_run("add", name="rent", value=-500, category="Home")
+            )
+            sinks.info.assert_called_once_with({"id": 1})
+            self.assertFalse(client.safely_run("remove", eid=2))
+            self.assertIsInstance(client.latest_exception, exceptions.InvalidRequest)
+            with open(clients.categories_cache_filepath()) as f:
+                self.assertEqual(f.read(), "home")
+
+            sinks.info.reset_mock()
+            results = client.run_many(
+                [
+                    ("get", {"eid": 1}),
+                    ("remove", {"eid": 2}),
+                    ("add", {"name": "food", "value": -5, "category": "Groceries"}),
+                    ("pockets", {}),
+                ]
+            )
+            self.assertEqual(results, [True, False, True, True])
+            self.assertEqual(sinks.info.call_args, mock.call({"pockets": ["main"]}))
+            self.assertIsNone(client.latest_exception)
+            with open(clients.categories_cache_filepath()) as f:
+                self.assertEqual(f.read(), "groceries\nhome")
+            client.shutdown()
+
+        self.assertFalse(client.safely_run("pockets"))
+        self.assertIsInstance(client.latest_exception, exceptions.CommunicationError)
+
+    def test_start_command(self):
+        client, _ = self._create_client(autostart="true")
+        command = client.proxy._start_command
+        self.assertNotIn("--memory-map", command)
+        self.assertEqual(command[command.index("--shard-by") + 1], "year")
+
+        client, _ = self._create_client(
+            autostart="true", service_options="memory_map = true\n"
+        )
+        command = client.proxy._start_command
+        self.assertEqual(command[command.index("--database-type") + 1], "tinydb")
+        self.assertIn("--memory-map", command)
+
+        client, _ = self._create_client(
+            autostart="true",
+            service_options="database_type = sharded-tinydb\nshard_by = month\n",
+        )
+        command = client.proxy._start_command
+        self.assertEqual(command[command.index("--shard-by") + 1], "month")
+        self.assertEqual(client.proxy._settings["shard_by"], "month")
+
+    @unittest.skipIf(sys.platform == "win32", "UNIX domain sockets required")
+    def test_autostart(self):
+        with mock.patch("financeager.DATA_DIR", self.data_dir):
+            client, sinks = self._create_client(autostart="true")
+        self.assertIn("sqlite", client.proxy._start_command)
+
+        self.assertTrue(client.safely_run("add", name="rent", value=-500, pocket="a"))
+        client.shutdown()
+        self.addCleanup(self._stop_daemon)
+        pid = self._daemon_pid()
+        self.assertNotEqual(pid, os.getpid())
+
+        # A second client connects to the running daemon
+        with mock.patch("financeager.DATA_DIR", self.data_dir):
+            client, sinks = self._create_client(autostart="true")
+        self.assertTrue(client.safely_run("pockets"))
+        sinks.info.assert_called_once_with({"pockets": ["a"]})
+        client.shutdown()
+        self.assertEqual(self._daemon_pid(), pid)
+
+        # A client with other service options restarts the daemon
+        with mock.patch("financeager.DATA_DIR", self.data_dir):
+            client, sinks = self._create_client(
+                autostart="true",
+                service_options="database_type = sqlite\nmax_open_pockets = 2\n",
+            )
+        self.assertTrue(client.safely_run("pockets"))
+        sinks.info.assert_called_once_with({"pockets": ["a"]})
+        self.assertEqual(
+            client.proxy.run(daemon.SETTINGS_COMMAND)["max_open_pockets"], 2
+        )
+        client.shutdown()
+        self.assertNotEqual(self._daemon_pid(), pid)
+
+    def _daemon_pid(self):
+        with open(f"{self.socket_path}.lock") as lock_file:
+            return int(lock_file.read())
+
+    def _stop_daemon(self):
+        with suppress(ProcessLookupError):
+            os.kill(self._daemon_pid(), signal.SIGTERM)
+        for _ in range(500):
+            if not os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+
+    def test_invalid_config(self):
+        for content in ["timeout = 0", "idle_timeout = -1", "autostart = maybe"]:
+            with (
+                self.subTest(content=content),
+                tempfile.NamedTemporaryFile("w") as config_file,
+            ):
+                config_file.write(f"[DAEMON]\n{content}")
+                config_file.flush()
+                with self.assertRaises(InvalidConfigError):
+                    Configuration(filepath=config_file.name, plugins=[daemon.main()])
+
+
+if __name__ == "__main__":
+    unittest.main()
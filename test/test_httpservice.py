@@ -0,0 +1,305 @@
+import asyncio
+import json
+import shutil
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+from financeager import DEFAULT_TABLE, clients, columnar, exceptions, httpservice
+from financeager.config import Configuration, InvalidConfigError
+
+
+def _raw_request(command, kwargs=None, connection="keep-alive"):
+    body = json.dumps(kwargs or {}).encode()
+    return (
+        f"POST /{command} HTTP/1.1\r\n"
+        "Host: localhost\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {connection}\r\n"
+        "\r\n"
+    ).encode() + body
+
+
+def _read_raw_response(stream):
+    status = int(stream.readline().split()[1])
+    headers = {}
+    while (line := stream.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        headers[name.lower()] = value.strip()
+    body = stream.read(int(headers["content-length"]))
+    return status, headers, json.loads(body)
+
+
+class HttpServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.context = httpservice.background_service(
+            port=0, data_dir=self.data_dir, database_type="sqlite"
+        )
+        self.service = self.context.__enter__()
+        self.proxy = httpservice.HttpProxy(port=self.service.port)
+
+    def tearDown(self):
+        self.proxy.close()
+        self.context.__exit__(None, None, None)
+        shutil.rmtree(self.data_dir)
+
+    def test_run(self):
+        self.assertEqual(self.proxy.run("add", name="rent", value=-500), {"id": 1})
+        sock = self.proxy._connection.sock
+
+        element = self.proxy.run("get", eid=1)["element"]
+        self.assertEqual(element["name"], "rent")
+        elements = self.proxy.run("list", filters={"name": "rent"})["elements"]
+        self.assertEqual(list(elements[DEFAULT_TABLE]), ["1"])
+        self.assertEqual(self.proxy.run("pockets"), {"pockets": ["main"]})
+
+        # The connection is kept alive
+        self.assertIs(self.proxy._connection.sock, sock)
+
+    def test_invalid_request(self):
+        with self.assertRaises(exceptions.InvalidRequest) as context:
+            self.proxy.run("get", eid=1)
+        self.assertIn("Entry not found", str(context.exception))
+
+        # The connection can still be used
+        self.assertEqual(self.proxy.run("add", name="rent", value=-500), {"id": 1})
+
+    @mock.patch("financeager.asyncserver.AsyncServer.run", side_effect=RuntimeError)
+    def test_unexpected_error(self, _):
+        with self.assertRaises(exceptions.CommunicationError) as context:
+            self.proxy.run("pockets")
+        self.assertIn("Unexpected error", str(context.exception))
+
+    def test_reconnect(self):
+        self.proxy.run("add", name="rent", value=-500)
+        # Simulate the service closing the idle connection
+        self.proxy._connection.sock.shutdown(socket.SHUT_RDWR)
+        self.assertEqual(self.proxy.run("pockets"), {"pockets": ["main"]})
+
+    def test_service_unavailable(self):
+        self.proxy.close()
+        proxy = httpservice.HttpProxy(port=self.service.port, timeout=1)
+        self.context.__exit__(None, None, None)
+        self.context = mock.MagicMock()
+
+        with self.assertRaises(exceptions.CommunicationError):
+            proxy.run("pockets")
+
+    def test_pipelining(self):
+        requests = [
+            _raw_request("add", {"name": "rent", "value": -500}),
+            _raw_request("add", {"name": "food", "value": -5}),
+            _raw_request("get", {"eid": 3}),
+            _raw_request("list", connection="close"),
+        ]
+        with socket.create_connection(("127.0.0.1", self.service.port)) as sock:
+            sock.sendall(b"".join(requests))
+            stream = sock.makefile("rb")
+            responses = [_read_raw_response(stream) for _ in requests]
+            # Connection is closed by the service after the last request
+            self.assertEqual(stream.read(), b"")
+
+        self.assertEqual([r[0] for r in responses], [200, 200, 400, 200])
+        self.assertEqual(responses[0][2], {"id": 1})
+        self.assertEqual(responses[1][2], {"id": 2})
+        self.assertIn("error", responses[2][2])
+        self.assertEqual(len(responses[3][2]["elements"][DEFAULT_TABLE]), 2)
+        self.assertEqual(responses[3][1]["connection"], "close")
+
+    def test_async_proxy(self):
+        async def _run():
+            proxy = httpservice.AsyncHttpProxy(port=self.service.port)
+            try:
+                responses = await asyncio.gather(
+                    *[proxy.run("add", name=f"{i}", value=-i) for i in range(20)],
+                    proxy.run("get", eid=100),
+                    return_exceptions=True,
+                )
+                connection = proxy._connection
+                self.assertEqual(await proxy.run("pockets"), {"pockets": ["main"]})
+                # All requests were sent via the same connection
+                self.assertIs(proxy._connection, connection)
+            finally:
+                await proxy.close()
+            return responses
+
+        responses = asyncio.run(_run())
+        self.assertEqual(sorted(r["id"] for r in responses[:-1]), list(range(1, 21)))
+        self.assertIsInstance(responses[-1], exceptions.InvalidRequest)
+        self.assertIn("Entry not found", str(responses[-1]))
+
+    def test_async_proxy_cancelled_request(self):
+        self.proxy.run("add", name="rent", value=-500)
+
+        async def _run():
+            proxy = httpservice.AsyncHttpProxy(port=self.service.port)
+            read_response = proxy._read_response
+            reading = asyncio.Event()
+
+            async def stalled_read_response(reader):
+                # Reading the first response stalls until the request is cancelled
+                if not reading.is_set():
+                    reading.set()
+                    await asyncio.Event().wait()
+                return await read_response(reader)
+
+            try:
+                with mock.patch.object(
+                    proxy, "_read_response", side_effect=stalled_read_response
+                ):
+                    get = asyncio.create_task(proxy.run("get", eid=1))
+                    pockets = asyncio.create_task(proxy.run("pockets"))
+                    await reading.wait()
+                    get.cancel()
+                    with self.assertRaises(asyncio.CancelledError):
+                        await get
+                    try:
+                        response = await pockets
+                    except exceptions.CommunicationError:
+                        pass
+                    else:
+                        # Must not be the response to the cancelled request
+                        self.assertEqual(response, {"pockets": ["main"]})
+
+                return await proxy.run("pockets")
+            finally:
+                await proxy.close()
+
+        self.assertEqual(asyncio.run(_run()), {"pockets": ["main"]})
+
+    def test_compact_responses(self):
+        self.proxy.run("add", name="rent", value=-500)
+        for media_type in columnar.media_types():
+            with (
+                self.subTest(media_type=media_type),
+                mock.patch.object(columnar, "media_types", return_value=[media_type]),
+            ):
+                proxy = httpservice.HttpProxy(port=self.service.port, compact=True)
+                elements = proxy.run("list")["elements"]
+                self.assertTrue(columnar.is_columnar(elements))
+                self.assertEqual(elements["names"], ["rent"])
+                self.assertEqual(proxy.run("pockets"), {"pockets": ["main"]})
+                with self.assertRaises(exceptions.InvalidRequest):
+                    proxy.run("get", eid=2)
+                proxy.close()
+
+        async def _run():
+            proxy = httpservice.AsyncHttpProxy(port=self.service.port, compact=True)
+            try:
+                return await proxy.run("list", pockets=["main"])
+            finally:
+                await proxy.close()
+
+        response = asyncio.run(_run())
+        self.assertTrue(columnar.is_columnar(response["pocket_elements"]["main"]))
+
+    def test_negotiate_media_type(self):
+        struct_type = columnar.STRUCT_MEDIA_TYPE
+        for accept, media_type in [
+            ("", None),
+            ("application/json", None),
+            (f"application/json, {struct_type}", None),
+            (f"{struct_type}, application/json", struct_type),
+            (f"application/unknown, {struct_type.upper()};q=0.9", struct_type),
+        ]:
+            with self.subTest(accept=accept):
+                self.assertEqual(httpservice._negotiate_media_type(accept), media_type)
+
+    def test_async_proxy_service_unavailable(self):
+        proxy = httpservice.AsyncHttpProxy(port=self.service.port, timeout=1)
+        self.context.__exit__(None, None, None)
+        self.context = mock.MagicMock()
+
+        with self.assertRaises(exceptions.CommunicationError):
+            asyncio.run(proxy.run("pockets"))
+
+    def test_bad_requests(self):
+        for raw_request, status in [
+            (b"GET /pockets HTTP/1.1\r\n\r\n", 405),
+            (b"POST / HTTP/1.1\r\n\r\n", 404),
+            (b"POST /list HTTP/1.1\r\nContent-Length: 1\r\n\r\n{", 400),
+            (b"POST /list HTTP/1.1\r\nContent-Length: 2\r\n\r\n[]", 400),
+            (b"POST /list HTTP/1.1\r\nContent-Length: x\r\n\r\n", 400),
+            (b"POST /list HTTP/2\r\n\r\n", 505),
+            (b"nonsense\r\n\r\n", 400),
+        ]:
+            with (
+                self.subTest(raw_request=raw_request),
+                socket.create_connection(("127.0.0.1", self.service.port)) as sock,
+            ):
+                sock.sendall(raw_request)
+                response = _read_raw_response(sock.makefile("rb"))
+                self.assertEqual(response[0], status)
+                self.assertIn("error", response[2])
+
+
+class HttpClientTestCase(unittest.TestCase):
+    def test_client(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        service_plugin = httpservice.main()
+        cache_dir_patcher = mock.patch("financeager.CACHE_DIR", data_dir)
+        cache_dir_patcher.start()
+        self.addCleanup(cache_dir_patcher.stop)
+
+        with httpservice.background_service(port=0, data_dir=data_dir) as service:
+            with tempfile.NamedTemporaryFile("w") as config_file:
+                config_file.write(
+                    f"[SERVICE]\nname = http\n[HTTP]\nport = {service.port}"
+                )
+                config_file.flush()
+                configuration = Configuration(
+                    filepath=config_file.name, plugins=[service_plugin]
+                )
+
+            sinks = clients.Client.Sinks(mock.MagicMock(), mock.MagicMock())
+            client = clients.create(
+                configuration=configuration, sinks=sinks, plugins=[service_plugin]
+            )
+            self.assertIsInstance(client, httpservice.HttpClient)
+
+            self.assertTrue(client.safely_run("add", name="rent", value=-500))
+            sinks.info.assert_called_once_with({"id": 1})
+            self.assertFalse(client.safely_run("remove", eid=2))
+            self.assertIsInstance(client.latest_exception, exceptions.InvalidRequest)
+
+            sinks.info.reset_mock()
+            results = client.run_many(
+                [
+                    ("add", {"name": "food", "value": -5, "category": "Groceries"}),
+                    ("get", {"eid": 5}),
+                ]
+                + [("get", {"eid": 2})] * 3
+            )
+            self.assertEqual(results, [True, False, True, True, True])
+            self.assertEqual(sinks.info.call_args_list[0], mock.call({"id": 2}))
+            self.assertEqual(sinks.info.call_count, 4)
+            self.assertIsNone(client.latest_exception)
+            with open(clients.categories_cache_filepath()) as f:
+                self.assertEqual(f.read(), "groceries")
+            client.shutdown()
+
+    def test_invalid_config(self):
+        for content in [
+            "port = 0",
+            "port = 65536",
+            "timeout = 0",
+            "port = http",
+            "compact_responses = maybe",
+        ]:
+            with (
+                self.subTest(content=content),
+                tempfile.NamedTemporaryFile("w") as config_file,
+            ):
+                config_file.write(f"[HTTP]\n{content}")
+                config_file.flush()
+                with self.assertRaises(InvalidConfigError):
+                    Configuration(
+                        filepath=config_file.name, plugins=[httpservice.main()]
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
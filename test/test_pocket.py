@@ -1,13 +1,18 @@
 import calendar
 import datetime as dt
+import itertools
 import json
 import os.path
 import shutil
+import sqlite3
 import tempfile
+import threading
 import unittest
 from collections import Counter
+from unittest import mock
 
 from marshmallow import ValidationError
+from tinydb import storages
 
 from financeager import (
     DEFAULT_POCKET_NAME,
@@ -15,14 +20,20 @@ from financeager import (
     POCKET_DATE_FORMAT,
     RECURRENT_TABLE,
     exceptions,
+    server,
 )
-from financeager.pocket import SqlitePocket, TinyDbPocket
+from financeager.pocket import ShardedTinyDbPocket, SqlitePocket, TinyDbPocket
 from financeager.pocket.base import (
     _DEFAULT_CATEGORY,
     EntryBaseSchema,
     RecurrentEntrySchema,
     StandardEntrySchema,
 )
+from financeager.pocket.mmapjson import MemoryMappedTables
+from financeager.pocket.replicate import replicate
+from financeager.pocket.sharded import SHARD_ID_FACTOR, ShardedTinyDbInterface
+from financeager.pocket.tinydb import MemoryMappedTinyDbInterface, TinyDbInterface
+from financeager.pocket.utils import DatabaseInterface, DocumentView
 
 
 class Entry:
@@ -49,6 +60,46 @@ class CreateEmptyPocketTestCase(unittest.TestCase):
         self.assertEqual(pocket._category_cache["climbing"], Counter(["sport"]))
         pocket.close()
 
+    def test_category_cache_created_on_first_use(self):
+        for pocket_class in [TinyDbPocket, SqlitePocket, ShardedTinyDbPocket]:
+            pocket = pocket_class()
+            with self.subTest(pocket_class=pocket_class):
+                eid = pocket.add_entry(
+                    name="rent", value=-500, category="housing", date="2020-01-01"
+                )
+                pocket.add_entry(name="food", value=-5, category="groceries")
+                pocket.get_entry(eid)
+                pocket.get_entries(filters={"name": "rent"})
+                pocket.get_categories()
+                pocket.update_entry(eid, value=-600)
+                pocket.remove_entry(eid)
+                self.assertRaises(
+                    exceptions.PocketEntryNotFound,
+                    pocket.update_entry,
+                    eid,
+                    name="foo",
+                )
+                self.assertIsNone(pocket._category_counts)
+
+                # Adding without category requires the cache
+                eid = pocket.add_entry(name="food", value=-5)
+                self.assertEqual(pocket.get_entry(eid)["category"], "groceries")
+                self.assertEqual(
+                    pocket._category_counts["food"], Counter({"groceries": 2})
+                )
+            pocket.close()
+
+    def test_category_cache_discarded_after_failed_transaction(self):
+        pocket = SqlitePocket()
+        pocket.add_entry(name="rent", value=-500, category="housing")
+        with self.assertRaises(exceptions.PocketEntryNotFound):
+            with pocket.transaction():
+                pocket.add_entry(name="rent", value=-500)
+                pocket.remove_entry(eid=3)
+        self.assertIsNone(pocket._category_counts)
+        self.assertEqual(pocket._category_cache["rent"], Counter({"housing": 1}))
+        pocket.close()
+
 
 class TinyDbPocketStandardEntryTestCase(unittest.TestCase):
     def setUp(self):
@@ -481,6 +532,201 @@ class TinyDbPocketRecurrentEntryTestCase(unittest.TestCase):
         self.pocket.close()
 
 
+class TinyDbInterfaceTransactionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="financeager-")
+        self.filepath = os.path.join(self.data_dir, "1901.json")
+        self.interface = TinyDbInterface(self.filepath)
+        self.interface.create(DEFAULT_TABLE, {"name": "a", "date": "2020-01-01"})
+
+    def _stored_names(self):
+        with open(self.filepath) as f:
+            return [e["name"] for e in json.load(f)[DEFAULT_TABLE].values()]
+
+    def test_writes_deferred_until_commit(self):
+        with self.interface.transaction():
+            self.interface.create(DEFAULT_TABLE, {"name": "b", "date": "2020-01-02"})
+            self.interface.update_by_id(DEFAULT_TABLE, 1, {"name": "c"})
+            self.assertEqual(self._stored_names(), ["a"])
+            elements = self.interface.retrieve(DEFAULT_TABLE, {"name": "b"})
+            self.assertEqual([e["eid"] for e in elements], [2])
+
+        self.assertEqual(self._stored_names(), ["c", "b"])
+        elements = self.interface.retrieve(DEFAULT_TABLE, {"name": "c"})
+        self.assertEqual([e["eid"] for e in elements], [1])
+
+    def test_writes_discarded_on_rollback(self):
+        for filepath in [self.filepath, None]:
+            interface = (
+                self.interface
+                if filepath
+                else TinyDbInterface(storage=storages.MemoryStorage)
+            )
+            with self.subTest(filepath=filepath):
+                interface.retrieve(DEFAULT_TABLE, {"name": "a"})
+                with self.assertRaises(RuntimeError):
+                    with interface.transaction():
+                        interface.create(DEFAULT_TABLE, {"name": "b"})
+                        interface.delete_by_id(DEFAULT_TABLE, 1)
+                        raise RuntimeError
+
+                self.assertEqual(interface.retrieve(DEFAULT_TABLE, {"name": "b"}), [])
+                self.assertEqual(
+                    interface.create(DEFAULT_TABLE, {"name": "d"}),
+                    2 if filepath else 1,
+                )
+        self.assertEqual(self._stored_names(), ["a", "d"])
+
+    def tearDown(self):
+        self.interface.close()
+        shutil.rmtree(self.data_dir)
+
+
+class TinyDbInterfaceIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.interface = TinyDbInterface(storage=storages.MemoryStorage)
+        for name, category, date in [
+            ("rent", "living", "2020-01-01"),
+            ("food", "groceries", "2020-01-15"),
+            ("rent", "living", "2020-02-01"),
+            ("gift", None, "2021-12-24"),
+        ]:
+            self.interface.create(
+                DEFAULT_TABLE,
+                {"name": name, "category": category, "date": date, "value": -1.0},
+            )
+
+    def _retrieve_names(self, **filters):
+        return [e["name"] for e in self.interface.retrieve(DEFAULT_TABLE, filters)]
+
+    def test_lookup_via_indexes(self):
+        self.assertEqual(self._retrieve_names(name="rent"), ["rent", "rent"])
+        self.assertEqual(self._retrieve_names(category=None), ["gift"])
+        self.assertEqual(self._retrieve_names(category="groc"), ["food"])
+        self.assertEqual(self._retrieve_names(date="2020-01-"), ["rent", "food"])
+        self.assertEqual(self._retrieve_names(date="12"), ["gift"])
+        self.assertEqual(self._retrieve_names(name="rent", date="-02-"), ["rent"])
+        self.assertEqual(
+            self._retrieve_names(name="rent", value="-1"), ["rent", "rent"]
+        )
+        self.assertEqual(self._retrieve_names(name="nothing"), [])
+
+    def test_indexes_updated_on_modification(self):
+        self.assertEqual(self._retrieve_names(date="2021"), ["gift"])
+
+        eid = self.interface.create(
+            DEFAULT_TABLE,
+            {"name": "tax", "category": None, "date": "2021-03-01", "value": -2.0},
+        )
+        self.assertEqual(self._retrieve_names(date="2021"), ["gift", "tax"])
+
+        self.interface.update_by_id(DEFAULT_TABLE, eid, {"date": "2019-03-01"})
+        self.assertEqual(self._retrieve_names(date="2021"), ["gift"])
+        self.assertEqual(self._retrieve_names(date="2019-03"), ["tax"])
+
+        self.interface.delete_by_id(DEFAULT_TABLE, eid)
+        self.assertEqual(self._retrieve_names(date="2019"), [])
+        self.assertEqual(self._retrieve_names(category=None), ["gift"])
+
+    def test_lookup_keeps_order(self):
+        for i in range(4):
+            self.interface.create(
+                DEFAULT_TABLE,
+                {"name": "rent" if i == 3 else "other", "date": "2022-01-01"},
+            )
+        eids = [
+            e["eid"] for e in self.interface.retrieve(DEFAULT_TABLE, {"name": "rent"})
+        ]
+        self.assertEqual(eids, [1, 3, 8])
+
+    def test_indexes_rebuilt_after_external_modification(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        filepath = os.path.join(data_dir, "pocket.json")
+        interface = TinyDbInterface(filepath)
+        self.addCleanup(interface.close)
+        interface.create(DEFAULT_TABLE, {"name": "rent", "date": "2020-01-01"})
+        self.assertEqual(len(interface.retrieve(DEFAULT_TABLE, {"name": "rent"})), 1)
+
+        # Modifications by this interface keep the indexes
+        interface.create(DEFAULT_TABLE, {"name": "food", "date": "2020-01-02"})
+        index = interface._indexes[DEFAULT_TABLE]
+        self.assertEqual(len(interface.retrieve(DEFAULT_TABLE, {"name": "food"})), 1)
+        self.assertIs(interface._indexes[DEFAULT_TABLE], index)
+
+        # Another process writes the file
+        other = TinyDbInterface(filepath)
+        other.create(DEFAULT_TABLE, {"name": "rent", "date": "2020-02-01"})
+        other.close()
+
+        self.assertEqual(len(interface.retrieve(DEFAULT_TABLE, {"name": "rent"})), 2)
+        self.assertIsNot(interface._indexes[DEFAULT_TABLE], index)
+
+    def test_create_after_external_modification(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        filepath = os.path.join(data_dir, "pocket.json")
+        interface = TinyDbInterface(filepath)
+        self.addCleanup(interface.close)
+        interface.create(DEFAULT_TABLE, {"name": "rent", "date": "2020-01-01"})
+        self.assertEqual(len(interface.retrieve(DEFAULT_TABLE, {"name": "rent"})), 1)
+
+        # Another process adds an entry to the file
+        other = TinyDbInterface(filepath)
+        self.assertEqual(
+            other.create(DEFAULT_TABLE, {"name": "food", "date": "2020-01-02"}), 2
+        )
+        other.close()
+
+        self.assertEqual(
+            interface.create(DEFAULT_TABLE, {"name": "rent", "date": "2020-02-01"}), 3
+        )
+        self.assertEqual(len(interface.retrieve(DEFAULT_TABLE, {"name": "rent"})), 2)
+        self.assertEqual(len(interface.retrieve(DEFAULT_TABLE)), 3)
+
+    def test_query_condition(self):
+        condition = TinyDbInterface.create_query_condition(name="re.t", value="-1")
+        self.assertIs(
+            condition,
+            TinyDbInterface.create_query_condition(value="-1", name="re.t"),
+        )
+        self.assertTrue(condition({"name": "rent", "value": -1.0}))
+        self.assertFalse(condition({"name": "rent", "value": -2.0}))
+        self.assertFalse(condition({"name": None, "value": -1.0}))
+        self.assertFalse(condition({"value": -1.0}))
+
+        condition = TinyDbInterface.create_query_condition(category=None, date="01-")
+        self.assertTrue(condition({"category": None, "date": "2020-01-01"}))
+        self.assertFalse(condition({"category": "food", "date": "2020-01-01"}))
+
+    def tearDown(self):
+        self.interface.close()
+
+
+class DocumentViewTestCase(unittest.TestCase):
+    def test_copy_on_write(self):
+        document = {"name": "rent", "category": "living"}
+        view = DocumentView(document, 3)
+        self.assertEqual(view, {"name": "rent", "category": "living", "eid": 3})
+        self.assertEqual(len(view), 3)
+        self.assertIn("eid", view)
+
+        copied_view = view.copy()
+        self.assertEqual(copied_view.pop("category"), "living")
+        self.assertEqual(copied_view, {"name": "rent", "eid": 3})
+        view["name"] = "lease"
+        self.assertEqual(view, {"name": "lease", "category": "living", "eid": 3})
+
+        # The underlying document is not modified
+        self.assertEqual(document, {"name": "rent", "category": "living"})
+
+    def test_without_eid(self):
+        view = DocumentView({"name": "rent"})
+        self.assertNotIn("eid", view)
+        self.assertEqual(dict(view), {"name": "rent"})
+        self.assertEqual(json.dumps(view, default=dict), '{"name": "rent"}')
+
+
 class ValidationTestCase(unittest.TestCase):
     def test_valid_base_entry(self):
         data = EntryBaseSchema().load({"name": "entry", "value": "5"})
@@ -653,6 +899,260 @@ class JsonTinyDbPocketTestCase(unittest.TestCase):
         os.remove(cls.data_filepath)
 
 
+class MemoryMappedTinyDbPocketStandardEntryTestCase(TinyDbPocketStandardEntryTestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="financeager-")
+        self.pocket = TinyDbPocket(name=1901, data_dir=self.data_dir, memory_map=True)
+        self.eid = self.pocket.add_entry(
+            name="Bicycle", value=-999.99, date="2020-01-01"
+        )
+
+    def test_memory_mapped_interface(self):
+        self.assertIsInstance(self.pocket.db_interface, MemoryMappedTinyDbInterface)
+
+    def test_reopen_pocket(self):
+        self.pocket.add_entry(name="Xmas gifts", value=500, date="2002-12-23")
+        self.pocket.add_entry(
+            table_name=RECURRENT_TABLE,
+            name="rent",
+            value=-500,
+            frequency="monthly",
+            start="2020-01-01",
+        )
+        self.pocket.close()
+
+        self.pocket = TinyDbPocket(name=1901, data_dir=self.data_dir, memory_map=True)
+        self.assertEqual(self.pocket.get_entry(eid=2)["name"], "xmas gifts")
+        self.assertEqual(
+            self.pocket.get_entry(eid=1, table_name=RECURRENT_TABLE)["name"], "rent"
+        )
+        self.assertIsNone(self.pocket.db_interface.retrieve_by_id(DEFAULT_TABLE, 3))
+        entries = self.pocket.get_entries(filters={"date": "2002"})
+        self.assertEqual(list(entries[DEFAULT_TABLE]), [2])
+
+    def test_read_within_transaction(self):
+        with self.pocket.transaction():
+            eid = self.pocket.add_entry(name="food", value=-10)
+            self.assertEqual(self.pocket.get_entry(eid=eid)["name"], "food")
+            self.assertEqual(len(self.pocket.db_interface.retrieve(DEFAULT_TABLE)), 2)
+
+    def tearDown(self):
+        self.pocket.close()
+        shutil.rmtree(self.data_dir)
+
+
+class MemoryMappedTablesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="financeager-")
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        self.filepath = os.path.join(self.data_dir, "pocket.json")
+
+    def _tables(self, data, indent=None):
+        with open(self.filepath, "w") as file:
+            if data is not None:
+                json.dump(data, file, indent=indent)
+        tables = MemoryMappedTables(self.filepath, [DEFAULT_TABLE, RECURRENT_TABLE])
+        self.addCleanup(tables.close)
+        return tables
+
+    def test_lookup(self):
+        data = {
+            RECURRENT_TABLE: {"1": {"name": '"1": {', "value": 1.0}},
+            DEFAULT_TABLE: {
+                "1": {"name": '\\"2": {"recurrent": {', "value": 2.0},
+                "2": {"name": "\u00e4" * 3000, "value": None},
+                "10": {},
+            },
+        }
+        for indent in [None, 2]:
+            tables = self._tables(data, indent=indent)
+            with self.subTest(indent=indent):
+                for table_name, documents in data.items():
+                    self.assertEqual(tables.table(table_name), documents)
+                    for doc_id, document in documents.items():
+                        self.assertEqual(
+                            tables.document(table_name, int(doc_id)), document
+                        )
+                self.assertIsNone(tables.document(RECURRENT_TABLE, 2))
+                self.assertIsNone(tables.document(DEFAULT_TABLE, 0))
+
+    def test_documents(self):
+        data = {
+            DEFAULT_TABLE: {
+                str(i): {"name": f"\u00e4 {i} }}, ", "value": i} for i in range(1, 50)
+            },
+            RECURRENT_TABLE: {},
+        }
+        for indent, read_size in itertools.product([None, 2], [1, 7, 2**20]):
+            tables = self._tables(data, indent=indent)
+            with (
+                self.subTest(indent=indent, read_size=read_size),
+                mock.patch("financeager.pocket.mmapjson._READ_SIZE", read_size),
+            ):
+                for table_name, documents in data.items():
+                    self.assertEqual(
+                        list(tables.documents(table_name)), list(documents.items())
+                    )
+
+    def test_malformed_file(self):
+        for content in [
+            "{invalid json content",
+            '{"standard": {"1": {}}',
+            '{"standard": {"1": {}, "2"}}',
+            '{"standard": {"1": {}} "recurrent": {}}',
+            '{"other": {}, "standard": {}}',
+            '{"standard": {}}, {}',
+        ]:
+            with open(self.filepath, "w") as file:
+                file.write(content)
+            with self.subTest(content=content), self.assertRaises(ValueError):
+                tables = MemoryMappedTables(
+                    self.filepath, [DEFAULT_TABLE, RECURRENT_TABLE]
+                )
+                self.addCleanup(tables.close)
+                list(tables.documents(DEFAULT_TABLE))
+                tables.table(DEFAULT_TABLE)
+
+    def test_empty_file(self):
+        tables = self._tables(None)
+        self.assertEqual(tables.table(DEFAULT_TABLE), {})
+        self.assertIsNone(tables.document(DEFAULT_TABLE, 1))
+
+
+class ShardedTinyDbPocketTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="financeager-")
+        self.pocket = ShardedTinyDbPocket(name=1901, data_dir=self.data_dir)
+        self.shard_dir = os.path.join(self.data_dir, "1901.shards")
+
+    def test_routing_by_date(self):
+        eid = self.pocket.add_entry(name="Bicycle", value=-999.99, date="2020-01-01")
+        self.assertEqual(eid, 202000001)
+        eid2 = self.pocket.add_entry(name="Gift", value=-9.99, date="2021-12-24")
+        self.assertEqual(eid2, 202100001)
+        self.assertEqual(
+            sorted(os.listdir(self.shard_dir)),
+            ["recurrent.json", "standard-2020.json", "standard-2021.json"],
+        )
+
+        self.assertEqual(self.pocket.get_entry(eid)["name"], "bicycle")
+        self.assertRaises(exceptions.PocketEntryNotFound, self.pocket.get_entry, 1)
+        self.assertRaises(
+            exceptions.PocketEntryNotFound, self.pocket.get_entry, 201900001
+        )
+
+        entries = self.pocket.get_entries()[DEFAULT_TABLE]
+        self.assertEqual(list(entries), [eid, eid2])
+        entries = self.pocket.get_entries(filters={"name": "gift"})[DEFAULT_TABLE]
+        self.assertEqual(list(entries), [eid2])
+
+        self.assertEqual(self.pocket.remove_entry(eid=eid), eid)
+        self.assertEqual(self.pocket.get_entries()[DEFAULT_TABLE].keys(), {eid2})
+
+    def test_update_moves_entry_between_shards(self):
+        eid = self.pocket.add_entry(name="Bicycle", value=-999.99, date="2020-01-01")
+        self.assertEqual(self.pocket.update_entry(eid=eid, value=-500), eid)
+
+        new_eid = self.pocket.update_entry(eid=eid, date="2022-03-01")
+        self.assertEqual(new_eid, 202200001)
+        self.assertRaises(exceptions.PocketEntryNotFound, self.pocket.get_entry, eid)
+        self.assertEqual(
+            self.pocket.get_entry(new_eid),
+            {"name": "bicycle", "value": -500, "date": "2022-03-01", "category": None},
+        )
+
+    def test_failed_move_between_shards(self):
+        eid = self.pocket.add_entry(name="Bicycle", value=-999.99, date="2020-01-01")
+        shard = self.pocket.db_interface._shard_of_element(eid)
+
+        with (
+            mock.patch.object(shard, "delete_by_id", side_effect=OSError),
+            self.assertRaises(OSError),
+        ):
+            self.pocket.update_entry(eid=eid, date="2022-03-01")
+
+        self.assertEqual(self.pocket.get_entry(eid)["date"], "2020-01-01")
+        self.assertEqual(list(self.pocket.get_entries()[DEFAULT_TABLE]), [eid])
+        self.assertNotIn("standard-2022.json", os.listdir(self.shard_dir))
+
+    def test_date_filter_queries_overlapping_shards_only(self):
+        self.pocket.add_entry(name="Bicycle", value=-999.99, date="2020-01-01")
+        self.pocket.add_entry(name="Gift", value=-9.99, date="2021-12-24")
+        self.pocket.close()
+
+        interface = ShardedTinyDbInterface(self.shard_dir)
+        interface.retrieve(DEFAULT_TABLE, {"date": "2021-12-"})
+        self.assertEqual(list(interface._shards), ["2021"])
+        interface.close()
+
+        self.pocket = ShardedTinyDbPocket(name=1901, data_dir=self.data_dir)
+
+        entries = self.pocket.get_entries(filters={"date": "12-24"})[DEFAULT_TABLE]
+        self.assertEqual([e["name"] for e in entries.values()], ["gift"])
+
+    def test_shard_by_month(self):
+        self.pocket.close()
+        self.pocket = ShardedTinyDbPocket(
+            name=1902, data_dir=self.data_dir, shard_by="month"
+        )
+        eid = self.pocket.add_entry(name="Bicycle", value=-999.99, date="2020-01-01")
+        self.assertEqual(eid, 20200100001)
+        self.assertEqual(self.pocket.get_entry(eid)["date"], "2020-01-01")
+        self.pocket.close()
+
+        with self.assertRaises(exceptions.PocketException):
+            ShardedTinyDbPocket(name=1902, data_dir=self.data_dir)
+        with self.assertRaises(exceptions.PocketException):
+            ShardedTinyDbPocket(name=1902, shard_by="week")
+
+    def test_full_shard(self):
+        interface = self.pocket.db_interface
+        last_eid = 2020 * SHARD_ID_FACTOR + SHARD_ID_FACTOR - 1
+        row = {"name": "a", "value": 1, "date": "2020-01-01", "category": None}
+        self.assertEqual(
+            interface.create_many(
+                DEFAULT_TABLE, [{**row, "eid": last_eid}], preserve_eids=True
+            ),
+            [last_eid],
+        )
+        with self.assertRaises(exceptions.PocketException):
+            interface.create_many(
+                DEFAULT_TABLE, [{**row, "eid": last_eid + 1}], preserve_eids=True
+            )
+
+        with self.assertRaises(exceptions.PocketException) as context:
+            self.pocket.add_entry(name="b", value=2, date="2020-02-01")
+        self.assertIn("Shard '2020' is full", str(context.exception))
+        with self.assertRaises(exceptions.PocketException):
+            interface.create_many(DEFAULT_TABLE, [row, row])
+
+        eid = self.pocket.add_entry(name="c", value=3, date="2021-01-01")
+        with self.assertRaises(exceptions.PocketException):
+            self.pocket.update_entry(eid=eid, date="2020-03-01")
+
+        entries = self.pocket.get_entries()[DEFAULT_TABLE]
+        self.assertEqual(list(entries), [last_eid, eid])
+        self.assertEqual(len(interface.retrieve(DEFAULT_TABLE)), 2)
+
+    def test_pocket_names(self):
+        self.assertEqual(
+            server.pocket_names(self.data_dir, database_type="sharded-tinydb"),
+            {"1901"},
+        )
+        self.assertEqual(
+            server.pocket_names(self.data_dir, database_type="tinydb"), set()
+        )
+
+    def tearDown(self):
+        self.pocket.close()
+        shutil.rmtree(self.data_dir)
+
+
+class ShardedTinyDbPocketRecurrentEntryTestCase(TinyDbPocketRecurrentEntryTestCase):
+    def setUp(self):
+        self.pocket = ShardedTinyDbPocket(name=1901)
+
+
 class CreateEmptySqlitePocketTestCase(unittest.TestCase):
     def test_sqlite_file(self):
         data_dir = tempfile.mkdtemp(prefix="financeager-")
@@ -666,6 +1166,32 @@ class CreateEmptySqlitePocketTestCase(unittest.TestCase):
         os.remove(db_path)
         shutil.rmtree(data_dir)
 
+    def test_connection_shared_between_threads(self):
+        pocket = SqlitePocket(name=1901)
+        thread = threading.Thread(target=pocket.get_entries)
+        with mock.patch("threading.excepthook") as mocked_excepthook:
+            thread.start()
+            thread.join()
+        self.assertIs(
+            mocked_excepthook.call_args[0][0].exc_type, sqlite3.ProgrammingError
+        )
+        pocket.close()
+
+        pocket = SqlitePocket(name=1901, check_same_thread=False)
+        with pocket.transaction():
+            pocket.add_entry(name="a", value=1)
+            thread = threading.Thread(
+                target=pocket.add_entry, kwargs={"name": "b", "value": 2}
+            )
+            thread.start()
+            # The other thread waits for the end of the transaction
+            thread.join(timeout=0.1)
+            self.assertTrue(thread.is_alive())
+            self.assertEqual(len(pocket.get_entries()[DEFAULT_TABLE]), 1)
+        thread.join()
+        self.assertEqual(len(pocket.get_entries()[DEFAULT_TABLE]), 2)
+        pocket.close()
+
     def test_validate_table_name_raises_value_error(self):
         pocket = SqlitePocket(name=1901)
         with self.assertRaises(ValueError) as context:
@@ -703,5 +1229,400 @@ class SqlitePocketRecurrentEntryTestCase(TinyDbPocketRecurrentEntryTestCase):
         self.pocket = SqlitePocket(name=1901)
 
 
+class ReplicateTestCase(unittest.TestCase):
+    POCKET_CLASSES = [TinyDbPocket, SqlitePocket, ShardedTinyDbPocket]
+
+    def _create_source(self, pocket_class):
+        pocket = pocket_class(name="source")
+        for i in range(5):
+            pocket.add_entry(name=f"entry{i}", value=i, date=f"202{i % 2}-01-0{i + 1}")
+        pocket.remove_entry(
+            eid=next(pocket.db_interface.iter_rows(DEFAULT_TABLE))["eid"]
+        )
+        pocket.add_entry(
+            table_name=RECURRENT_TABLE,
+            name="rent",
+            value=-500,
+            category="housing",
+            frequency="monthly",
+            start="2020-01-01",
+        )
+        return pocket
+
+    @staticmethod
+    def _rows(interface, table_name, keep_eids):
+        rows = [dict(r) for r in interface.iter_rows(table_name)]
+        if not keep_eids:
+            for row in rows:
+                del row["eid"]
+        return sorted(rows, key=lambda r: (r["name"], r.get("eid", 0)))
+
+    def test_replicate(self):
+        for source_class in self.POCKET_CLASSES:
+            for target_class in self.POCKET_CLASSES:
+                source = self._create_source(source_class)
+                target = target_class(name="target")
+                with self.subTest(source=source_class, target=target_class):
+                    counts = replicate(
+                        source.db_interface, target.db_interface, batch_size=2
+                    )
+                    self.assertEqual(counts, {DEFAULT_TABLE: 4, RECURRENT_TABLE: 1})
+                    for table_name in [DEFAULT_TABLE, RECURRENT_TABLE]:
+                        self.assertEqual(
+                            self._rows(source.db_interface, table_name, False),
+                            self._rows(target.db_interface, table_name, False),
+                        )
+                source.close()
+                target.close()
+
+    def test_replicate_preserving_eids(self):
+        for source_class in self.POCKET_CLASSES:
+            for target_class in [TinyDbPocket, SqlitePocket]:
+                source = self._create_source(source_class)
+                target = target_class(name="target")
+                with self.subTest(source=source_class, target=target_class):
+                    replicate(
+                        source.db_interface, target.db_interface, preserve_eids=True
+                    )
+                    for table_name in [DEFAULT_TABLE, RECURRENT_TABLE]:
+                        self.assertEqual(
+                            self._rows(source.db_interface, table_name, True),
+                            self._rows(target.db_interface, table_name, True),
+                        )
+                    # IDs of new entries don't collide with preserved IDs
+                    eid = target.add_entry(name="new", value=1, date="2021-02-01")
+                    self.assertNotIn(
+                        eid,
+                        [
+                            r["eid"]
+                            for r in source.db_interface.iter_rows(DEFAULT_TABLE)
+                        ],
+                    )
+                source.close()
+                target.close()
+
+    def test_replicate_to_tinydb_file_writes_once(self):
+        source = self._create_source(TinyDbPocket)
+        data_dir = tempfile.mkdtemp(prefix="financeager-")
+        target = TinyDbPocket(name="target", data_dir=data_dir)
+        with mock.patch.object(
+            storages.JSONStorage,
+            "write",
+            autospec=True,
+            side_effect=storages.JSONStorage.write,
+        ) as mocked_write:
+            replicate(source.db_interface, target.db_interface, batch_size=1)
+        mocked_write.assert_called_once()
+        self.assertEqual(
+            self._rows(source.db_interface, DEFAULT_TABLE, False),
+            self._rows(target.db_interface, DEFAULT_TABLE, False),
+        )
+        source.close()
+        target.close()
+        shutil.rmtree(data_dir)
+
+    def test_replicate_preserving_eids_to_sharded_pocket(self):
+        source = self._create_source(ShardedTinyDbPocket)
+        target = ShardedTinyDbPocket(name="target")
+        replicate(source.db_interface, target.db_interface, preserve_eids=True)
+        self.assertEqual(
+            self._rows(source.db_interface, DEFAULT_TABLE, True),
+            self._rows(target.db_interface, DEFAULT_TABLE, True),
+        )
+
+        source = self._create_source(TinyDbPocket)
+        target = ShardedTinyDbPocket(name="target")
+        with self.assertRaises(exceptions.PocketException) as context:
+            replicate(source.db_interface, target.db_interface, preserve_eids=True)
+        self.assertEqual(
+            str(context.exception), "Element ID 2 does not match shard '2021'"
+        )
+
+    def test_sqlite_transaction_rollback(self):
+        source = self._create_source(TinyDbPocket)
+        target = SqlitePocket(name="target")
+        # The entry with ID 5 exists in source and target
+        target.db_interface.create_many(
+            DEFAULT_TABLE,
+            [{"eid": 5, "name": "x", "value": 0.0, "date": "2020-01-01"}],
+            preserve_eids=True,
+        )
+        with self.assertRaises(sqlite3.IntegrityError):
+            replicate(
+                source.db_interface,
+                target.db_interface,
+                batch_size=1,
+                preserve_eids=True,
+            )
+
+        self.assertEqual(len(list(target.db_interface.iter_rows(DEFAULT_TABLE))), 1)
+        self.assertEqual(len(list(target.db_interface.iter_rows(RECURRENT_TABLE))), 0)
+
+    def test_preserving_eids_not_supported(self):
+        class Interface(TinyDbInterface):
+            create_many = DatabaseInterface.create_many
+
+        interface = Interface(storage=storages.MemoryStorage)
+        self.assertEqual(
+            interface.create_many(DEFAULT_TABLE, [{"name": "a", "eid": 3}]), [1]
+        )
+        self.assertEqual(interface.retrieve_by_id(DEFAULT_TABLE, 1), {"name": "a"})
+        self.assertRaises(
+            exceptions.PocketException,
+            interface.create_many,
+            DEFAULT_TABLE,
+            [],
+            preserve_eids=True,
+        )
+
+
+class PocketStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+
+    def _fill(self, pocket):
+        for date in ["2020-01-01", "2021-01-01", "2021-02-01"]:
+            pocket.add_entry(name="food", value=-5, category="groceries", date=date)
+        pocket.add_entry(
+            table_name=RECURRENT_TABLE,
+            name="rent",
+            value=-500,
+            category="housing",
+            frequency="monthly",
+            start="2020-01-01",
+            end="2020-03-31",
+        )
+        pocket.get_entries(filters={"name": "food"})
+
+    def test_get_stats(self):
+        for pocket_class, kwargs in [
+            (TinyDbPocket, {}),
+            (TinyDbPocket, {"memory_map": True}),
+            (SqlitePocket, {}),
+            (ShardedTinyDbPocket, {}),
+        ]:
+            for data_dir in [None, self.data_dir]:
+                pocket = pocket_class(name="stats", data_dir=data_dir, **kwargs)
+                self._fill(pocket)
+                with self.subTest(pocket_class=pocket_class, data_dir=data_dir):
+                    stats = pocket.get_stats()
+                    self.assertEqual(
+                        stats["rows"], {DEFAULT_TABLE: 3, RECURRENT_TABLE: 1}
+                    )
+                    self.assertEqual(
+                        stats["recurrent"], {"templates": 1, "occurrences": 3}
+                    )
+                    self.assertEqual(stats["category_cache"], {"names": None})
+                    file_size = stats["storage"]["file_size"]
+                    if data_dir is None:
+                        self.assertIsNone(file_size)
+                    else:
+                        self.assertGreater(file_size, 0)
+                pocket.close()
+                shutil.rmtree(self.data_dir)
+                os.mkdir(self.data_dir)
+
+    def test_storage_stats(self):
+        pocket = SqlitePocket(name="stats", data_dir=self.data_dir)
+        self._fill(pocket)
+        storage = pocket.get_stats()["storage"]
+        self.assertEqual(
+            storage["file_size"], storage["page_size"] * storage["page_count"]
+        )
+        self.assertEqual(storage["freelist_count"], 0)
+        if "object_sizes" in storage:
+            self.assertGreater(storage["object_sizes"][DEFAULT_TABLE], 0)
+        pocket.close()
+
+        pocket = ShardedTinyDbPocket(name="stats")
+        self._fill(pocket)
+        storage = pocket.get_stats()["storage"]
+        self.assertEqual(storage["shards"], 2)
+        self.assertGreater(storage["indexed_values"], 0)
+
+    def test_default_stats(self):
+        class Interface(TinyDbInterface):
+            get_stats = DatabaseInterface.get_stats
+
+        interface = Interface(storage=storages.MemoryStorage)
+        interface.create(DEFAULT_TABLE, {"name": "a"})
+        self.assertEqual(
+            interface.get_stats(),
+            {"rows": {DEFAULT_TABLE: 1, RECURRENT_TABLE: 0}, "storage": {}},
+        )
+
+
+class CopyEntriesTestCase(unittest.TestCase):
+    POCKET_CLASSES = [TinyDbPocket, SqlitePocket, ShardedTinyDbPocket]
+
+    def _create_source(self, pocket_class, **kwargs):
+        pocket = pocket_class(name="source", **kwargs)
+        pocket.add_entry(name="Rent", value=-500, category="housing", date="2020-01-01")
+        pocket.add_entry(name="Fuel", value=-50, category="car", date="2020-01-03")
+        pocket.add_entry(name="Insurance", value=-20, category="car", date="2020-02-01")
+        pocket.add_entry(
+            table_name=RECURRENT_TABLE,
+            name="salary",
+            value=2000,
+            frequency="monthly",
+            start="2020-01-01",
+        )
+        return pocket
+
+    def test_copy_entries(self):
+        for source_class in self.POCKET_CLASSES:
+            for destination_class in self.POCKET_CLASSES:
+                source = self._create_source(source_class)
+                destination = destination_class(name="destination")
+                destination.add_entry(name="food", value=-5, date="2020-01-01")
+                with self.subTest(source=source_class, destination=destination_class):
+                    count = destination.copy_entries(
+                        source, filters={"category": "car"}
+                    )
+                    self.assertEqual(count, 2)
+                    elements = destination.get_entries()
+                    self.assertEqual(
+                        sorted(e["name"] for e in elements[DEFAULT_TABLE].values()),
+                        ["food", "fuel", "insurance"],
+                    )
+                    self.assertEqual(len(elements[RECURRENT_TABLE]), 0)
+
+                    # The category cache is updated
+                    eid = destination.add_entry(name="fuel", value=-60)
+                    self.assertEqual(destination.get_entry(eid)["category"], "car")
+                source.close()
+                destination.close()
+
+    def test_copy_recurrent_entries(self):
+        source = self._create_source(TinyDbPocket)
+        destination = SqlitePocket(name="destination")
+
+        count = destination.copy_entries(source, table_name=RECURRENT_TABLE)
+        self.assertEqual(count, 1)
+        element = destination.get_entry(1, table_name=RECURRENT_TABLE)
+        self.assertEqual(element["name"], "salary")
+        self.assertEqual(element["frequency"], "monthly")
+
+        self.assertRaises(
+            exceptions.PocketValidationFailure,
+            destination.copy_entries,
+            source,
+            table_name="unknown",
+        )
+
+    def test_copy_recurrent_entries_filtered_by_date(self):
+        for pocket_class in self.POCKET_CLASSES:
+            source = self._create_source(pocket_class)
+            source.add_entry(
+                table_name=RECURRENT_TABLE,
+                name="bonus",
+                value=500,
+                frequency="yearly",
+                start="2010-12-01",
+                end="2011-12-31",
+            )
+            destination = pocket_class(name="destination")
+            with self.subTest(pocket_class=pocket_class):
+                # Recurrent entries are selected by the dates of generated entries
+                count = destination.copy_entries(
+                    source, filters={"date": "2011-12"}, table_name=RECURRENT_TABLE
+                )
+                self.assertEqual(count, 1)
+                count = destination.copy_entries(
+                    source,
+                    filters={"date": "2020-", "name": "salary"},
+                    table_name=RECURRENT_TABLE,
+                )
+                self.assertEqual(count, 1)
+                count = destination.copy_entries(
+                    source, filters={"date": "2009"}, table_name=RECURRENT_TABLE
+                )
+                self.assertEqual(count, 0)
+                self.assertEqual(
+                    [e["name"] for e in destination.get_entries(recurrent_only=True)],
+                    ["bonus", "salary"],
+                )
+            source.close()
+            destination.close()
+
+    def test_copy_entries_unknown_filter_field(self):
+        for pocket_class in self.POCKET_CLASSES:
+            source = self._create_source(pocket_class)
+            with self.subTest(pocket_class=pocket_class):
+                for filters, table_name in [
+                    ({"frequency": "monthly"}, DEFAULT_TABLE),
+                    ({"start": "2020"}, None),
+                    ({"eid": "1"}, RECURRENT_TABLE),
+                ]:
+                    with self.assertRaisesRegex(
+                        exceptions.PocketValidationFailure, "filter field"
+                    ):
+                        source.copy_entries(
+                            source, filters=filters, table_name=table_name
+                        )
+                self.assertEqual(len(source.get_entries()[DEFAULT_TABLE]), 3)
+            source.close()
+
+    def test_copy_entries_within_pocket(self):
+        for pocket_class in self.POCKET_CLASSES:
+            pocket = self._create_source(pocket_class)
+            with self.subTest(pocket_class=pocket_class):
+                self.assertEqual(pocket.copy_entries(pocket), 3)
+                elements = pocket.get_entries(filters={"name": "rent"})
+                self.assertEqual(len(elements[DEFAULT_TABLE]), 2)
+            pocket.close()
+
+    def test_copy_entries_between_sqlite_files(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        source = self._create_source(SqlitePocket, data_dir=data_dir)
+        destination = SqlitePocket(name="destination", data_dir=data_dir)
+
+        # The rows are copied by the database, not one by one
+        with mock.patch.object(
+            DatabaseInterface, "copy_from", side_effect=AssertionError
+        ):
+            count = destination.copy_entries(source, filters={"date": "2020-01"})
+        self.assertEqual(count, 2)
+        self.assertEqual(
+            [e["name"] for e in destination.get_entries()[DEFAULT_TABLE].values()],
+            ["rent", "fuel"],
+        )
+        # The source database is detached again
+        databases = destination.db_interface._conn.execute(
+            "PRAGMA database_list"
+        ).fetchall()
+        self.assertEqual([d["name"] for d in databases], ["main"])
+
+        # Within a transaction, the database can't be attached
+        with destination.transaction():
+            destination.add_entry(name="food", value=-5, date="2020-01-01")
+            count = destination.copy_entries(source, filters={"name": "insurance"})
+        self.assertEqual(count, 1)
+        self.assertEqual(len(destination.get_entries()[DEFAULT_TABLE]), 4)
+
+        count = destination.copy_entries(
+            source, filters={"date": "2020"}, table_name=RECURRENT_TABLE
+        )
+        self.assertEqual(count, 1)
+
+        source.close()
+        destination.close()
+
+    def test_failed_copy_rolls_back(self):
+        source = self._create_source(TinyDbPocket)
+        destination = SqlitePocket(name="destination")
+        destination.add_entry(name="food", value=-5, date="2020-01-01")
+        # Entries without date violate the database schema
+        source.db_interface.update_by_id(DEFAULT_TABLE, 3, {"date": None})
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            destination.copy_entries(source)
+
+        self.assertEqual(len(destination.get_entries()[DEFAULT_TABLE]), 1)
+        self.assertEqual(destination._category_cache["rent"], Counter())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,7 +1,9 @@
+import json
 import os.path
 import shutil
 import tempfile
 import unittest
+from unittest import mock
 
 from financeager import (
     DEFAULT_POCKET_NAME,
@@ -9,8 +11,13 @@ from financeager import (
     RECURRENT_TABLE,
     entries,
     exceptions,
+    httpservice,
+    listing,
+    localserver,
+    pocket,
     server,
 )
+from financeager.pocket.tinydb import MemoryMappedTinyDbInterface
 
 
 class AddEntryToServerTestCase(unittest.TestCase):
@@ -84,7 +91,7 @@ class RecurrentEntryServerTestCase(unittest.TestCase):
             pocket=destination_pocket,
             eid=copied_entry_id,
         )["element"]
-        self.assertDictEqual(source_entry, destination_entry)
+        self.assertEqual(source_entry, destination_entry)
 
 
 class FindEntryServerTestCase(unittest.TestCase):
@@ -129,6 +136,28 @@ class FindEntryServerTestCase(unittest.TestCase):
         self.assertIsInstance(response["elements"][DEFAULT_TABLE], dict)
         self.assertIsInstance(response["elements"][RECURRENT_TABLE], dict)
 
+    def test_json_serializable_responses(self):
+        # Elements of TinyDB pockets are DocumentViews within the pocket
+        for command, kwargs in [
+            ("get", {"eid": self.entry_id}),
+            ("list", {}),
+            ("batch", {"items": [{"command": "get", "kwargs": {"eid": 1}}]}),
+        ]:
+            with self.subTest(command=command):
+                response = self.server.run(command, pocket=self.pocket, **kwargs)
+                self.assertIn(
+                    "hiking boots",
+                    json.dumps(response, default=httpservice.json_default),
+                )
+
+    def test_local_proxy_responses_hold_dicts(self):
+        proxy = localserver.Proxy()
+        eid = proxy.run("add", name="rent", value=-500)["id"]
+        response = proxy.run("get", eid=eid)
+        self.assertIs(type(response["element"]), dict)
+        response = proxy.run("list")
+        self.assertIs(type(response["elements"][DEFAULT_TABLE][eid]), dict)
+
     def test_response_is_none(self):
         response = self.server.run("get", pocket=self.pocket, eid=self.entry_id)
         self.assertIn("element", response)
@@ -175,7 +204,7 @@ class FindEntryServerTestCase(unittest.TestCase):
         destination_entry = self.server.run(
             "get", pocket=destination_pocket, eid=copied_entry_id
         )["element"]
-        self.assertDictEqual(source_entry, destination_entry)
+        self.assertEqual(source_entry, destination_entry)
 
     def test_unsuccessful_copy(self):
         self.assertRaises(
@@ -231,6 +260,622 @@ class InvalidDatabaseTypePocketsServerTestCase(JsonPocketsServerTestCase):
         self.assertEqual(str(response["error"]), "Unknown database type 'invalid'")
 
 
+class MemoryMapServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_memory_map(self):
+        self.server = server.Server(data_dir=self.tmp_dir, memory_map=True)
+        self.server.run("add", name="rent", value=-500, pocket="mapped")
+        self.assertEqual(
+            self.server.run("get", eid=1, pocket="mapped")["element"]["name"], "rent"
+        )
+        self.assertIsInstance(
+            self.server._pockets["mapped"].db_interface, MemoryMappedTinyDbInterface
+        )
+
+        with self.assertRaises(ValueError):
+            server.Server(database_type="sqlite", memory_map=True)
+
+
+class ShardByServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_shard_by_month(self):
+        self.server = server.Server(
+            data_dir=self.tmp_dir, database_type="sharded-tinydb", shard_by="month"
+        )
+        response = self.server.run("add", name="rent", value=-500, date="2020-03-01")
+        self.assertEqual(response["id"], 20200300001)
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(self.tmp_dir, "main.shards", "standard-2020-03.json")
+            )
+        )
+
+        with self.assertRaises(ValueError):
+            server.Server(database_type="sqlite", shard_by="month")
+
+
+class MaxOpenPocketsServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = server.Server(data_dir=self.tmp_dir, max_open_pockets=2)
+
+    def tearDown(self):
+        self.server.run("stop")
+        shutil.rmtree(self.tmp_dir)
+
+    def test_evict_least_recently_used_pocket(self):
+        self.server.run("add", name="a", value=1, pocket="a")
+        self.server.run("add", name="b", value=2, pocket="b")
+        self.server.run("list", pocket="a")
+        self.server.run("add", name="c", value=3, pocket="c")
+
+        self.assertEqual(list(self.server._pockets), ["a", "c"])
+        self.assertDictEqual(
+            self.server.run("stats")["stats"]["pockets"],
+            {
+                "open": 2,
+                "max_open": 2,
+                "hits": 1,
+                "misses": 3,
+                "evictions": 1,
+                "hit_rate": 0.25,
+            },
+        )
+
+        # Content of closed pocket is retained
+        element = self.server.run("get", eid=1, pocket="b")["element"]
+        self.assertEqual(element["name"], "b")
+        self.assertEqual(list(self.server._pockets), ["c", "b"])
+        self.assertEqual(self.server.run("pockets")["pockets"], ["a", "b", "c"])
+        self.assertEqual(self.server._get_pocket_stats()["evictions"], 2)
+
+    def test_in_memory_pockets_not_evicted(self):
+        server_ = server.Server(max_open_pockets=1)
+        server_.run("add", name="a", value=1, pocket="a")
+        server_.run("add", name="b", value=2, pocket="b")
+        self.assertEqual(list(server_._pockets), ["a", "b"])
+        self.assertEqual(server_._get_pocket_stats()["evictions"], 0)
+
+    def test_copy_many_between_sqlite_pockets(self):
+        server_ = server.Server(
+            data_dir=self.tmp_dir, database_type="sqlite", max_open_pockets=1
+        )
+        server_.run("add", name="rent", value=-500, category="housing", pocket="a")
+        server_.run("add", name="food", value=-5, pocket="a")
+
+        response = server_.run(
+            "copy-many",
+            source_pocket="a",
+            destination_pocket="b",
+            filters={"category": "housing"},
+        )
+        self.assertEqual(response, {"count": 1})
+        # Both pockets are open during the copy, and one is closed afterwards
+        self.assertEqual(len(server_._pockets), 1)
+
+        response = server_.run("add", name="rent", value=-600, pocket="b")
+        element = server_.run("get", eid=response["id"], pocket="b")["element"]
+        self.assertEqual(element["category"], "housing")
+
+        response = server_.run("copy-many", source_pocket="a", destination_pocket="a")
+        self.assertEqual(response, {"count": 2})
+        server_.run("stop")
+
+    def test_pocket_stats(self):
+        self.server.run("add", name="a", value=1, category="x", pocket="a")
+        self.server.run("add", name="b", value=1, pocket="b")
+        self.server.run(
+            "add",
+            name="rent",
+            value=-500,
+            frequency="yearly",
+            start="2020-01-01",
+            end="2021-12-31",
+            table_name=RECURRENT_TABLE,
+            pocket="b",
+        )
+
+        stats = self.server.run("pocket-stats", pocket="b")["pocket_stats"]
+        self.assertEqual(stats["rows"], {DEFAULT_TABLE: 1, RECURRENT_TABLE: 1})
+        self.assertGreater(stats["storage"]["file_size"], 0)
+        self.assertEqual(stats["recurrent"], {"templates": 1, "occurrences": 2})
+        self.assertEqual(stats["category_cache"], {"names": 2})
+        self.assertEqual(stats["server"], {"open_pockets": 2})
+
+        # The category cache of pocket 'a' was not needed
+        stats = self.server.run("pocket-stats", pocket="a")["pocket_stats"]
+        self.assertEqual(stats["category_cache"], {"names": None})
+
+    def test_stats_without_requests(self):
+        stats = self.server.run("stats")["stats"]["pockets"]
+        self.assertEqual(stats["hit_rate"], 0.0)
+        self.assertEqual(stats["open"], 0)
+
+
+class ListMultiplePocketsServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = server.Server(data_dir=self.tmp_dir, max_open_pockets=1)
+        for name in ["2023", "2024", "misc"]:
+            self.server.run("add", name=name, value=1, pocket=name)
+
+    def tearDown(self):
+        self.server.run("stop")
+        shutil.rmtree(self.tmp_dir)
+
+    def test_list_pockets(self):
+        response = self.server.run("list", pockets=["misc", "2023"])
+        pocket_elements = response["pocket_elements"]
+        self.assertEqual(list(pocket_elements), ["misc", "2023"])
+        self.assertEqual(pocket_elements["2023"][DEFAULT_TABLE][1]["name"], "2023")
+        self.assertEqual(pocket_elements["misc"][DEFAULT_TABLE][1]["name"], "misc")
+
+    def test_list_pockets_glob_pattern(self):
+        response = self.server.run(
+            "list", pockets=["202*", "2024"], filters={"name": "20"}
+        )
+        pocket_elements = response["pocket_elements"]
+        self.assertEqual(list(pocket_elements), ["2023", "2024"])
+        self.assertEqual(len(pocket_elements["2024"][DEFAULT_TABLE]), 1)
+        # Pinned pockets are not closed during the request
+        self.assertLessEqual(len(self.server._pockets), 1)
+        self.assertEqual(self.server._pinned_pockets, {})
+
+    def test_list_pockets_date_filter(self):
+        for name in ["2023", "2024"]:
+            for month in ["01", "02"]:
+                self.server.run(
+                    "add", name=month, value=1, date=f"{name}-{month}-15", pocket=name
+                )
+
+        filters = {"date": "-01-"}
+        response = self.server.run("list", pockets=["2023", "2024"], filters=filters)
+        self.assertEqual(filters, {"date": "-01-"})
+        for name, elements in response["pocket_elements"].items():
+            with self.subTest(name=name):
+                self.assertEqual(
+                    [e["date"] for e in elements[DEFAULT_TABLE].values()],
+                    [f"{name}-01-15"],
+                )
+
+    def test_list_sqlite_pockets(self):
+        server_ = server.Server(data_dir=self.tmp_dir, database_type="sqlite")
+        for name in ["2023", "2024"]:
+            server_.run("add", name=name, value=1, pocket=name)
+        for _ in range(2):
+            response = server_.run("list", pockets=["2023", "2024"])
+            self.assertEqual(len(response["pocket_elements"]["2024"][DEFAULT_TABLE]), 1)
+        server_.run("stop")
+
+    def test_list_pockets_no_match(self):
+        response = self.server.run("list", pockets=["19*"])
+        self.assertEqual(str(response["error"]), "No pocket matching '19*'")
+
+
+class PocketNamesCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_filepath = os.path.join(self.cache_dir, "pockets.json")
+        for filename in ["2024.json", "2025.sqlite", ".hidden.json", "notes.txt"]:
+            open(os.path.join(self.data_dir, filename), "w").close()
+        os.mkdir(os.path.join(self.data_dir, "2023.shards"))
+        self._age_data_dir()
+        server._pocket_names_cache.clear()
+
+    def tearDown(self):
+        server._pocket_names_cache.clear()
+        shutil.rmtree(self.data_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def _age_data_dir(self):
+        # Pretend that the directory was modified long ago
+        os.utime(self.data_dir, ns=(0, 10**9))
+
+    def test_scan_once(self):
+        with mock.patch(
+            "financeager.server._scan_pocket_names", wraps=server._scan_pocket_names
+        ) as mocked_scan:
+            self.assertEqual(
+                server.pocket_names(self.data_dir), {"2023", "2024", "2025"}
+            )
+            self.assertEqual(
+                server.pocket_names(self.data_dir, database_type="sqlite"), {"2025"}
+            )
+            mocked_scan.assert_called_once()
+
+            # Adding a pocket changes the mtime of the directory
+            open(os.path.join(self.data_dir, "2026.json"), "w").close()
+            self.assertEqual(
+                server.pocket_names(self.data_dir, database_type="tinydb"),
+                {"2024", "2026"},
+            )
+            self.assertEqual(mocked_scan.call_count, 2)
+
+    def test_recently_modified_directory_is_rescanned(self):
+        os.utime(self.data_dir)
+        with mock.patch(
+            "financeager.server._scan_pocket_names", wraps=server._scan_pocket_names
+        ) as mocked_scan:
+            server.pocket_names(self.data_dir)
+            server.pocket_names(self.data_dir)
+            self.assertEqual(mocked_scan.call_count, 2)
+
+    def test_cache_file(self):
+        server.pocket_names(self.data_dir, cache_filepath=self.cache_filepath)
+        server._pocket_names_cache.clear()
+
+        with mock.patch("financeager.server._scan_pocket_names") as mocked_scan:
+            self.assertEqual(
+                server.pocket_names(
+                    self.data_dir,
+                    database_type="sharded-tinydb",
+                    cache_filepath=self.cache_filepath,
+                ),
+                {"2023"},
+            )
+            mocked_scan.assert_not_called()
+
+    def test_invalid_cache_file(self):
+        with open(self.cache_filepath, "w") as f:
+            f.write("{")
+        self.assertEqual(
+            server.pocket_names(
+                self.data_dir,
+                database_type="tinydb",
+                cache_filepath=self.cache_filepath,
+            ),
+            {"2024"},
+        )
+
+    def test_missing_data_dir(self):
+        self.assertEqual(server.pocket_names(os.path.join(self.data_dir, "x")), set())
+
+
+class CommandRegistryServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = server.Server()
+
+    def test_register_command(self):
+        class CustomServer(server.Server):
+            pass
+
+        def count(server_, pocket=None):
+            with server_._pinned_pocket(pocket) as pd:
+                return {"count": len(pd.get_entries()[DEFAULT_TABLE])}
+
+        CustomServer.register_command("count", count)
+        custom_server = CustomServer()
+        custom_server.run("add", name="a", value=1)
+        self.assertEqual(custom_server.run("count"), {"count": 1})
+
+        # The handlers of the parent class are not modified
+        self.assertEqual(
+            self.server.run("count"), {"error": "Server: unknown command 'count'"}
+        )
+
+    def test_command_stats(self):
+        for value in range(3):
+            self.server.run("add", name="a", value=value)
+        self.server.run("get", eid=42)
+        self.server.run("foo")
+
+        stats = self.server.run("stats")["stats"]["commands"]
+        self.assertEqual(list(stats), ["add", "get"])
+        self.assertEqual(stats["add"]["count"], 3)
+        self.assertEqual(stats["get"]["count"], 1)
+        for command_stats in stats.values():
+            self.assertLessEqual(command_stats["p50"], command_stats["p95"])
+            self.assertLessEqual(command_stats["p95"], command_stats["max"])
+            self.assertLessEqual(command_stats["max"], command_stats["total"])
+
+        self.assertEqual(
+            self.server.run("stats")["stats"]["commands"]["stats"],
+            {
+                "count": 1,
+                "total": mock.ANY,
+                "p50": mock.ANY,
+                "p95": mock.ANY,
+                "max": mock.ANY,
+            },
+        )
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(server._percentile(values, 0.5), 50)
+        self.assertEqual(server._percentile(values, 0.95), 95)
+        self.assertEqual(server._percentile([3], 0.95), 3)
+        self.assertIsNone(server._percentile([], 0.5))
+
+    @mock.patch("financeager.server.logger.debug")
+    def test_lazy_debug_log(self, mocked_debug):
+        self.server.run("pockets", some="kwarg")
+        mocked_debug.assert_any_call(
+            "Running '%s' with %s", "pockets", {"some": "kwarg"}
+        )
+
+
+class ResponseCacheServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = server.Server()
+        self.server.run("add", name="rent", value=-500)
+
+    def _list_names(self, **kwargs):
+        response = self.server.run("list", **kwargs)
+        return sorted(e["name"] for e in response["elements"][DEFAULT_TABLE].values())
+
+    def _response_stats(self):
+        stats = self.server.run("stats")["stats"]["responses"]
+        return stats["hits"], stats["misses"]
+
+    def test_repeated_list(self):
+        self.assertEqual(self._list_names(filters={"name": "rent"}), ["rent"])
+        self.assertEqual(self._list_names(filters={"name": "rent"}), ["rent"])
+        self.assertEqual(self._list_names(filters={"name": "foo"}), [])
+        self.assertEqual(self._response_stats(), (1, 2))
+
+        stats = self.server.run("stats")["stats"]["responses"]
+        self.assertEqual(stats["cached"], 2)
+        self.assertAlmostEqual(stats["hit_rate"], 1 / 3)
+
+    def test_modifications_invalidate_cache(self):
+        self.assertEqual(self._list_names(), ["rent"])
+
+        eid = self.server.run("add", name="food", value=-5)["id"]
+        self.assertEqual(self._list_names(), ["food", "rent"])
+
+        self.server.run("update", eid=eid, name="snacks")
+        self.assertEqual(self._list_names(), ["rent", "snacks"])
+
+        self.server.run("remove", eid=eid)
+        self.assertEqual(self._list_names(), ["rent"])
+
+        self.server.run(
+            "batch", items=[{"command": "add", "kwargs": {"name": "a", "value": 1}}]
+        )
+        self.assertEqual(self._list_names(), ["a", "rent"])
+        self.assertEqual(self._response_stats(), (0, 5))
+
+    def test_copy_invalidates_destination(self):
+        self.assertEqual(self._list_names(pocket="other"), [])
+        self.assertEqual(self._list_names(), ["rent"])
+
+        self.server.run("copy", eid=1, destination_pocket="other")
+        self.assertEqual(self._list_names(pocket="other"), ["rent"])
+        self.assertEqual(self._list_names(), ["rent"])
+        self.assertEqual(self._response_stats(), (1, 3))
+
+    def test_copy_many_invalidates_destination(self):
+        self.assertEqual(self._list_names(pocket="other"), [])
+
+        response = self.server.run(
+            "copy-many", filters={"name": "rent"}, destination_pocket="other"
+        )
+        self.assertEqual(response, {"count": 1})
+        self.assertEqual(self._list_names(pocket="other"), ["rent"])
+        self.assertEqual(self._response_stats(), (0, 2))
+
+    def test_date_change(self):
+        self._list_names()
+        with mock.patch("financeager.server.date") as mocked_date:
+            mocked_date.today.return_value = "tomorrow"
+            self._list_names()
+        self.assertEqual(self._response_stats(), (0, 2))
+
+    def test_multiple_pockets(self):
+        self.server.run("list", pockets=["main"])
+        self.server.run("list", pockets=["main"])
+        self._list_names()
+        self.assertEqual(self._response_stats(), (2, 1))
+
+    def test_columnar(self):
+        elements = self.server.run("list", columnar=True)["elements"]
+        self.assertEqual(elements["names"], ["rent"])
+        self.assertEqual(elements[DEFAULT_TABLE]["value"], [-500])
+
+        # Cached separately from the elements in default representation
+        self.assertEqual(self._list_names(), ["rent"])
+        self.server.run("list", columnar=True)
+        self.assertEqual(self._response_stats(), (1, 2))
+
+        response = self.server.run("list", pockets=["main"], columnar=True)
+        self.assertEqual(response["pocket_elements"]["main"], elements)
+
+        # Recurrent entries are returned as-is
+        response = self.server.run("list", recurrent_only=True, columnar=True)
+        self.assertEqual(response["elements"], [])
+
+    def test_local_proxy_responses_hold_copies(self):
+        self.server = localserver.Proxy()
+        self.server.run("add", name="rent", value=-500)
+        elements = self.server.run("list")["elements"]
+        elements[DEFAULT_TABLE][1]["category"] = "modified"
+        elements[DEFAULT_TABLE].clear()
+
+        elements = self.server.run("list")["elements"]
+        self.assertEqual(elements[DEFAULT_TABLE][1]["category"], None)
+        self.assertEqual(self._response_stats(), (1, 1))
+
+        # Formatting recurrent elements modifies them
+        self.server.run(
+            "add",
+            name="fees",
+            value=-5,
+            table_name=RECURRENT_TABLE,
+            frequency="yearly",
+            start="2020-01-01",
+        )
+        for _ in range(2):
+            elements = self.server.run("list", recurrent_only=True)["elements"]
+            self.assertEqual(elements[0]["category"], None)
+            listing.prettify(elements, recurrent_only=True)
+
+    def test_modification_by_other_process(self):
+        for database_type in ["tinydb", "sqlite", "sharded-tinydb"]:
+            data_dir = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, data_dir)
+            self.server = server.Server(data_dir=data_dir, database_type=database_type)
+            self.server.run("add", name="rent", value=-500, date="2020-01-01")
+            with self.subTest(database_type=database_type):
+                self.assertEqual(self._list_names(), ["rent"])
+
+                # Simulate another process modifying the pocket file
+                other = pocket.POCKET_CLASSES[database_type](
+                    DEFAULT_POCKET_NAME, data_dir=data_dir
+                )
+                other.add_entry(name="food", value=-5, date="2020-01-02")
+                other.close()
+
+                self.assertEqual(self._list_names(), ["food", "rent"])
+                self.assertEqual(self._list_names(), ["food", "rent"])
+                self.assertEqual(self._response_stats(), (1, 2))
+            self.server.run("stop")
+
+    def test_least_recently_used_response_discarded(self):
+        server_ = server.Server(max_cached_responses=1)
+        server_.run("list", filters={"name": "a"})
+        server_.run("list", filters={"name": "b"})
+        server_.run("list", filters={"name": "a"})
+        stats = server_.run("stats")["stats"]["responses"]
+        self.assertEqual((stats["cached"], stats["hits"], stats["misses"]), (1, 0, 3))
+
+    def test_disabled(self):
+        server_ = server.Server(max_cached_responses=0)
+        server_.run("list")
+        server_.run("list")
+        stats = server_.run("stats")["stats"]["responses"]
+        self.assertEqual((stats["cached"], stats["hits"], stats["misses"]), (0, 0, 0))
+
+
+class BatchServerTestCase(unittest.TestCase):
+    DATABASE_TYPES = ["tinydb", "sqlite", "sharded-tinydb"]
+
+    def _create_servers(self):
+        """Create servers for all database types, with in-memory and persistent
+        storage.
+        """
+        servers = []
+        for database_type in self.DATABASE_TYPES:
+            for persistent in [False, True]:
+                data_dir = None
+                if persistent:
+                    data_dir = tempfile.mkdtemp()
+                    self.addCleanup(shutil.rmtree, data_dir)
+                server_ = server.Server(database_type=database_type, data_dir=data_dir)
+                self.addCleanup(server_.run, "stop")
+                servers.append((f"{database_type}, persistent={persistent}", server_))
+        return servers
+
+    def test_best_effort(self):
+        for label, server_ in self._create_servers():
+            with self.subTest(label):
+                self._test_best_effort(server_)
+
+    def test_atomic(self):
+        for label, server_ in self._create_servers():
+            with self.subTest(label):
+                self._test_atomic(server_)
+
+    def test_malformed_items(self):
+        server_ = server.Server()
+        for items, message in [
+            ({"command": "add"}, "Batch items must be a list"),
+            ([{"kwargs": {}}], "Batch item 0 must be a dict holding a 'command'"),
+            (["add"], "Batch item 0 must be a dict holding a 'command'"),
+            (
+                [{"command": "categories"}, {"command": "get", "kwargs": [1]}],
+                "Batch item 1 ('get'): 'kwargs' must be a dict",
+            ),
+        ]:
+            with self.subTest(items=items):
+                response = server_.run("batch", items=items)
+                self.assertIn(message, str(response["error"]))
+
+    def _test_best_effort(self, server_):
+        responses = server_.run(
+            "batch",
+            pocket="1",
+            atomic=False,
+            items=[
+                {
+                    "command": "add",
+                    "kwargs": {"name": "a", "value": 1, "date": "2000-01-01"},
+                },
+                {"command": "add", "kwargs": {"name": "b"}},
+                {"command": "remove", "kwargs": {"eid": 12345}},
+                {"command": "pockets"},
+                {"command": "categories"},
+                {"command": "get", "kwargs": {"element_id": 1}},
+            ],
+        )["responses"]
+
+        self.assertEqual(len(responses), 6)
+        self.assertIn("id", responses[0])
+        self.assertIsInstance(responses[1]["error"], exceptions.PocketException)
+        self.assertIsInstance(responses[2]["error"], exceptions.PocketEntryNotFound)
+        self.assertEqual(responses[3]["error"], "Server: unknown command 'pockets'")
+        self.assertEqual(responses[4], {"categories": []})
+        self.assertIsInstance(responses[5]["error"], TypeError)
+
+        eid = responses[0]["id"]
+        element = server_.run("get", pocket="1", eid=eid)["element"]
+        self.assertEqual(element["name"], "a")
+
+    def _test_atomic(self, server_):
+        items = [
+            {
+                "command": "add",
+                "kwargs": {
+                    "name": "a",
+                    "value": 1,
+                    "date": "2000-01-01",
+                    "category": "x",
+                },
+            },
+            {
+                "command": "add",
+                "kwargs": {
+                    "name": "r",
+                    "value": -1,
+                    "table_name": RECURRENT_TABLE,
+                    "frequency": "monthly",
+                },
+            },
+            {"command": "list", "kwargs": {"filters": {"name": "a"}}},
+        ]
+        responses = server_.run("batch", pocket="2", items=items)["responses"]
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(len(responses[2]["elements"][DEFAULT_TABLE]), 1)
+
+        items[0]["kwargs"]["date"] = "2001-01-01"
+        items[0]["kwargs"]["category"] = "y"
+        items[2] = {"command": "update", "kwargs": {"eid": 12345, "name": "b"}}
+        response = server_.run("batch", pocket="2", items=items)
+        self.assertEqual(
+            str(response["error"]),
+            "Batch item 2 ('update') failed, no changes were applied: "
+            "Entry not found.",
+        )
+
+        elements = server_.run("list", pocket="2")["elements"]
+        self.assertEqual(len(elements[DEFAULT_TABLE]), 1)
+        self.assertEqual(len(elements[RECURRENT_TABLE]), 1)
+        self.assertEqual(server_.run("categories", pocket="2")["categories"], ["x"])
+
+        # IDs of discarded entries are reused
+        eid = server_.run("add", name="a", value=2, date="2000-02-01", pocket="2")["id"]
+        self.assertEqual(responses[0]["id"] + 1, eid)
+        # Category cache was restored as well
+        element = server_.run("get", eid=eid, pocket="2")["element"]
+        self.assertEqual(element["category"], "x")
+
+
 class InvalidDatabaseTypeTestCase(unittest.TestCase):
     def test_exception(self):
         server_ = server.Server(database_type="invalid")
@@ -0,0 +1,167 @@
+"""Load test of the financeager HTTP service.
+
+Sends a mix of 'add' and 'list' requests over concurrent persistent connections,
+and reports the throughput and request latencies. Unless a port is specified, a
+service with a temporary data directory is started in the background.
+
+    python tools/loadtest.py --connections 8 --requests 500
+    python tools/loadtest.py --port 8642 --pipeline 8
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from financeager import httpservice
+
+
+def _next_request(rng, pocket, read_ratio):
+    if rng.random() < read_ratio:
+        return "list", {"pocket": pocket, "filters": {"category": "food"}}
+    return "add", {
+        "pocket": pocket,
+        "name": f"item {rng.randrange(1000)}",
+        "value": -rng.randrange(1, 100),
+        "category": rng.choice(["food", "rent", "travel"]),
+    }
+
+
+def _run_connection(options, index, latencies, errors):
+    """Send the requests of a single connection. With a pipeline depth of 1 the
+    HttpProxy is used; otherwise batches of requests are pipelined by the
+    AsyncHttpProxy.
+    """
+    rng = random.Random(index)
+    pocket = f"{options.pocket}-{index % options.pockets}"
+
+    if options.pipeline == 1:
+        proxy = httpservice.HttpProxy(host=options.host, port=options.port)
+        for _ in range(options.requests):
+            command, kwargs = _next_request(rng, pocket, options.read_ratio)
+            start = time.perf_counter()
+            try:
+                proxy.run(command, **kwargs)
+            except Exception:
+                errors.append(command)
+            latencies.append(time.perf_counter() - start)
+        proxy.close()
+        return
+
+    asyncio.run(_run_pipelined(options, rng, pocket, latencies, errors))
+
+
+async def _run_pipelined(options, rng, pocket, latencies, errors):
+    proxy = httpservice.AsyncHttpProxy(host=options.host, port=options.port)
+    remaining = options.requests
+    try:
+        while remaining:
+            depth = min(options.pipeline, remaining)
+            batch = [
+                _next_request(rng, pocket, options.read_ratio) for _ in range(depth)
+            ]
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *[proxy.run(command, **kwargs) for command, kwargs in batch],
+                return_exceptions=True,
+            )
+            errors.extend(
+                command
+                for (command, _), result in zip(batch, results)
+                if isinstance(result, Exception)
+            )
+            # Attribute the latency of the batch to each of its requests
+            latencies.extend([(time.perf_counter() - start) / depth] * depth)
+            remaining -= depth
+    finally:
+        await proxy.close()
+
+
+def _report(latencies, errors, elapsed):
+    latencies_ms = sorted(1000 * latency for latency in latencies)
+    percentiles = statistics.quantiles(latencies_ms, n=100)
+    print(f"Requests:    {len(latencies_ms)} ({len(errors)} failed)")
+    print(f"Duration:    {elapsed:.2f} s")
+    print(f"Throughput:  {len(latencies_ms) / elapsed:.1f} requests/s")
+    print(
+        f"Latency:     p50 {percentiles[49]:.2f} ms, p95 {percentiles[94]:.2f} ms, "
+        f"max {latencies_ms[-1]:.2f} ms"
+    )
+
+
+def _load_test(options):
+    latencies = []
+    errors = []
+    threads = [
+        threading.Thread(
+            target=_run_connection, args=(options, index, latencies, errors)
+        )
+        for index in range(options.connections)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    _report(latencies, errors, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=httpservice.DEFAULT_HOST)
+    parser.add_argument(
+        "--port",
+        type=int,
+        help="port of a running service. If not given, a service is started",
+    )
+    parser.add_argument(
+        "--database-type",
+        default="sqlite",
+        help="database type of the started service (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--connections", type=int, default=8, help="number of concurrent connections"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=500, help="number of requests per connection"
+    )
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        default=1,
+        help="number of requests sent at once before reading the responses",
+    )
+    parser.add_argument(
+        "--read-ratio", type=float, default=0.8, help="share of 'list' requests"
+    )
+    parser.add_argument(
+        "--pocket", default="load-test", help="prefix of the pocket names"
+    )
+    parser.add_argument(
+        "--pockets", type=int, default=4, help="number of pockets to distribute to"
+    )
+    options = parser.parse_args()
+
+    if options.port is not None:
+        _load_test(options)
+        return
+
+    with (
+        tempfile.TemporaryDirectory() as data_dir,
+        httpservice.background_service(
+            host=options.host,
+            port=0,
+            data_dir=data_dir,
+            database_type=options.database_type,
+        ) as service,
+    ):
+        options.port = service.port
+        _load_test(options)
+
+
+if __name__ == "__main__":
+    main()